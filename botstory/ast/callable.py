@@ -1,4 +1,4 @@
-from botstory.ast import stack_utils, story_context
+from botstory.ast import kinds, stack_utils, story_context
 import logging
 from .. import matchers
 
@@ -29,6 +29,8 @@ class CallableNodeWrapper:
     helps start processing callable story
     """
 
+    kind = kinds.CALLABLE
+
     def __init__(self, ast_node, library, processor):
         self.library = library
         self.ast_node = ast_node
@@ -0,0 +1,110 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# numbered back-references and conditional groups
+# would point to wrong groups once we join patterns
+GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+
+class DispatchTable:
+    """
+    compiled index of story validators
+    which finds the first matched story without asking each validator.
+
+    validator could be indexed:
+     - by value, once it has `index_value()` and its class has
+       `index_key(message)` which extract the same value from a message.
+       For example `text.Equal`, `text.EqualCaseIgnore`, `Option.Equal`.
+     - by regular expression, once it has `index_pattern()`
+       and its class has `index_key(message)`. All patterns of one type
+       are joined in one regex which we use to skip all of them at once.
+       For example `text.Match`, `Option.Match`.
+
+    all other (opaque) validators are checked one by one
+    but only those which are declared before the best found candidate.
+    """
+
+    def __init__(self, stories):
+        self.stories = list(stories)
+        # matcher type -> (index_key, {value: index of story})
+        self.values = {}
+        # matcher type -> (index_key, [joined pattern])
+        self.patterns = {}
+        # [(index of story, validator, matcher type of pattern or None)]
+        self.sequence = []
+
+        pattern_groups = {}
+
+        for index, story in enumerate(self.stories):
+            validator = story.extensions.get('validator', None)
+            validator_type = type(validator)
+            index_key = getattr(validator_type, 'index_key', None)
+
+            if index_key and hasattr(validator, 'index_value'):
+                value = validator.index_value()
+                try:
+                    values = self.values.setdefault(validator_type.type, (index_key, {}))[1]
+                    # the first declared story wins
+                    values.setdefault(value, index)
+                    continue
+                except TypeError:
+                    # unhashable value
+                    pass
+
+            if index_key and hasattr(validator, 'index_pattern'):
+                pattern = validator.index_pattern()
+                if not GROUP_REFERENCE.search(pattern.pattern):
+                    pattern_groups \
+                        .setdefault(validator_type.type, (index_key, {}))[1] \
+                        .setdefault(pattern.flags, []) \
+                        .append(pattern.pattern)
+                    self.sequence.append((index, validator, validator_type.type))
+                    continue
+
+            self.sequence.append((index, validator, None))
+
+        for matcher_type, (index_key, by_flags) in pattern_groups.items():
+            try:
+                joined = [re.compile('|'.join('(?:{})'.format(p) for p in patterns), flags=flags)
+                          for flags, patterns in by_flags.items()]
+            except re.error as err:
+                # for example duplicated names of groups
+                logger.debug('could not join patterns of {}: {}'.format(matcher_type, err))
+                self.sequence = [(index, validator, None if t == matcher_type else t)
+                                 for index, validator, t in self.sequence]
+                continue
+            self.patterns[matcher_type] = (index_key, joined)
+
+    def match(self, message):
+        best = None
+        for index_key, values in self.values.values():
+            try:
+                index = values.get(index_key(message), None)
+            except TypeError:
+                # unhashable value in message
+                continue
+            if index is not None and (best is None or index < best):
+                best = index
+
+        prefiltered = {}
+        for index, validator, pattern_type in self.sequence:
+            if best is not None and index > best:
+                break
+            if pattern_type is not None:
+                if pattern_type not in prefiltered:
+                    prefiltered[pattern_type] = self.search_any(pattern_type, message)
+                if not prefiltered[pattern_type]:
+                    continue
+            if validator.validate(message):
+                return self.stories[index]
+
+        return None if best is None else self.stories[best]
+
+    def search_any(self, pattern_type, message):
+        index_key, joined = self.patterns[pattern_type]
+        key = index_key(message)
+        if not key:
+            return False
+        return any(pattern.search(key) for pattern in joined)
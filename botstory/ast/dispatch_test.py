@@ -0,0 +1,120 @@
+from botstory.ast import story_context
+from botstory.middlewares import any, option, text
+import pytest
+from . import dispatch, parser
+
+
+class CountValidator:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def validate(self, message):
+        self.calls += 1
+        return self.result
+
+
+def build_story(topic, validator):
+    story = parser.ASTNode(topic)
+    story.extensions['validator'] = validator
+    return story
+
+
+def build_text_message(raw):
+    return story_context.set_message_data({'session': {}}, 'text', {'raw': raw})
+
+
+def build_option_message(value):
+    return story_context.set_message_data({'session': {}}, 'option', 'value', value)
+
+
+def test_match_equal_text():
+    table = dispatch.DispatchTable([
+        build_story('hi', text.Equal('hi')),
+        build_story('bye', text.Equal('bye')),
+    ])
+    assert table.match(build_text_message('bye')).topic == 'bye'
+    assert table.match(build_text_message('Bye')) is None
+
+
+def test_match_equal_case_ignore_text():
+    table = dispatch.DispatchTable([
+        build_story('bye', text.EqualCaseIgnore('Bye')),
+    ])
+    assert table.match(build_text_message('BYE')).topic == 'bye'
+    assert table.match(build_option_message('bye')) is None
+
+
+def test_match_option():
+    table = dispatch.DispatchTable([
+        build_story('on_start', option.OnStart()),
+        build_story('yes', option.Equal('YES')),
+    ])
+    assert table.match(build_option_message('YES')).topic == 'yes'
+    assert table.match(build_option_message(option.OnStart.DEFAULT_OPTION_PAYLOAD)).topic == 'on_start'
+
+
+def test_match_regex_and_keep_matches():
+    table = dispatch.DispatchTable([
+        build_story('hi', text.Equal('hi')),
+        build_story('numbers', text.Match(r'\d+')),
+        build_story('words', text.Match(r'[a-z]+')),
+    ])
+    message = build_text_message('I have 42 apples')
+    assert table.match(message).topic == 'numbers'
+    assert text.get_text(message)['matches'] == ['42']
+    assert table.match(build_text_message('!!!')) is None
+
+
+def test_preserve_order_of_declaration():
+    table = dispatch.DispatchTable([
+        build_story('any', text.Match('.*')),
+        build_story('hi', text.Equal('hi')),
+    ])
+    assert table.match(build_text_message('hi')).topic == 'any'
+
+
+def test_the_first_of_duplicated_values_wins():
+    table = dispatch.DispatchTable([
+        build_story('first', text.Equal('hi')),
+        build_story('second', text.Equal('hi')),
+    ])
+    assert table.match(build_text_message('hi')).topic == 'first'
+
+
+def test_should_not_validate_opaque_stories_after_the_first_match():
+    before = CountValidator(False)
+    after = CountValidator(True)
+    table = dispatch.DispatchTable([
+        build_story('before', before),
+        build_story('hi', text.Equal('hi')),
+        build_story('after', after),
+    ])
+    assert table.match(build_text_message('hi')).topic == 'hi'
+    assert before.calls == 1
+    assert after.calls == 0
+
+
+def test_fallback_to_opaque_validators():
+    table = dispatch.DispatchTable([
+        build_story('hi', text.Equal('hi')),
+        build_story('any', any.Any()),
+    ])
+    assert table.match(build_text_message('hello')).topic == 'any'
+
+
+def test_should_not_join_patterns_with_back_references():
+    table = dispatch.DispatchTable([
+        build_story('letters', text.Match(r'(x)y')),
+        build_story('repeat', text.Match(r'(a)\1')),
+    ])
+    assert table.match(build_text_message('aa')).topic == 'repeat'
+
+
+@pytest.mark.parametrize('flags', [0, 2])
+def test_should_respect_flags_of_patterns(flags):
+    table = dispatch.DispatchTable([
+        build_story('hi', text.Match('hi', flags=flags)),
+    ])
+    message = build_text_message('HI')
+    assert (table.match(message) is not None) == bool(flags)
@@ -1,4 +1,5 @@
 from botstory import ast, matchers
+from botstory.ast import kinds
 from collections import OrderedDict
 import logging
 import json
@@ -17,6 +18,8 @@ class Undefined:
 
 
 class StoryPartFork:
+    kind = kinds.FORK
+
     def __init__(self):
         self.local_scope = ast.library.StoriesScope()
 
@@ -26,8 +29,7 @@ class StoryPartFork:
 
     # this one very similar to validation in story loop
     def by_topic(self, topic):
-        stories = self.local_scope.by_topic(topic)
-        return stories[0] if len(stories) > 0 else None
+        return self.local_scope.get(topic)
 
     @property
     def children(self):
@@ -0,0 +1,41 @@
+import inspect
+
+# kinds of story parts.
+# We resolve them once while we compile stories
+# so processor doesn't need to inspect parts on each message
+
+# regular function
+LEAF_SYNC = 'leaf_sync'
+# coroutine function
+LEAF_ASYNC = 'leaf_async'
+# startpoint of callable story
+CALLABLE = 'callable'
+# switch (forking) of stories
+FORK = 'fork'
+# loop (scope) of stories
+LOOP = 'loop'
+# compiled story
+STORY = 'story'
+
+# parts which we should await
+ASYNC = frozenset([LEAF_ASYNC, CALLABLE])
+# parts which have child stories
+WITH_CHILDREN = frozenset([FORK, LOOP])
+
+
+def of(story_part):
+    """
+    resolve kind of story part
+
+    :param story_part:
+    :return:
+    """
+    kind = getattr(story_part, 'kind', None)
+    if kind is not None:
+        return kind
+    # bound method `startpoint` of callable story
+    if getattr(getattr(story_part, '__self__', None), 'kind', None) == CALLABLE:
+        return CALLABLE
+    if inspect.iscoroutinefunction(story_part):
+        return LEAF_ASYNC
+    return LEAF_SYNC
@@ -0,0 +1,55 @@
+from botstory.ast import kinds
+from botstory.utils import answer
+
+
+def test_resolve_kinds_of_story_parts_on_compile():
+    with answer.Talk() as talk:
+        story = talk.story
+
+        @story.callable()
+        def one_callable():
+            @story.part()
+            async def callable_part(ctx):
+                pass
+
+        @story.on('start job')
+        def one_job():
+            @story.part()
+            def sync_part(ctx):
+                pass
+
+            @story.part()
+            async def async_part(ctx):
+                pass
+
+            story.part()(one_callable)
+
+            @story.case(equal_to='yes')
+            def yes_story():
+                pass
+
+            @story.loop()
+            def job_scope():
+                pass
+
+        compiled_story = story.stories_library.global_scope.get('one_job')
+
+    assert compiled_story.kind == kinds.STORY
+    assert compiled_story.kinds == [
+        kinds.LEAF_SYNC,
+        kinds.LEAF_ASYNC,
+        kinds.CALLABLE,
+        kinds.FORK,
+        kinds.LOOP,
+    ]
+
+
+def test_kind_of_plain_function():
+    def sync_part(ctx):
+        pass
+
+    async def async_part(ctx):
+        pass
+
+    assert kinds.of(sync_part) == kinds.LEAF_SYNC
+    assert kinds.of(async_part) == kinds.LEAF_ASYNC
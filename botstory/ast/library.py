@@ -1,5 +1,6 @@
 from botstory import di
-from botstory.ast import forking
+from botstory.ast import dispatch, forking, kinds
+import itertools
 import logging
 import json
 
@@ -10,24 +11,75 @@ class DuplicationException(Exception):
     pass
 
 
+# changes of any scope (global, callable or local scope of fork and loop).
+# Memoized lookups are valid only for the same version
+versions = itertools.count()
+version = next(versions)
+
+
+def touch():
+    global version
+    version = next(versions)
+
+
 class StoriesScope:
     def __init__(self):
         self.stories = []
+        # topic -> story index
+        self.topics = {}
+        # compiled validators of stories
+        self.dispatch_table = None
+        # nodes which keep topic -> child table of this scope
+        self.owners = []
 
     def add(self, story):
-        if self.by_topic(story.topic):
+        if story.topic in self.topics:
             raise DuplicationException('We already have topic {}'.format(story.topic))
         self.stories.append(story)
+        self.topics[story.topic] = story
+        self.dispatch_table = None
+        for owner in self.owners:
+            owner.index_child(story)
+        touch()
+
+    def watch(self, owner):
+        """
+        owner will be notified about each story of scope
+
+        :param owner: node with `index_child(story)` method
+        :return:
+        """
+        self.owners.append(owner)
+        for story in self.stories:
+            owner.index_child(story)
+
+    def clear(self):
+        self.stories = []
+        self.topics = {}
+        self.dispatch_table = None
+        touch()
+
+    def compile(self):
+        """
+        build dispatch table of story validators
+
+        :return:
+        """
+        self.dispatch_table = dispatch.DispatchTable(self.stories)
+        return self.dispatch_table
 
     def all_filters(self):
         return [(s.topic, s.extensions['validator'])
                 for s in self.stories if 'validator' in s.extensions]
 
     def match(self, message):
-        matched_stories = [
-            story for story in self.stories
-            if story.extensions['validator'].validate(message)]
-        return matched_stories[0] if len(matched_stories) > 0 else None
+        """
+        get the first story which validator matches message
+
+        :param message:
+        :return:
+        """
+        return (self.dispatch_table or self.compile()).match(message)
 
     def get_story_by(self, **kwargs):
         return [child for child in self.stories
@@ -35,7 +87,17 @@ class StoriesScope:
                        for key in kwargs.keys())]
 
     def by_topic(self, topic):
-        return [s for s in self.stories if s.topic == topic]
+        story = self.topics.get(topic, None)
+        return [story] if story else []
+
+    def get(self, topic):
+        """
+        get story by topic
+
+        :param topic:
+        :return: story or None
+        """
+        return self.topics.get(topic, None)
 
     def to_json(self):
         return {
@@ -58,10 +120,15 @@ class StoriesLibrary:
     def __init__(self):
         self.callable_scope = StoriesScope()
         self.global_scope = StoriesScope()
+        # (topic, *stack topics) -> resolved story
+        self.resolved_paths = {}
+        # version of scopes which resolved paths belong to
+        self.resolved_version = version
 
     def clear(self):
-        self.callable_scope = StoriesScope()
-        self.global_scope = StoriesScope()
+        # clear in place because parser could keep reference to global scope
+        self.callable_scope.clear()
+        self.global_scope.clear()
 
     def add_global(self, story):
         self.global_scope.add(story)
@@ -69,23 +136,51 @@ class StoriesLibrary:
     def add_callable(self, story):
         self.callable_scope.add(story)
 
+    def compile(self):
+        self.global_scope.compile()
+
     def get_callable_by_topic(self, topic):
-        return self.callable_scope.by_topic(topic)[0]
+        return self.callable_scope.get(topic)
 
     def get_global_story(self, message):
         return self.global_scope.match(message)
 
     def get_story_by_topic(self, topic, stack=None):
         """
-        get story and take about context stack
+        get story and take about context stack.
+        Found story is memoized by stack path
+        until we add new story to any scope
+
         :param topic:
         :param stack:
         :return:
         """
-        options = self.callable_scope.by_topic(topic) + self.global_scope.by_topic(topic)
+        if self.resolved_version != version:
+            self.resolved_paths = {}
+            self.resolved_version = version
+
+        path = (topic,) + tuple(item['topic'] for item in stack or [])
+        try:
+            return self.resolved_paths[path]
+        except KeyError:
+            pass
+
+        story = self.resolve_story_by_topic(topic, stack)
+        # missed story could be added later
+        if story is not None:
+            self.resolved_paths[path] = story
+        return story
 
-        if len(options) > 0:
-            return options[0]
+    def resolve_story_by_topic(self, topic, stack=None):
+        """
+        walk through the library from the root of stack
+        :param topic:
+        :param stack:
+        :return:
+        """
+        story = self.callable_scope.get(topic) or self.global_scope.get(topic)
+        if story:
+            return story
 
         if not stack or len(stack) == 0:
             return None
@@ -98,24 +193,17 @@ class StoriesLibrary:
         if not parent:
             return None
 
-        # is topic name matching storyline?
-        try:
-            return next(filter(lambda part: getattr(part, 'topic', None) == topic, parent.story_line))
-        except StopIteration:
-            pass
-
-        if hasattr(parent, 'local_scope'):
-            # for loop.StoriesLoopNode
-            return parent.get_child_by_validation_result(topic)
+        kind = kinds.of(parent)
+        if kind == kinds.LOOP or kind == kinds.FORK:
+            return parent.by_topic(topic)
 
-        # for forking.StoryPartFork
-        inner_stories = [
-            story.children for story in parent.story_line if hasattr(story, 'children')
-            ]
-
-        inner_stories = [item for sublist in inner_stories for item in sublist]
+        # is topic name matching storyline?
+        part = parent.parts_by_topic.get(topic, None)
+        if part is not None:
+            return part
 
-        child_options = [story for story in inner_stories if story.topic == topic]
+        # children of forks (and loops) of story line
+        child_options = parent.children_by_topic.get(topic, [])
         if len(child_options) == 0:
             return None
         elif len(child_options) == 1:
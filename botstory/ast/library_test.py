@@ -1,5 +1,5 @@
 import pytest
-from . import forking, library, parser
+from . import forking, library, loop, parser
 
 
 @pytest.fixture(scope='function')
@@ -36,3 +36,95 @@ def test_get_substory(story_library):
     }]
     story = story_library.get_story_by_topic('How do you feel?', stack=stack)
     assert story.topic == 'How do you feel?'
+
+
+def test_index_children_of_forks_by_topic(story_library):
+    story_1 = story_library.get_story_by_topic('hi!')
+    assert [s.topic for s in story_1.children_by_topic['How do you feel?']] == ['How do you feel?']
+
+    fork = story_1.story_line[0]
+    fork.local_scope.add(parser.ASTNode('Are you sure?'))
+    stack = [{
+        'topic': 'hi!'
+    }]
+    assert story_library.get_story_by_topic('Are you sure?', stack=stack).topic == 'Are you sure?'
+
+
+def test_get_child_of_loop(story_library):
+    story = parser.ASTNode('menu')
+    story_loop = story.append(loop.StoriesLoopNode(lambda: None))
+    story_loop.local_scope.add(parser.ASTNode('next'))
+    story_library.add_global(story)
+
+    stack = [{
+        'topic': 'menu',
+    }, {
+        'topic': story_loop.topic,
+    }]
+    assert story_library.get_story_by_topic(story_loop.topic, stack=stack[:1]) is story_loop
+    assert story_library.get_story_by_topic('next', stack=stack).topic == 'next'
+
+
+def test_get_callable_by_topic(story_library):
+    story = story_library.get_callable_by_topic('where to go?')
+    assert story.topic == 'where to go?'
+
+
+def test_scope_should_not_allow_duplicated_topics():
+    scope = library.StoriesScope()
+    scope.add(parser.ASTNode('hi!'))
+    with pytest.raises(library.DuplicationException):
+        scope.add(parser.ASTNode('hi!'))
+
+
+def test_clear_scope_should_clear_topics_index():
+    scope = library.StoriesScope()
+    scope.add(parser.ASTNode('hi!'))
+    scope.clear()
+    assert scope.get('hi!') is None
+    assert scope.by_topic('hi!') == []
+    scope.add(parser.ASTNode('hi!'))
+    assert scope.get('hi!').topic == 'hi!'
+
+
+def test_clear_library_should_keep_scopes_in_place(story_library):
+    global_scope = story_library.global_scope
+    story_library.clear()
+    assert story_library.global_scope is global_scope
+    assert story_library.get_story_by_topic('hi!') is None
+
+
+def test_memoize_resolved_stack_path(story_library, mocker):
+    stack = [{
+        'topic': 'hi!'
+    }]
+    resolve = mocker.spy(story_library, 'resolve_story_by_topic')
+    story_1 = story_library.get_story_by_topic('How do you feel?', stack=stack)
+    story_2 = story_library.get_story_by_topic('How do you feel?', stack=stack)
+    assert story_1 is story_2
+    # once for the story and once for its parent
+    assert resolve.call_count == 2
+
+
+def test_reset_resolved_paths_once_library_was_changed(story_library):
+    assert story_library.get_story_by_topic('see you') is None
+    story_library.add_global(parser.ASTNode('see you'))
+    assert story_library.get_story_by_topic('see you').topic == 'see you'
+
+
+def test_reset_resolved_paths_once_story_was_added_to_local_scope(story_library):
+    stack = [{
+        'topic': 'hi!'
+    }]
+    assert story_library.get_story_by_topic('How do you feel?', stack=stack) is not None
+    assert story_library.get_story_by_topic('Are you sure?', stack=stack) is None
+
+    fork = story_library.get_story_by_topic('hi!').story_line[0]
+    fork.local_scope.add(parser.ASTNode('Are you sure?'))
+
+    assert story_library.get_story_by_topic('Are you sure?', stack=stack).topic == 'Are you sure?'
+
+
+def test_do_not_memoize_missed_story(story_library):
+    assert story_library.get_story_by_topic('see you') is None
+    assert story_library.resolved_paths == {}
@@ -1,5 +1,5 @@
 from botstory import ast, matchers
-from botstory.ast import forking
+from botstory.ast import forking, kinds
 import logging
 import json
 
@@ -44,8 +44,11 @@ class StoryLoopAPI:
 
 
 class StoriesLoopNode:
+    kind = kinds.LOOP
+
     def __init__(self, target):
         self.local_scope = ast.library.StoriesScope()
+        self.kinds = []
         self.story_line = []
         self.target = target
         self.topic = target.__name__
@@ -55,8 +58,7 @@ class StoriesLoopNode:
         return self.target.__name__
 
     def by_topic(self, topic):
-        stories = self.local_scope.by_topic(topic)
-        return stories[0] if len(stories) > 0 else None
+        return self.local_scope.get(topic)
 
     @property
     def children(self):
@@ -66,9 +68,9 @@ class StoriesLoopNode:
         return ScopeMatcher(forking.Switch(self.local_scope.all_filters()))
 
     def get_child_by_validation_result(self, topic):
-        case_stories = self.local_scope.by_topic(topic)
+        case_story = self.local_scope.get(topic)
 
-        if len(case_stories) == 0:
+        if case_story is None:
             logger.debug('#######################################')
             logger.debug('# [!] do not have any child here')
             logger.debug('# story node = {}'.format(self))
@@ -76,7 +78,7 @@ class StoriesLoopNode:
             logger.debug('#######################################')
             return None
 
-        return case_stories[0]
+        return case_story
 
     def match_children(self, key, value):
         return [child for child in self.local_scope.stories
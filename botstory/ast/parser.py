@@ -1,4 +1,5 @@
 from botstory import di
+from botstory.ast import kinds
 import logging
 import json
 
@@ -61,9 +62,17 @@ class Parser:
 
 
 class ASTNode:
+    kind = kinds.STORY
+
     def __init__(self, topic):
         self.compiled_story = None
         self.extensions = {}
+        # kinds of parts of story line (execution plan)
+        self.kinds = []
+        # topic -> the first part of story line with this topic
+        self.parts_by_topic = {}
+        # topic -> child stories of forks and loops of story line
+        self.children_by_topic = {}
         self.story_line = []
         self.story_names = set()
         self.topic = topic
@@ -84,8 +93,19 @@ class ASTNode:
 
         self.story_names.add(part_name)
         self.story_line.append(story_part)
+        kind = kinds.of(story_part)
+        self.kinds.append(kind)
+
+        topic = getattr(story_part, 'topic', None)
+        if topic is not None and topic not in self.parts_by_topic:
+            self.parts_by_topic[topic] = story_part
+        if kind in kinds.WITH_CHILDREN:
+            story_part.local_scope.watch(self)
         return story_part
 
+    def index_child(self, story):
+        self.children_by_topic.setdefault(story.topic, []).append(story)
+
     def to_json(self):
         return {
             'type': 'ASTNode',
@@ -1,8 +1,10 @@
 from botstory import di
 from botstory.ast import story_context
 from botstory.integrations import mocktracker
+from botstory.utils import trace
 
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -12,15 +14,21 @@ class StoryProcessor:
     def __init__(self, parser_instance, library):
         self.library = library
         self.parser_instance = parser_instance
-        self.tracker = mocktracker.MockTracker()
+        self.tracker = None
+        self.message_processed = None
+        self.story_processed = None
+        self.add_tracker(mocktracker.MockTracker())
 
     @di.inject()
     def add_tracker(self, tracker):
-        logger.debug('add_tracker')
-        logger.debug(tracker)
+        logger.debug('add_tracker %s', tracker)
         if not tracker:
             return
         self.tracker = tracker
+        # optional hooks of tracker. Resolve them once
+        # so other trackers don't have to implement them
+        self.message_processed = getattr(tracker, 'message_processed', None)
+        self.story_processed = getattr(tracker, 'story_processed', None)
 
     async def match_message(self, message_ctx):
         """
@@ -31,30 +39,39 @@ class StoryProcessor:
         :param message_ctx:
         :return: mutated message_ctx
         """
-        logger.debug('')
-        logger.debug('# match_message')
-        logger.debug('')
-        logger.debug(message_ctx)
-
         ctx = story_context.StoryContext(library=self.library,
                                          matched=False,
                                          message=message_ctx,
+                                         traced=trace.tracer.sample(),
                                          )
+        logger.debug('# match_message %s', ctx)
+        if ctx.traced:
+            trace.tracer.record(ctx, 'match_message')
 
+        started_at = time.perf_counter()
         self.tracker.new_message(ctx)
+        ctx, matched = await self.process_message(ctx)
+        if self.message_processed:
+            self.message_processed(ctx, matched, time.perf_counter() - started_at)
+        return ctx.message
+
+    async def process_message(self, ctx):
+        """
 
+        :param ctx:
+        :return: (mutated ctx, whether message was matched any story)
+        """
         if ctx.is_empty_stack():
             if not ctx.does_it_match_any_story():
                 # there is no stories for such message
-                return ctx.message
+                return ctx, False
 
             ctx = story_context.reducers.scope_in(ctx)
             ctx = await self.process_story(ctx)
             ctx = story_context.reducers.scope_out(ctx)
 
         while ctx.could_scope_out() and not ctx.is_empty_stack():
-            logger.debug('# in a loop')
-            logger.debug(ctx)
+            logger.debug('# in a loop %s', ctx)
 
             # looking for first valid matcher
             while True:
@@ -69,11 +86,11 @@ class StoryProcessor:
                         ctx = await self.process_story(ctx)
                         ctx = story_context.reducers.scope_out(ctx)
                         if ctx.is_empty_stack():
-                            return ctx.message
+                            return ctx, True
                     else:
                         logger.debug('  we have reach the bottom of stack '
                                      'so no once has receive this message')
-                        return ctx.message
+                        return ctx, False
 
                 if ctx.is_scope_level() and \
                         (ctx.has_child_story() or ctx.matched) and \
@@ -101,13 +118,10 @@ class StoryProcessor:
                 logger.debug('# the end of one story scope')
                 break
 
-        return ctx.message
+        return ctx, True
 
     async def process_story(self, ctx):
-        logger.debug('')
-        logger.debug('# process_story')
-        logger.debug('')
-        logger.debug(ctx)
+        logger.debug('# process_story %s', ctx)
 
         if ctx.is_scope_level():
             return story_context.reducers.enter_new_scope(ctx)
@@ -132,7 +146,11 @@ class StoryProcessor:
                     logger.debug('# process_story scope_out')
                     story_part_ctx = story_context.reducers.scope_out(story_part_ctx)
                 else:
+                    started_at = time.perf_counter()
+                    part_ctx = story_part_ctx
                     story_part_ctx = await story_context.reducers.execute(story_part_ctx)
+                    if self.story_processed:
+                        self.story_processed(part_ctx, time.perf_counter() - started_at)
 
                 if story_part_ctx.is_waiting_for_input():
                     return story_part_ctx
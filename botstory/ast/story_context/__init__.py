@@ -1,34 +1,50 @@
 from botstory import matchers, utils
-from botstory.ast import callable, forking, loop
+from botstory.ast import callable, forking, kinds, loop
 from botstory.ast.story_context import reducers
-from botstory.utils import advanced_json_encoder
+from botstory.utils import advanced_json_encoder, trace
+import itertools
 import numbers
 
 import logging
-import uuid
 
 logger = logging.getLogger(__name__)
 
+# cheap process-wide ids of contexts.
+# we need them only to trace chain of contexts in debug logs
+uid_counter = itertools.count()
+
 
 class MissedStoryPart(Exception):
     pass
 
 
 class StoryContext:
-    def __init__(self, message, library, matched=False, waiting_for=None, parent_uid=None):
-        self.uid = str(uuid.uuid4())
+    __slots__ = ('_uid', 'parent_uid', 'library', 'matched', 'message', 'traced', 'waiting_for')
+
+    def __init__(self, message, library, matched=False, waiting_for=None, parent_uid=None, traced=False):
+        self._uid = None
         self.parent_uid = parent_uid
         self.library = library
         # whether message was passed validation and was matched one story
         self.matched = matched
         self.message = message
+        # whether message was sampled by tracer
+        self.traced = traced
         self.waiting_for = waiting_for
 
+    @property
+    def uid(self):
+        # generate id lazily, only once someone (debug log) asks it
+        if self._uid is None:
+            self._uid = next(uid_counter)
+        return self._uid
+
     def clone(self):
         return StoryContext(library=self.library,
                             matched=self.matched,
                             message=self.message,
-                            parent_uid=self.uid,
+                            parent_uid=self.uid if self.traced or logger.isEnabledFor(logging.DEBUG) else None,
+                            traced=self.traced,
                             waiting_for=self.waiting_for,
                             )
 
@@ -55,21 +71,21 @@ class StoryContext:
         return self.compiled_story() is not None and not self.matched
 
     def get_child_story(self):
-        logger.debug('# get_child_story')
         """
         try child story that match message and get scope of it
         :return:
         """
+        logger.debug('# get_child_story')
         story_loop = self.compiled_story()
-        if hasattr(story_loop, 'children_matcher') and not self.matched:
+        if story_loop is not None and story_loop.kind == kinds.LOOP and not self.matched:
             return self.get_story_scope_child(story_loop)
 
-        story_part = self.get_current_story_part()
-
-        if not hasattr(story_part, 'get_child_by_validation_result'):
-            logger.debug('# does not have get_child_by_validation_result')
+        if self.get_current_story_part_kind() not in kinds.WITH_CHILDREN:
+            logger.debug('# does not have child stories')
             return None
 
+        story_part = self.get_current_story_part()
+
         if isinstance(self.waiting_for, forking.SwitchOnValue):
             logger.debug('# switch on value')
             return story_part.get_child_by_validation_result(self.waiting_for.value)
@@ -77,23 +93,16 @@ class StoryContext:
         # for some base classes we could try validate result direct
         child_story = story_part.get_child_by_validation_result(self.waiting_for)
         if child_story:
-            logger.debug('# child_story')
-            logger.debug(child_story)
+            logger.debug('# child_story %s', child_story.topic)
             return child_story
 
         stack_tail = self.stack_tail()
         if stack_tail['data'] is not None and not self.matched:
             validator = matchers.deserialize(stack_tail['data'])
-            logger.debug('# validator')
-            logger.debug(validator)
-            logger.debug('# self.message')
-            logger.debug(self.message)
             validation_result = validator.validate(self.message)
-            logger.debug('# validation_result')
-            logger.debug(validation_result)
             res = story_part.get_child_by_validation_result(validation_result)
-            logger.debug('# res')
-            logger.debug(res)
+            logger.debug('# validator %s got %s and match %s',
+                         validator, validation_result, trace.Lazy(getattr, res, 'topic', None))
             # or we validate message
             # but can't find right child story
             # maybe we should use independent validators for each story here
@@ -107,16 +116,12 @@ class StoryContext:
     def get_story_scope_child(self, story_part):
         logger.debug('# get_story_scope_child')
         validator = story_part.children_matcher()
-        logger.debug('# validator')
-        logger.debug(validator)
-        logger.debug('# self.message')
-        logger.debug(self.message)
         topic = validator.validate(self.message)
         # if topic == None:
         # we inside story loop scope
         # but got message that doesn't match
         # any local stories
-        logger.debug('# topic {}'.format(topic))
+        logger.debug('# validator %s got topic %s', validator, topic)
         return story_part.by_topic(topic)
 
     def get_current_story_part(self):
@@ -128,6 +133,15 @@ class StoryContext:
         except IndexError:
             return None
 
+    def get_current_story_part_kind(self):
+        compiled_story = self.compiled_story()
+        if not compiled_story:
+            return None
+        try:
+            return compiled_story.kinds[self.current_step()]
+        except IndexError:
+            return None
+
     def get_user_data(self):
         return get_user_data(self.message)
 
@@ -147,10 +161,11 @@ class StoryContext:
         return self.current_step() >= len(compiled_story.story_line)
 
     def is_scope_level(self):
-        return isinstance(self.compiled_story(), loop.StoriesLoopNode)
+        compiled_story = self.compiled_story()
+        return compiled_story is not None and compiled_story.kind == kinds.LOOP
 
     def is_scope_level_part(self):
-        return isinstance(self.get_current_story_part(), loop.StoriesLoopNode)
+        return self.get_current_story_part_kind() == kinds.LOOP
 
     def is_tail_of_story(self):
         compiled_story = self.compiled_story()
@@ -176,6 +191,21 @@ class StoryContext:
             raise MissedStoryPart()
         return stack[-1]
 
+    def summary(self):
+        """
+        light representation of context for debug logs.
+        It doesn't depend on size of session
+
+        :return:
+        """
+        return {
+            'uid': self.uid,
+            'parent_uid': self.parent_uid,
+            'matched': self.matched,
+            'stack': trace.stack_path(utils.safe_get(self.message, 'session', 'stack') or []),
+            'waiting_for': type(self.waiting_for).__name__,
+        }
+
     def to_json(self):
         return {
             'uid': self.uid,
@@ -190,7 +220,7 @@ class StoryContext:
 
     def __repr__(self):
         try:
-            return advanced_json_encoder.AdvancedJSONEncoder().encode(self.to_json())
+            return advanced_json_encoder.AdvancedJSONEncoder().encode(self.summary())
         except Exception as err:
             logger.warn(err)
             logger.warn('fail to dump json of message {} '
@@ -214,8 +244,6 @@ def get_message_data(ctx, *args, **kwargs):
 
 
 def get_message_attachment(ctx, attachment_type):
-    logger.debug('# get_message_data(ctx)')
-    logger.debug(get_message_data(ctx))
     attachment_list = get_message_data(ctx, 'attachments')
     if attachment_list is None or len(attachment_list) == 0:
         return None
@@ -1,7 +1,7 @@
 from botstory import matchers
-from botstory.ast import callable, loop, stack_utils, story_context
+from botstory.ast import callable, kinds, loop, stack_utils, story_context
+from botstory.utils import trace
 import logging
-import inspect
 
 logger = logging.getLogger(__name__)
 
@@ -28,11 +28,11 @@ async def execute(ctx):
     tail_depth = len(ctx.stack()) - 1
 
     story_part = ctx.get_current_story_part()
-    logger.debug('# going to call: {}'.format(story_part.__name__))
+    logger.debug('# going to call: %s', story_part.__name__)
     waiting_for = story_part(ctx.message)
-    if inspect.iscoroutinefunction(story_part):
+    if ctx.get_current_story_part_kind() in kinds.ASYNC:
         waiting_for = await waiting_for
-    logger.debug('# got result {}'.format(waiting_for))
+    logger.debug('# got result %s', waiting_for)
 
     # story part could run callable story and return its context
     if isinstance(waiting_for, story_context.StoryContext):
@@ -72,16 +72,10 @@ async def execute(ctx):
             )
             tail_step += 1
 
-    ctx.message = modify_stack_in_message(ctx.message,
-                                          lambda stack: stack[:tail_depth] +
-                                                        [{
-                                                            'data': tail_data,
-                                                            'step': tail_step,
-                                                            'topic': stack[tail_depth]['topic'],
-                                                        }] +
-                                                        stack[tail_depth + 1:])
-    logger.debug('# mutated ctx after execute')
-    logger.debug(ctx)
+    ctx.message = replace_stack_item(ctx.message, tail_depth, data=tail_data, step=tail_step)
+    logger.debug('# mutated ctx after execute %s', ctx)
+    if ctx.traced:
+        trace.tracer.record(ctx, 'execute')
     return ctx
 
 
@@ -101,15 +95,9 @@ def iterate_storyline(ctx):
                       len(compiled_story.story_line)):
         ctx = ctx.clone()
         tail = ctx.stack_tail()
-        ctx.message = modify_stack_in_message(ctx.message,
-                                              lambda stack: stack[:-1] + [{
-                                                  'data': tail['data'],
-                                                  'step': step,
-                                                  'topic': tail['topic'],
-                                              }])
+        ctx.message = replace_stack_item(ctx.message, -1, data=tail['data'], step=step)
 
-        logger.debug('# [{}] iterate'.format(step))
-        logger.debug(ctx)
+        logger.debug('# [%s] iterate %s', step, ctx)
 
         ctx = yield ctx
 
@@ -122,24 +110,19 @@ def scope_in(ctx):
     :param ctx:
     :return:
     """
-    logger.debug('# scope_in')
-    logger.debug(ctx)
+    logger.debug('# scope_in %s', ctx)
     ctx = ctx.clone()
 
     compiled_story = None
     if not ctx.is_empty_stack():
         compiled_story = ctx.get_child_story()
-        logger.debug('# child')
-        logger.debug(compiled_story)
+        logger.debug('# child %s', trace.Lazy(getattr, compiled_story, 'topic', None))
         # we match child story loop once by message
         # what should prevent multiple matching by the same message
         ctx.matched = True
-        ctx.message = modify_stack_in_message(ctx.message,
-                                              lambda stack: stack[:-1] + [{
-                                                  'data': matchers.serialize(callable.WaitForReturn()),
-                                                  'step': stack[-1]['step'],
-                                                  'topic': stack[-1]['topic']
-                                              }])
+        ctx.message = replace_stack_item(ctx.message, -1,
+                                         data=matchers.serialize(callable.WaitForReturn()),
+                                         step=ctx.current_step())
 
     try:
         if not compiled_story and ctx.is_scope_level_part():
@@ -150,11 +133,12 @@ def scope_in(ctx):
     if not compiled_story:
         compiled_story = ctx.compiled_story()
 
-    logger.debug('# [>] going deeper')
     ctx.message = modify_stack_in_message(ctx.message,
                                           lambda stack: stack + [
                                               stack_utils.build_empty_stack_item(compiled_story.topic)])
-    logger.debug(ctx)
+    logger.debug('# [>] going deeper %s', ctx)
+    if ctx.traced:
+        trace.tracer.record(ctx, 'scope_in')
     return ctx
 
 
@@ -167,29 +151,26 @@ def scope_out(ctx):
     :param ctx:
     :return:
     """
-    logger.debug('# scope_out')
-    logger.debug(ctx)
+    logger.debug('# scope_out %s', ctx)
     # we reach the end of story line
     # so we could collapse previous scope and related stack item
     if ctx.is_tail_of_story() and ctx.could_scope_out():
-        logger.debug('# [<] return')
         ctx = ctx.clone()
-        ctx.message['session']['stack'] = ctx.message['session']['stack'][:-1]
+        ctx.message = modify_stack_in_message(ctx.message,
+                                              lambda stack: stack[:-1])
         if not ctx.is_empty_stack() and \
                 (ctx.is_scope_level_part() or \
                          ctx.is_breaking_a_loop()):
             # isinstance(ctx.get_current_story_part(), loop.StoriesLoopNode) and \
             # isinstance(ctx.waiting_for, callable.EndOfStory) or \
-            ctx.message = modify_stack_in_message(ctx.message,
-                                                  lambda stack: stack[:-1] + [{
-                                                      'data': stack[-1]['data'],
-                                                      'step': stack[-1]['step'] + 1,
-                                                      'topic': stack[-1]['topic'],
-                                                  }])
+            tail = ctx.stack_tail()
+            ctx.message = replace_stack_item(ctx.message, -1, data=tail['data'], step=tail['step'] + 1)
             if ctx.is_breaking_a_loop() and not ctx.is_scope_level():
                 ctx.waiting_for = None
 
-        logger.debug(ctx)
+        logger.debug('# [<] return %s', ctx)
+        if ctx.traced:
+            trace.tracer.record(ctx, 'scope_out')
 
     return ctx
 
@@ -202,3 +183,31 @@ def modify_stack_in_message(message, mutator):
             'stack': mutator(message['session']['stack']),
         }
     }
+
+
+def replace_stack_item(message, depth, data, step):
+    """
+    replace data and step of one stack item.
+    Stack list is copied (it is persisted as a list),
+    but other stack items aren't. They are shared with the source message
+
+    :param message:
+    :param depth: index of stack item
+    :param data:
+    :param step:
+    :return: new message
+    """
+    stack = list(message['session']['stack'])
+    item = stack[depth]
+    stack[depth] = {
+        'data': data,
+        'step': step,
+        'topic': item['topic'],
+    }
+    return {
+        **message,
+        'session': {
+            **message['session'],
+            'stack': stack,
+        }
+    }
@@ -182,3 +182,66 @@ def test_scope_in_immutability(build_mock_context):
     ctx_after = story_context.reducers.scope_in(ctx_before)
     assert ctx_after != ctx_before
     assert ctx_after.stack() != ctx_before.stack()
+
+
+def test_scope_out_should_not_mutate_source_stack(build_mock_context):
+    ctx_before = build_mock_context({
+        'session': {
+            'stack': [{
+                'data': None,
+                'step': 2,
+                'topic': 'one_story',
+            }],
+        },
+        'user': None,
+        'data': None,
+    })
+    ctx_after = story_context.reducers.scope_out(ctx_before)
+    assert ctx_after.is_empty_stack()
+    assert len(ctx_before.stack()) == 1
+
+
+def test_replace_stack_item_should_share_rest_of_stack():
+    message = {
+        'session': {
+            'stack': [{
+                'data': None,
+                'step': 1,
+                'topic': 'one_story',
+            }, {
+                'data': None,
+                'step': 0,
+                'topic': 'location_case',
+            }],
+        },
+        'user': None,
+    }
+    new_message = story_context.reducers.replace_stack_item(message, -1, data=None, step=1)
+    assert new_message['session']['stack'][0] is message['session']['stack'][0]
+    assert new_message['session']['stack'][-1] == {
+        'data': None,
+        'step': 1,
+        'topic': 'location_case',
+    }
+    assert message['session']['stack'][-1]['step'] == 0
+
+
+def test_replace_middle_stack_item_should_share_other_items():
+    stack = [{
+        'data': None,
+        'step': step,
+        'topic': 'story_{}'.format(step),
+    } for step in range(4)]
+    message = {
+        'session': {
+            'stack': stack,
+        },
+        'user': None,
+    }
+    new_message = story_context.reducers.replace_stack_item(message, 1, data={'a': 1}, step=5)
+    new_stack = new_message['session']['stack']
+    assert new_stack is not stack
+    assert all(new_stack[i] is stack[i] for i in (0, 2, 3))
+    assert new_stack[1] is not stack[1]
+    assert new_stack[1] == {'data': {'a': 1}, 'step': 5, 'topic': 'story_1'}
+    assert stack[1] == {'data': None, 'step': 1, 'topic': 'story_1'}
@@ -84,3 +84,31 @@ def test_set_message_data():
             }
         }
     }
+
+
+def test_generate_uid_lazily():
+    ctx = story_context.StoryContext(message={}, library=None)
+    assert ctx._uid is None
+    uid = ctx.uid
+    assert uid is not None
+    assert ctx.uid == uid
+    assert story_context.StoryContext(message={}, library=None).uid != uid
+
+
+def test_clone_should_share_message():
+    ctx = story_context.StoryContext(message={'session': {'stack': []}}, library=None)
+    assert not hasattr(ctx, '__dict__')
+    ctx_clone = ctx.clone()
+    assert ctx_clone is not ctx
+    assert ctx_clone.message is ctx.message
+
+
+def test_repr_should_not_dump_session_data():
+    ctx = story_context.StoryContext(message={
+        'session': {
+            'data': {'secret': 'x' * 1000},
+            'stack': [{'topic': 'one_story', 'step': 1, 'data': None}],
+        },
+    }, library=None)
+    assert 'secret' not in repr(ctx)
+    assert 'one_story:1' in repr(ctx)
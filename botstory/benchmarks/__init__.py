@@ -0,0 +1,2 @@
+from .runner import compare, load, measure, Result, save
+from .workloads import ALL, Workload
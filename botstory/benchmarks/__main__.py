@@ -0,0 +1,73 @@
+"""
+offline benchmarks of story engine
+
+Usage:
+
+    python -m botstory.benchmarks --output results.json
+    python -m botstory.benchmarks --baseline results.json
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from . import runner, workloads
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m botstory.benchmarks')
+    parser.add_argument('workloads', nargs='*',
+                        help='names of workloads: {}'.format(
+                            ', '.join(w.name for w in workloads.ALL)))
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='concurrency of `many_users` workload is at least 100')
+    parser.add_argument('--allocations', type=int, default=200,
+                        help='messages of allocation tracing pass. 0 - skip it')
+    parser.add_argument('--output', help='save results to json file')
+    parser.add_argument('--baseline', help='compare results with saved json file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative tolerance of regression')
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    selected = [w for w in workloads.ALL
+                if not args.workloads or w.name in args.workloads]
+    results = []
+    for workload_class in selected:
+        concurrency = args.concurrency
+        if workload_class is workloads.ManyUsers:
+            concurrency = max(concurrency, 100)
+        result = await runner.measure(workload_class(),
+                                      messages=args.messages,
+                                      concurrency=concurrency,
+                                      allocations=args.allocations)
+        report = result.to_json()
+        print('{name:>18}: {messages_per_sec:10.1f} msg/s  '
+              'p50 {p50_ms:7.3f} ms  p99 {p99_ms:7.3f} ms  '
+              'alloc {allocated_bytes_per_message} B/msg'.format(**report))
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    # debug logs of engine would dominate measurements
+    logging.disable(logging.INFO)
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    results = asyncio.get_event_loop().run_until_complete(run(args))
+
+    if args.output:
+        runner.save(results, args.output)
+
+    if args.baseline:
+        regressions = runner.compare(runner.load(args.baseline), results, args.threshold)
+        for name, metric, before, after in regressions:
+            print('regression of {} {}: {} -> {}'.format(name, metric, before, after))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, p):
+    """
+    nearest-rank percentile
+
+    :param values: sorted list
+    :param p: 0..100
+    :return:
+    """
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values))) - 1))
+    return values[index]
+
+
+class Result:
+    def __init__(self, name, messages, concurrency, elapsed, latencies,
+                 allocated_bytes=None, retained_blocks=None):
+        self.name = name
+        self.messages = messages
+        self.concurrency = concurrency
+        self.elapsed = elapsed
+        self.latencies = sorted(latencies)
+        self.allocated_bytes = allocated_bytes
+        self.retained_blocks = retained_blocks
+
+    @property
+    def messages_per_sec(self):
+        return self.messages / self.elapsed if self.elapsed else None
+
+    def to_json(self):
+        return {
+            'name': self.name,
+            'messages': self.messages,
+            'concurrency': self.concurrency,
+            'elapsed': self.elapsed,
+            'messages_per_sec': self.messages_per_sec,
+            'p50_ms': percentile(self.latencies, 50) * 1000,
+            'p99_ms': percentile(self.latencies, 99) * 1000,
+            # peak of memory which we allocate to process one message
+            'allocated_bytes_per_message': self.allocated_bytes,
+            # memory blocks which are still alive after message
+            'retained_blocks_per_message': self.retained_blocks,
+        }
+
+    def __repr__(self):
+        return json.dumps(self.to_json())
+
+
+async def measure(workload, messages=1000, concurrency=1, allocations=100):
+    """
+    drive workload and measure throughput, latency and allocations
+
+    :param workload: workloads.Workload
+    :param messages: number of messages
+    :param concurrency: number of messages which we process at the same time
+    :param allocations: number of messages of (slow) allocation tracing pass.
+    0 - don't trace allocations
+    :return: Result
+    """
+    await workload.setup()
+    try:
+        # warm up caches of library and matchers
+        for i in range(min(messages, 10)):
+            await workload.send(i)
+
+        latencies = []
+
+        async def send(i):
+            started_at = time.perf_counter()
+            await workload.send(i)
+            latencies.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        for offset in range(0, messages, concurrency):
+            await asyncio.gather(*[
+                send(i) for i in range(offset, min(offset + concurrency, messages))
+            ])
+        elapsed = time.perf_counter() - started_at
+
+        allocated_bytes, retained_blocks = None, None
+        if allocations > 0:
+            allocated_bytes, retained_blocks = await measure_allocations(workload, allocations)
+
+        return Result(workload.name, messages, concurrency, elapsed, latencies,
+                      allocated_bytes=allocated_bytes,
+                      retained_blocks=retained_blocks)
+    finally:
+        await workload.teardown()
+
+
+async def measure_allocations(workload, messages):
+    """
+    tracemalloc slows down execution,
+    so we trace allocations in the separate pass
+
+    :param workload:
+    :param messages:
+    :return: (mean peak of allocated bytes, mean number of retained blocks)
+    """
+    peaks = 0
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    try:
+        for i in range(messages):
+            # reset peak of traced memory
+            tracemalloc.clear_traces()
+            await workload.send(i)
+            peaks += tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    retained = sys.getallocatedblocks() - blocks_before
+    return peaks / messages, max(retained, 0) / messages
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+    }
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump({
+            'time': time.time(),
+            'environment': environment(),
+            'results': [r.to_json() for r in results],
+        }, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, results, threshold=0.1):
+    """
+    find regressions of results against saved baseline
+
+    :param baseline: saved json (see `save`)
+    :param results: list of Result
+    :param threshold: relative tolerance
+    :return: list of (workload name, metric, baseline value, current value)
+    """
+    previous = {r['name']: r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(result.name, None)
+        if before is None:
+            continue
+        after = result.to_json()
+        # the higher the better
+        if before['messages_per_sec'] and \
+                after['messages_per_sec'] < before['messages_per_sec'] * (1 - threshold):
+            regressions.append((result.name, 'messages_per_sec',
+                                before['messages_per_sec'], after['messages_per_sec']))
+        # the lower the better
+        for metric in ['p50_ms', 'p99_ms', 'allocated_bytes_per_message']:
+            if before.get(metric) and after.get(metric) is not None and \
+                    after[metric] > before[metric] * (1 + threshold):
+                regressions.append((result.name, metric, before[metric], after[metric]))
+    return regressions
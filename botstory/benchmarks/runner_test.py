@@ -0,0 +1,32 @@
+import pytest
+from . import runner, workloads
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert runner.percentile(values, 50) == 50
+    assert runner.percentile(values, 99) == 99
+    assert runner.percentile([], 50) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('workload_class', workloads.ALL)
+async def test_measure_workload(workload_class):
+    result = await runner.measure(workload_class(), messages=20, concurrency=2, allocations=2)
+    report = result.to_json()
+    assert report['name'] == workload_class.name
+    assert report['messages'] == 20
+    assert report['messages_per_sec'] > 0
+    assert report['p50_ms'] <= report['p99_ms']
+    assert report['allocated_bytes_per_message'] > 0
+
+
+def test_save_and_compare_with_baseline(tmpdir):
+    path = str(tmpdir.join('results.json'))
+    runner.save([runner.Result('flat', 100, 1, 1.0, [0.01] * 100)], path)
+    baseline = runner.load(path)
+
+    assert runner.compare(baseline, [runner.Result('flat', 100, 1, 1.05, [0.01] * 100)]) == []
+
+    regressions = runner.compare(baseline, [runner.Result('flat', 100, 1, 2.0, [0.02] * 100)])
+    assert [metric for _, metric, _, _ in regressions] == ['messages_per_sec', 'p50_ms', 'p99_ms']
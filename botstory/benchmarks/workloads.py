@@ -0,0 +1,251 @@
+import botstory
+from botstory import utils
+from botstory.ast import callable
+from botstory.integrations import mockdb, mockhttp
+from botstory.integrations.fb import messenger
+from botstory.middlewares import text
+from botstory.utils import answer
+
+
+class Workload:
+    """
+    one benchmark scenario.
+    Each user talks with its own session
+    """
+
+    name = None
+
+    def __init__(self, users=1):
+        """
+
+        :param users: number of users who talk with bot
+        """
+        self.users = [utils.build_fake_user() for _ in range(users)]
+        self.sessions = [utils.build_fake_session(user) for user in self.users]
+        self.story = None
+
+    async def setup(self):
+        self.story = botstory.Story()
+        self.define(self.story)
+        await self.story.start()
+
+    async def teardown(self):
+        await self.story.stop()
+        self.story.clear()
+
+    def define(self, story):
+        raise NotImplementedError()
+
+    def text(self, i):
+        raise NotImplementedError()
+
+    async def send(self, i):
+        """
+        send i-th message from one of users
+
+        :param i:
+        :return:
+        """
+        index = i % len(self.users)
+        ctx = await answer.pure_text(self.text(i // len(self.users)),
+                                     session=self.sessions[index],
+                                     user=self.users[index],
+                                     story=self.story)
+        self.sessions[index] = ctx['session']
+
+
+class FlatStories(Workload):
+    """
+    many global stories with one part
+    """
+
+    name = 'flat'
+
+    def __init__(self, stories=100, **kwargs):
+        super().__init__(**kwargs)
+        self.stories = stories
+
+    def define(self, story):
+        for i in range(self.stories):
+            def one_story():
+                @story.part()
+                def greet(ctx):
+                    pass
+
+            one_story.__name__ = 'story_{}'.format(i)
+            story.on('hi {}'.format(i))(one_story)
+
+    def text(self, i):
+        return 'hi {}'.format(i % self.stories)
+
+
+class ManyUsers(FlatStories):
+    """
+    flat stories of many users who talk at the same time
+    """
+
+    name = 'many_users'
+
+    def __init__(self, users=100, **kwargs):
+        super().__init__(users=users, **kwargs)
+
+
+class NestedCallables(Workload):
+    """
+    global story calls chain of nested callable stories
+    """
+
+    name = 'nested_callables'
+
+    def __init__(self, depth=10, **kwargs):
+        super().__init__(**kwargs)
+        self.depth = depth
+
+    def define(self, story):
+        def innermost():
+            @story.part()
+            def finish(ctx):
+                return callable.EndOfStory()
+
+        innermost.__name__ = 'callable_{}'.format(self.depth)
+        inner = story.callable()(innermost)
+
+        for level in reversed(range(self.depth)):
+            def one_callable(inner=inner):
+                @story.part()
+                async def go_deeper(ctx):
+                    return await inner(ctx)
+
+                @story.part()
+                def finish(ctx):
+                    return callable.EndOfStory()
+
+            one_callable.__name__ = 'callable_{}'.format(level)
+            inner = story.callable()(one_callable)
+
+        @story.on('deep')
+        def deep_story(inner=inner):
+            @story.part()
+            async def call(ctx):
+                return await inner(ctx)
+
+    def text(self, i):
+        return 'deep'
+
+
+class LoopWithManyCases(Workload):
+    """
+    user stays inside of loop with many local stories
+    """
+
+    name = 'loop'
+
+    def __init__(self, cases=50, **kwargs):
+        super().__init__(**kwargs)
+        self.cases = cases
+
+    def define(self, story):
+        cases = self.cases
+
+        @story.on('enter')
+        def enter_loop():
+            @story.loop()
+            def commands():
+                for i in range(cases):
+                    def one_command():
+                        @story.part()
+                        def do_command(ctx):
+                            pass
+
+                    one_command.__name__ = 'command_{}'.format(i)
+                    story.on('command {}'.format(i))(one_command)
+
+    def text(self, i):
+        if i == 0:
+            return 'enter'
+        return 'command {}'.format(i % self.cases)
+
+
+class Forking(Workload):
+    """
+    story waits for answer and switches on it
+    """
+
+    name = 'forking'
+
+    def __init__(self, cases=20, **kwargs):
+        super().__init__(**kwargs)
+        self.cases = cases
+
+    def define(self, story):
+        cases = self.cases
+
+        @story.on('choose')
+        def choose_story():
+            @story.part()
+            def ask(ctx):
+                return text.Any()
+
+            for i in range(cases):
+                def one_case():
+                    @story.part()
+                    def chosen(ctx):
+                        pass
+
+                one_case.__name__ = 'case_{}'.format(i)
+                story.case(validator=text.Equal('option {}'.format(i)))(one_case)
+
+    def text(self, i):
+        if i % 2 == 0:
+            return 'choose'
+        return 'option {}'.format(i // 2 % self.cases)
+
+
+class Messenger(FlatStories):
+    """
+    full path of facebook messenger webhook with mock storage and http
+    """
+
+    name = 'messenger'
+
+    async def setup(self):
+        self.story = botstory.Story()
+        self.interface = self.story.use(messenger.FBInterface(page_access_token='benchmark'))
+        self.story.use(mockhttp.MockHttpInterface())
+        self.story.use(mockdb.MockDB())
+        self.define(self.story)
+        await self.story.start()
+
+    async def send(self, i):
+        user = self.users[i % len(self.users)]
+        await self.interface.process({
+            'object': 'page',
+            'entry': [{
+                'id': 'PAGE_ID',
+                'time': 1473204787206,
+                'messaging': [{
+                    'sender': {
+                        'id': user['facebook_user_id'],
+                    },
+                    'recipient': {
+                        'id': 'PAGE_ID',
+                    },
+                    'timestamp': 1458692752478,
+                    'message': {
+                        'mid': 'mid.{}'.format(i),
+                        'seq': i,
+                        'text': self.text(i),
+                    },
+                }],
+            }],
+        })
+
+
+ALL = [
+    FlatStories,
+    NestedCallables,
+    LoopWithManyCases,
+    Forking,
+    ManyUsers,
+    Messenger,
+]
@@ -1,14 +1,44 @@
 import asyncio
+import functools
 import logging
 
+from . import di, utils
 from .middlewares import any, location, text
+from .utils import scheduler
 
 logger = logging.getLogger(__name__)
 
 
+@di.desc(reg=False)
 class Chat:
-    def __init__(self):
+    def __init__(self, rate_limits=None):
+        """
+
+        :param rate_limits: options of OutboundScheduler
+        (page_rate, recipient_rate and etc)
+        """
         self.interfaces = {}
+        self.scheduler = scheduler.OutboundScheduler(**(rate_limits or {}))
+
+    def send(self, interface, user, options, fn):
+        """
+        schedule sending of message through interface
+        respecting rate limits of page and of user.
+        Use `options={'priority': 'broadcast'}` for non urgent messages
+
+        :param interface:
+        :param user: recipient
+        :param options:
+        :param fn: coroutine function (without arguments) which sends message
+        :return:
+        """
+        recipient = utils.safe_get(user, '_id') or utils.safe_get(user, 'facebook_user_id')
+        return self.scheduler.run(
+            (interface.type, getattr(interface, 'token', None)),
+            recipient,
+            (options or {}).get('priority', 'reply'),
+            fn,
+        )
 
     async def ask(self, body, quick_replies=None, options=None, user=None):
         """
@@ -42,10 +72,12 @@ class Chat:
         return [location.Any(), text.Any()]
 
     async def list_elements(self, elements, buttons, user, options):
-        tasks = [interface.send_list(recipient=user,
-                                     elements=elements,
-                                     buttons=buttons,
-                                     options=options)
+        tasks = [self.send(interface, user, options,
+                           functools.partial(interface.send_list,
+                                             recipient=user,
+                                             elements=elements,
+                                             buttons=buttons,
+                                             options=options))
                  for _, interface in self.interfaces.items()]
 
         res = [body for body in await asyncio.gather(*tasks)]
@@ -71,16 +103,22 @@ class Chat:
         :param options:
         :return:
         """
-        tasks = [interface.send_audio(user, url, options) for _, interface in self.interfaces.items()]
+        tasks = [self.send(interface, user, options,
+                           functools.partial(interface.send_audio, user, url, options))
+                 for _, interface in self.interfaces.items()]
         return [body for body in await asyncio.gather(*tasks)]
 
     async def send_image(self, url, user, options=None):
-        tasks = [interface.send_image(user, url, options) for _, interface in self.interfaces.items()]
+        tasks = [self.send(interface, user, options,
+                           functools.partial(interface.send_image, user, url, options))
+                 for _, interface in self.interfaces.items()]
         return [body for body in await asyncio.gather(*tasks)]
 
     async def send_template(self, payload, user):
-        tasks = [interface.send_template(recipient=user,
-                                         payload=payload)
+        tasks = [self.send(interface, user, None,
+                           functools.partial(interface.send_template,
+                                             recipient=user,
+                                             payload=payload))
                  for _, interface in self.interfaces.items()]
 
         res = [body for body in await asyncio.gather(*tasks)]
@@ -97,7 +135,8 @@ class Chat:
         :return:
         """
         logger.debug('async_send_text_message_to_all_interfaces')
-        tasks = [interface.send_text_message(*args, **kwargs)
+        tasks = [self.send(interface, kwargs.get('recipient', None), kwargs.get('options', None),
+                           functools.partial(interface.send_text_message, *args, **kwargs))
                  for _, interface in self.interfaces.items()]
 
         logger.debug('  tasks')
@@ -110,7 +149,7 @@ class Chat:
 
     async def start_typing(self, user):
         logger.debug('# start typing')
-        tasks = [interface.start_typing(user)
+        tasks = [self.send(interface, user, None, functools.partial(interface.start_typing, user))
                  for _, interface in self.interfaces.items()]
 
         res = [body for body in await asyncio.gather(*tasks)]
@@ -118,7 +157,7 @@ class Chat:
 
     async def stop_typing(self, user):
         logger.debug('# stop typing')
-        tasks = [interface.stop_typing(user)
+        tasks = [self.send(interface, user, None, functools.partial(interface.stop_typing, user))
                  for _, interface in self.interfaces.items()]
 
         res = [body for body in await asyncio.gather(*tasks)]
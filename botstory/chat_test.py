@@ -289,3 +289,29 @@ async def test_send_image(mock_interface):
                                user=talk.user)
 
         mock_interface.send_image.assert_called_once_with(talk.user, 'http://some.ua/image.gif', None)
+
+
+@pytest.mark.asyncio
+async def test_should_not_delay_reply_of_many_messages_by_default(mock_interface):
+    with answer.Talk() as talk:
+        story = talk.story
+        story.use(mock_interface)
+
+        @story.on('hi there!')
+        def one_story():
+            @story.part()
+            async def then(message):
+                for i in range(20):
+                    await story.send_image('http://shevchenko.ua/image.gif', message['user'])
+                    await story.say('message {}'.format(i), message['user'])
+
+        await talk.pure_text('hi there!')
+
+        assert mock_interface.send_text_message.call_count == 20
+        assert story.chat.scheduler.stats()['waited'] < 0.01
+
+
+def test_pass_rate_limits_to_scheduler():
+    story = Story(rate_limits={'recipient_rate': 1, 'recipient_capacity': 2})
+    assert story.chat.scheduler.recipient_rate == 1
+    assert story.chat.scheduler.recipient_capacity == 2
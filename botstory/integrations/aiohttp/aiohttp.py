@@ -1,23 +1,100 @@
 import aiohttp
 from aiohttp import client_exceptions, web
 import asyncio
+import contextlib
+import hashlib
+import hmac
 import logging
 import json as _json
 import urllib
+import weakref
 from yarl import URL
 
 from ..commonhttp import errors as common_errors, statuses
 from ... import di
+from ...utils import trace
 
 logger = logging.getLogger(__name__)
 
 
+try:
+    # optional faster json decoder
+    import ujson as fast_json
+except ImportError:  # pragma: no cover
+    fast_json = None
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
 class WebhookHandler:
-    def __init__(self, handler):
+    """
+    read and validate body of incoming webhook request
+    before we pass it to handler:
+
+    - reject too large body (413) without reading it to the end
+    - check `X-Hub-Signature` of body once we know app secret (403)
+    - reject malformed json or not an object (400)
+    """
+
+    def __init__(self, handler, app_secret=None, max_body_size=1024 * 1024, use_fast_json=True):
+        """
+
+        :param handler: coroutine function which receives decoded body
+        :param app_secret: secret of fb app to check signature of request
+        :param max_body_size: max size of body in bytes
+        :param use_fast_json: use ujson once it is installed
+        """
         self.handler = handler
+        self.app_secret = app_secret
+        self.max_body_size = max_body_size
+        self.loads = fast_json.loads if use_fast_json and fast_json else _json.loads
+
+    async def read_body(self, request):
+        """
+        :param request:
+        :return: body or None if it exceeds max_body_size
+        """
+        if request.content_length is not None and request.content_length > self.max_body_size:
+            return None
+        chunks = []
+        size = 0
+        while True:
+            chunk = await request.content.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_body_size:
+                return None
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def is_signed(self, request, body):
+        signature = request.headers.get('X-Hub-Signature', '')
+        expected = 'sha1=' + hmac.new(self.app_secret.encode('utf-8'), body, hashlib.sha1).hexdigest()
+        return hmac.compare_digest(signature, expected)
 
     async def handle(self, request):
-        res = await self.handler(await request.json())
+        body = await self.read_body(request)
+        if body is None:
+            logger.warning('reject webhook request. Body exceeds {} bytes'.format(self.max_body_size))
+            return web.Response(text='Request entity too large',
+                                status=statuses.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        if self.app_secret and not self.is_signed(request, body):
+            logger.warning('reject webhook request with wrong signature')
+            return web.Response(text='Wrong signature',
+                                status=statuses.HTTP_403_FORBIDDEN)
+
+        try:
+            data = self.loads(body.decode('utf-8'))
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            logger.warning('reject malformed webhook request')
+            return web.Response(text='Malformed request',
+                                status=statuses.HTTP_400_BAD_REQUEST)
+
+        res = await self.handler(data)
         return web.Response(**res)
 
 
@@ -29,13 +106,69 @@ class WebhookException(Exception):
     pass
 
 
+class PooledTCPConnector(aiohttp.TCPConnector):
+    """
+    TCP connector which counts whether we got keep-alive
+    connection from the pool (hit) or should open new one (miss)
+
+    we only wrap public `connect` and recognize reused connection
+    by its protocol, so we don't depend on internals of connector
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hits = 0
+        self.misses = 0
+        # protocols of connections which we have already got
+        self.protocols = weakref.WeakSet()
+
+    async def connect(self, req):
+        conn = await super().connect(req)
+        if conn.protocol in self.protocols:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.protocols.add(conn.protocol)
+        return conn
+
+
 @di.desc('http', reg=False)
 class AioHttpInterface:
     def __init__(self, host='0.0.0.0', port=None,
                  shutdown_timeout=60.0, ssl_context=None,
                  backlog=128, auto_start=True,
                  middlewares=[],
+                 app_secret=None,
+                 conn_timeout=None,
+                 keepalive_timeout=15.0,
+                 limit=100,
+                 limit_per_host=0,
+                 read_timeout=None,
+                 ttl_dns_cache=10,
+                 use_dns_cache=True,
+                 max_body_size=1024 * 1024,
+                 use_fast_json=True,
                  ):
+        """
+
+        :param host:
+        :param port:
+        :param shutdown_timeout:
+        :param ssl_context:
+        :param backlog:
+        :param auto_start:
+        :param middlewares:
+        :param app_secret: secret of fb app. Once we have it we check signature of webhook requests
+        :param conn_timeout: timeout for establishing of outgoing connection
+        :param keepalive_timeout: how long idle outgoing connection lives in the pool
+        :param limit: total number of simultaneous outgoing connections
+        :param limit_per_host: number of simultaneous connections to one host (0 - unlimited)
+        :param read_timeout: timeout of reading response of outgoing request
+        :param ttl_dns_cache: how long (in seconds) we cache resolved DNS entries
+        :param use_dns_cache: should we cache resolved DNS entries
+        :param max_body_size: max size (in bytes) of webhook request body
+        :param use_fast_json: decode webhook requests with ujson once it is installed
+        """
         if port is None:
             if not ssl_context:
                 port = 8080
@@ -51,16 +184,35 @@ class AioHttpInterface:
         self.ssl_context = ssl_context
         self.auto_start = auto_start
 
+        self.app_secret = app_secret
+        self.max_body_size = max_body_size
+        self.use_fast_json = use_fast_json
+
+        self.conn_timeout = conn_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.read_timeout = read_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.use_dns_cache = use_dns_cache
+
         self.app = None
         self.session = None
+        self.session_owner = False
         self.server = None
         self.handler = None
         self.webhook_token = None
+        self.http_processed = None
+
+    @di.inject()
+    def add_tracker(self, tracker):
+        # optional hook of tracker
+        self.http_processed = getattr(tracker, 'http_processed', None)
 
+    @trace.timed('http_processed')
     async def get(self, url, params=None, headers=None):
         logger.debug('get url={}'.format(url))
-        loop = asyncio.get_event_loop()
-        with aiohttp.ClientSession(loop=loop) as session:
+        with self.session_scope() as session:
             return await(await self.method(
                 method_type='get',
                 session=session,
@@ -69,10 +221,10 @@ class AioHttpInterface:
                 headers=headers,
             )).json()
 
+    @trace.timed('http_processed')
     async def get_raw(self, url, params=None, headers=None):
         logger.debug('get url={}'.format(url))
-        loop = asyncio.get_event_loop()
-        with aiohttp.ClientSession(loop=loop) as session:
+        with self.session_scope() as session:
             res = await self.method(
                 method_type='get',
                 session=session,
@@ -86,12 +238,12 @@ class AioHttpInterface:
                 'text': await res.text(),
             }
 
+    @trace.timed('http_processed')
     async def post(self, url, params=None, headers=None, json=None):
         logger.debug('post url={}'.format(url))
         headers = headers or {}
         headers['Content-Type'] = headers.get('Content-Type', 'application/json')
-        loop = asyncio.get_event_loop()
-        with aiohttp.ClientSession(loop=loop) as session:
+        with self.session_scope() as session:
             return await(await self.method(
                 method_type='post',
                 session=session,
@@ -101,12 +253,12 @@ class AioHttpInterface:
                 data=_json.dumps(json),
             )).json()
 
+    @trace.timed('http_processed')
     async def post_raw(self, url, params=None, headers=None, json=None):
         logger.debug('post url={}'.format(url))
         headers = headers or {}
         headers['Content-Type'] = headers.get('Content-Type', 'application/json')
-        loop = asyncio.get_event_loop()
-        with aiohttp.ClientSession(loop=loop) as session:
+        with self.session_scope() as session:
             res = await self.method(
                 method_type='post',
                 session=session,
@@ -121,12 +273,12 @@ class AioHttpInterface:
                 'text': await res.text(),
             }
 
+    @trace.timed('http_processed')
     async def delete(self, url, params=None, headers=None, json=None):
         logger.debug('delete url={}'.format(url))
         headers = headers or {}
         headers['Content-Type'] = headers.get('Content-Type', 'application/json')
-        loop = asyncio.get_event_loop()
-        with aiohttp.ClientSession(loop=loop) as session:
+        with self.session_scope() as session:
             return await(await self.method(
                 method_type='delete',
                 session=session,
@@ -136,6 +288,53 @@ class AioHttpInterface:
                 data=_json.dumps(json),
             )).json()
 
+    @contextlib.contextmanager
+    def session_scope(self):
+        """
+        use long-lived (pooled) session once we have it
+        otherwise fallback to one-off session
+        (for example if we send request before start)
+
+        :return:
+        """
+        if self.session:
+            yield self.session
+            return
+
+        loop = asyncio.get_event_loop()
+        with aiohttp.ClientSession(loop=loop) as session:
+            yield session
+
+    def create_session(self):
+        loop = asyncio.get_event_loop()
+        logger.debug('create pooled client session')
+        connector = PooledTCPConnector(
+            keepalive_timeout=self.keepalive_timeout,
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            loop=loop,
+            ttl_dns_cache=self.ttl_dns_cache,
+            use_dns_cache=self.use_dns_cache,
+        )
+        return aiohttp.ClientSession(
+            conn_timeout=self.conn_timeout,
+            connector=connector,
+            loop=loop,
+            read_timeout=self.read_timeout,
+        )
+
+    def pool_stats(self):
+        """
+        how often we have reused connection from the pool
+
+        :return:
+        """
+        connector = getattr(self.session, 'connector', None)
+        return {
+            'hits': getattr(connector, 'hits', 0),
+            'misses': getattr(connector, 'misses', 0),
+        }
+
     async def method(self, method_type, session, url, **kwargs):
         # be able to mock session from outside
         session = self.session or session
@@ -191,7 +390,27 @@ class AioHttpInterface:
             raise WebhookException('Aiohttp extension is already started. '
                                    'We should change webhook before aiohttp is started.')
         self.get_app().router.add_get(uri, self.handle_webhook_validation)
-        self.get_app().router.add_post(uri, WebhookHandler(handler).handle)
+        self.get_app().router.add_post(uri, WebhookHandler(
+            handler,
+            app_secret=self.app_secret,
+            max_body_size=self.max_body_size,
+            use_fast_json=self.use_fast_json,
+        ).handle)
+
+    def add_route(self, method, uri, handler):
+        """
+        register extra route (for example `/metrics`)
+
+        :param method: GET, POST and etc
+        :param uri:
+        :param handler: coroutine function which gets request
+        :return:
+        """
+        logger.debug('register route {} {}'.format(method, uri))
+        if self.get_app().frozen:
+            raise WebhookException('Aiohttp extension is already started. '
+                                   'We should add routes before aiohttp is started.')
+        self.get_app().router.add_route(method, uri, handler)
 
     def handle_webhook_validation(self, request):
         params = {name: value[0] for name, value in urllib.parse.parse_qs(request.query_string).items()}
@@ -205,6 +424,10 @@ class AioHttpInterface:
 
     async def start(self):
         logger.debug('start')
+        if not self.session:
+            self.session = self.create_session()
+            self.session_owner = True
+
         if not self.has_app():
             logger.debug('does not have app')
             return
@@ -238,7 +461,15 @@ class AioHttpInterface:
 
     async def stop(self):
         logger.debug('stop')
-
+        try:
+            await self.stop_server()
+        finally:
+            # webhook handlers which are still finishing
+            # could send requests through the pooled session,
+            # so we close it only once the server is down
+            await self.close_session()
+
+    async def stop_server(self):
         if not self.has_app():
             logger.debug('does not have app')
             return
@@ -253,3 +484,11 @@ class AioHttpInterface:
 
         if self.handler:
             await self.handler.finish_connections(self.shutdown_timeout)
+
+    async def close_session(self):
+        if not self.session_owner:
+            return
+        logger.debug('close pooled client session {}'.format(self.pool_stats()))
+        await self.session.close()
+        self.session = None
+        self.session_owner = False
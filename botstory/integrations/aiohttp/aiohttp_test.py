@@ -1,4 +1,6 @@
 from aiohttp import test_utils
+import hashlib
+import hmac
 import json
 import pytest
 from . import AioHttpInterface
@@ -51,6 +53,58 @@ async def test_listen_webhook(webhook_handler):
         await http.stop()
 
 
+@pytest.mark.asyncio
+async def test_reject_too_large_webhook_request(webhook_handler):
+    http = AioHttpInterface(port=9876, max_body_size=100)
+    http.webhook(uri='/webhook', handler=webhook_handler, token='qwerty')
+    try:
+        await http.start()
+        with pytest.raises(errors.HttpRequestError) as err:
+            await http.post_raw('http://localhost:9876/webhook', json={'message': 'x' * 200})
+        assert err.value.code == 413
+        assert not webhook_handler.called
+    finally:
+        await http.stop()
+
+
+@pytest.mark.asyncio
+async def test_reject_malformed_webhook_request(webhook_handler):
+    http = AioHttpInterface(port=9876)
+    http.webhook(uri='/webhook', handler=webhook_handler, token='qwerty')
+    try:
+        await http.start()
+        with pytest.raises(errors.HttpRequestError) as err:
+            await http.post_raw('http://localhost:9876/webhook', json=['not', 'an', 'object'])
+        assert err.value.code == 400
+        assert not webhook_handler.called
+    finally:
+        await http.stop()
+
+
+@pytest.mark.asyncio
+async def test_check_signature_of_webhook_request(webhook_handler):
+    http = AioHttpInterface(port=9876, app_secret='secret')
+    http.webhook(uri='/webhook', handler=webhook_handler, token='qwerty')
+    body = json.dumps({'message': 'Is there anybody in there?'})
+    signature = 'sha1=' + hmac.new(b'secret', body.encode('utf-8'), hashlib.sha1).hexdigest()
+    try:
+        await http.start()
+        with pytest.raises(errors.HttpRequestError) as err:
+            await http.post_raw('http://localhost:9876/webhook',
+                                headers={'X-Hub-Signature': 'sha1=wrong'},
+                                json={'message': 'Is there anybody in there?'})
+        assert err.value.code == 403
+        assert not webhook_handler.called
+
+        res = await http.post_raw('http://localhost:9876/webhook',
+                                  headers={'X-Hub-Signature': signature},
+                                  json={'message': 'Is there anybody in there?'})
+        assert res['status'] == 200
+        webhook_handler.assert_called_once_with({'message': 'Is there anybody in there?'})
+    finally:
+        await http.stop()
+
+
 @pytest.mark.asyncio
 async def test_pass_validation_for_correct_request():
     http = AioHttpInterface(port=9876)
@@ -223,3 +277,60 @@ async def test_should_raise_exception_on_webhook_if_aiohttp_already_is_started(w
     await http.start()
     with pytest.raises(aiohttp.WebhookException):
         http.webhook(uri='/webhook', handler=webhook_handler, token='qwerty')
+
+
+@pytest.mark.asyncio
+async def test_should_create_pooled_session_on_start_and_close_on_stop():
+    http = aiohttp.AioHttpInterface(limit_per_host=4, keepalive_timeout=30)
+    await http.start()
+    session = http.session
+    assert session
+    assert session.connector.limit_per_host == 4
+    await http.stop()
+    assert session.closed
+    assert not http.session
+
+
+@pytest.mark.asyncio
+async def test_should_close_session_after_server_is_down(webhook_handler):
+    http = aiohttp.AioHttpInterface(port=9876)
+    http.webhook(uri='/webhook', handler=webhook_handler, token='qwerty')
+    session_is_closed = []
+
+    async def on_shutdown(app):
+        session_is_closed.append(http.session.closed)
+
+    http.get_app().on_shutdown.append(on_shutdown)
+    await http.start()
+    session = http.session
+    await http.stop()
+    assert session_is_closed == [False]
+    assert session.closed
+    assert not http.session
+
+
+@pytest.mark.asyncio
+async def test_should_not_close_session_passed_from_outside(event_loop):
+    async with fake_server.FakeFacebook(event_loop) as server:
+        async with server.session() as session:
+            http = AioHttpInterface()
+            http.session = session
+            await http.start()
+            await http.stop()
+            assert not session.closed
+
+
+@pytest.mark.asyncio
+async def test_should_reuse_connections_from_pool(webhook_handler):
+    http = AioHttpInterface(port=9876)
+    http.webhook(uri='/webhook', handler=webhook_handler, token='qwerty')
+    try:
+        await http.start()
+        await http.post_raw('http://localhost:9876/webhook', json={'message': 'one'})
+        await http.post_raw('http://localhost:9876/webhook', json={'message': 'two'})
+        assert http.pool_stats() == {
+            'hits': 1,
+            'misses': 1,
+        }
+    finally:
+        await http.stop()
@@ -0,0 +1,164 @@
+import asyncio
+import copy
+import logging
+import time
+from ... import di, utils
+from ...utils import lru, single_flight
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot(doc):
+    """
+    copy of document, so the cache doesn't share it with callers
+    which could modify it and fail before they store it
+
+    :param doc:
+    :return:
+    """
+    if isinstance(doc, dict):
+        return copy.deepcopy(doc)
+    return doc
+
+
+@di.desc('storage', reg=False)
+class CacheDB:
+    """
+    in-process cache of sessions and users in front of other storage.
+
+    Usage:
+
+        story.use(cachedb.CacheDB(mongodb.MongodbInterface(...)))
+
+    documents are cached by `facebook_user_id`
+    all writes go to the storage immediately (write-through).
+    Concurrent loading of one document causes only one request to the storage.
+    """
+
+    def __init__(self, storage, maxsize=1024, ttl=60.0):
+        """
+
+        :param storage: wrapped storage
+        :param maxsize: max number of cached sessions (and users)
+        :param ttl: how long (in seconds) document stays in the cache
+        """
+        self.storage = storage
+        self.ttl = ttl
+        self.sessions = lru.LRUCache(maxsize=maxsize)
+        self.users = lru.LRUCache(maxsize=maxsize)
+        self.loading = single_flight.SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, item):
+        # the rest of storage api (for example `clear_collections`)
+        if item == 'storage':
+            raise AttributeError(item)
+        return getattr(self.storage, item)
+
+    @di.inject()
+    def add_tracker(self, tracker):
+        # wrapped storage reports its own requests,
+        # so hits of the cache don't count as storage requests
+        if hasattr(self.storage, 'add_tracker'):
+            self.storage.add_tracker(tracker)
+
+    async def setup(self):
+        if hasattr(self.storage, 'setup'):
+            await self.storage.setup()
+
+    async def start(self):
+        if hasattr(self.storage, 'start'):
+            await self.storage.start()
+
+    async def stop(self):
+        self.clear()
+        if hasattr(self.storage, 'stop'):
+            await self.storage.stop()
+
+    def clear(self):
+        self.sessions.clear()
+        self.users.clear()
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'hit_rate': self.hits / requests if requests else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'sessions': self.sessions.stats(),
+            'users': self.users.stats(),
+        }
+
+    def get_cached(self, cache, key):
+        expires_at, doc = cache.get(key, (None, None))
+        if expires_at is not None and expires_at < time.time():
+            cache.pop(key)
+            return None
+        return doc
+
+    def put(self, cache, doc):
+        key = utils.safe_get(doc, 'facebook_user_id')
+        if key is not None:
+            cache.set(key, (time.time() + self.ttl, snapshot(doc)))
+
+    async def load(self, cache, loader, kwargs):
+        """
+        get document from cache or load it from storage.
+        Only lookups by `facebook_user_id` are cached
+
+        :param cache:
+        :param loader: coroutine function of storage
+        :param kwargs: query
+        :return:
+        """
+        key = kwargs.get('facebook_user_id', None)
+        if key is None or len(kwargs) != 1:
+            return await loader(**kwargs)
+
+        doc = self.get_cached(cache, key)
+        if doc is not None:
+            self.hits += 1
+            return snapshot(doc)
+        self.misses += 1
+
+        doc = await self.loading.run((id(cache), key), loader, **kwargs)
+
+        # document could be stored while we were loading it
+        if key not in cache:
+            self.put(cache, doc)
+        # concurrent loaders get the same document
+        return snapshot(doc)
+
+    async def load_conversation(self, facebook_user_id):
+        user, session = await asyncio.gather(
+            self.get_user(facebook_user_id=facebook_user_id),
+            self.get_session(facebook_user_id=facebook_user_id),
+        )
+        return user, session
+
+    async def get_session(self, **kwargs):
+        return await self.load(self.sessions, self.storage.get_session, kwargs)
+
+    async def set_session(self, session):
+        res = await self.storage.set_session(session)
+        self.put(self.sessions, session)
+        return res
+
+    async def new_session(self, **kwargs):
+        session = await self.storage.new_session(**kwargs)
+        self.put(self.sessions, session)
+        return session
+
+    async def get_user(self, **kwargs):
+        return await self.load(self.users, self.storage.get_user, kwargs)
+
+    async def set_user(self, user):
+        res = await self.storage.set_user(user)
+        self.put(self.users, user)
+        return res
+
+    async def new_user(self, **kwargs):
+        user = await self.storage.new_user(**kwargs)
+        self.put(self.users, user)
+        return user
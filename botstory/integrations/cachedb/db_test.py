@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from unittest import mock
+from .. import cachedb, mockdb
+from ... import di, Story
+
+
+class CountDB(mockdb.MockDB):
+    def __init__(self):
+        super().__init__()
+        self.loads = 0
+
+    async def get_user(self, **kwargs):
+        self.loads += 1
+        await asyncio.sleep(0.01)
+        return await super().get_user(**kwargs)
+
+
+def test_get_cachedb_as_dep():
+    story = Story()
+
+    story.use(cachedb.CacheDB(mockdb.MockDB()))
+
+    with di.child_scope():
+        @di.desc()
+        class OneClass:
+            @di.inject()
+            def deps(self, storage):
+                self.storage = storage
+
+        assert isinstance(di.injector.get('one_class').storage, cachedb.CacheDB)
+    story.clear()
+
+
+@pytest.mark.asyncio
+async def test_cache_loaded_user():
+    storage = CountDB()
+    db = cachedb.CacheDB(storage)
+    user = await storage.new_user(facebook_user_id='1234567890')
+
+    assert await db.get_user(facebook_user_id='1234567890') == user
+    assert await db.get_user(facebook_user_id='1234567890') == user
+    assert storage.loads == 1
+    assert db.stats()['hit_rate'] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_load_user_once_for_concurrent_requests():
+    storage = CountDB()
+    db = cachedb.CacheDB(storage)
+    await storage.new_user(facebook_user_id='1234567890')
+
+    users = await asyncio.gather(*[db.get_user(facebook_user_id='1234567890') for _ in range(3)])
+
+    assert storage.loads == 1
+    assert users[0] is users[1] is users[2]
+
+
+@pytest.mark.asyncio
+async def test_expire_cached_user():
+    storage = CountDB()
+    db = cachedb.CacheDB(storage, ttl=10)
+    await storage.new_user(facebook_user_id='1234567890')
+
+    with mock.patch('time.time', return_value=0):
+        await db.get_user(facebook_user_id='1234567890')
+    with mock.patch('time.time', return_value=20):
+        await db.get_user(facebook_user_id='1234567890')
+
+    assert storage.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_write_through_session():
+    storage = mockdb.MockDB()
+    db = cachedb.CacheDB(storage)
+    session = {'facebook_user_id': '1234567890', 'stack': []}
+
+    await db.set_session(session)
+    storage.session = None
+
+    assert storage.session is None
+    assert await db.get_session(facebook_user_id='1234567890') == session
+    assert db.stats()['hits'] == 1
+
+
+@pytest.mark.asyncio
+async def test_should_not_share_cached_session_with_caller():
+    storage = mockdb.MockDB()
+    db = cachedb.CacheDB(storage)
+    await db.set_session({'facebook_user_id': '1234567890', 'stack': []})
+
+    session = await db.get_session(facebook_user_id='1234567890')
+    # processing of message modifies session and fails before storing it
+    session['stack'].append({'topic': 'broken'})
+
+    assert await db.get_session(facebook_user_id='1234567890') == {
+        'facebook_user_id': '1234567890',
+        'stack': [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_should_not_cache_missed_user():
+    storage = CountDB()
+    db = cachedb.CacheDB(storage)
+
+    assert await db.get_user(facebook_user_id='1234567890') is None
+    assert await db.get_user(facebook_user_id='1234567890') is None
+    assert storage.loads == 2
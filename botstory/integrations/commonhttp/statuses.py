@@ -1 +1,4 @@
+HTTP_400_BAD_REQUEST = 400
+HTTP_403_FORBIDDEN = 403
+HTTP_413_REQUEST_ENTITY_TOO_LARGE = 413
 HTTP_422_UNPROCESSABLE_ENTITY = 422
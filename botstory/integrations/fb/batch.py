@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+from urllib import parse
+from ..commonhttp import errors as commonhttp_errors
+
+logger = logging.getLogger(__name__)
+
+# graph api doesn't accept more requests in one batch
+MAX_BATCH_SIZE = 50
+
+
+def encode_body(body):
+    """
+    requests of batch have body encoded as a query string
+    with json encoded values
+
+    :param body:
+    :return:
+    """
+    return parse.urlencode({
+        key: value if isinstance(value, str) else json.dumps(value)
+        for key, value in body.items()
+    })
+
+
+def decode_headers(headers):
+    """
+    responses of batch have headers as a list of {name, value}
+
+    :param headers:
+    :return: dict of headers
+    """
+    return {h['name']: h['value'] for h in headers or [] if 'name' in h}
+
+
+class BatchSender:
+    """
+    coalesce requests to the Send API within short window
+    in graph api batch requests.
+
+    More: https://developers.facebook.com/docs/graph-api/making-multiple-requests
+
+    requests of one recipient are chained with `depends_on`,
+    so they keep their order inside of batch.
+    Batches are sent one by one, so they keep order as well.
+    """
+
+    def __init__(self, interface, window=0.05, max_size=MAX_BATCH_SIZE):
+        """
+
+        :param interface: FBInterface
+        :param window: how long (in seconds) we wait for other requests
+        :param max_size: max number of requests in one batch
+        """
+        self.interface = interface
+        self.window = window
+        self.max_size = min(max_size, MAX_BATCH_SIZE)
+
+        # [(relative url, body, future)]
+        self.pending = []
+        self.timer = None
+        self.lock = None
+
+    async def send(self, relative_url, body):
+        """
+        put request to the next batch and wait for its result
+
+        :param relative_url: for example `me/messages`
+        :param body: json body of request
+        :return: json response of request
+        """
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append((relative_url, body, future))
+        if len(self.pending) >= self.max_size:
+            self.flush_soon(0)
+        elif self.timer is None:
+            self.flush_soon(self.window)
+        return await future
+
+    def flush_soon(self, delay):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = asyncio.get_event_loop().call_later(
+            delay,
+            lambda: asyncio.ensure_future(self.flush()),
+        )
+
+    async def flush(self):
+        """
+        send all pending requests
+
+        :return:
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+
+        async with self.lock:
+            while self.pending:
+                requests = self.pending[:self.max_size]
+                self.pending = self.pending[self.max_size:]
+                await self.send_batch(requests)
+
+    async def send_batch(self, requests):
+        batch = []
+        # recipient -> name of its last request
+        last_requests = {}
+        for index, (relative_url, body, future) in enumerate(requests):
+            name = 'r{}'.format(index)
+            item = {
+                'method': 'POST',
+                'name': name,
+                'omit_response_on_success': False,
+                'relative_url': relative_url.lstrip('/'),
+                'body': encode_body(body),
+            }
+            recipient = json.dumps(body.get('recipient', None), sort_keys=True)
+            if recipient in last_requests:
+                item['depends_on'] = last_requests[recipient]
+            last_requests[recipient] = name
+            batch.append(item)
+
+        logger.debug('send batch of {} requests'.format(len(batch)))
+
+        try:
+            responses = await self.interface.http.post(
+                self.interface.api_uri + '/',
+                params={
+                    'access_token': self.interface.token,
+                },
+                json={
+                    'batch': batch,
+                },
+            )
+        except Exception as err:
+            for _, _, future in requests:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        for (_, _, future), response in zip(requests, responses):
+            if future.done():
+                continue
+            if response is None:
+                future.set_exception(commonhttp_errors.HttpRequestError(
+                    message='request was not processed'))
+                continue
+            try:
+                res = json.loads(response.get('body', None) or 'null')
+            except ValueError:
+                res = response.get('body', None)
+            code = response.get('code', 200)
+            if code >= 400:
+                future.set_exception(commonhttp_errors.HttpRequestError(
+                    code=code,
+                    headers=decode_headers(response.get('headers', None)),
+                    message=res,
+                ))
+            else:
+                future.set_result(res)
+
+        for _, _, future in requests[len(responses):]:
+            if not future.done():
+                future.set_exception(commonhttp_errors.HttpRequestError(
+                    message='request was not processed'))
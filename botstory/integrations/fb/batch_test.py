@@ -0,0 +1,130 @@
+import asyncio
+import json
+from urllib import parse
+import pytest
+from . import batch, messenger
+from .. import mockhttp
+from ..commonhttp import errors as commonhttp_errors
+from ... import Story
+from ...utils import scheduler
+
+story = None
+
+
+def teardown_function(function):
+    story and story.clear()
+
+
+def build_response(body, code=200, headers=None):
+    return {'code': code, 'headers': headers or [], 'body': json.dumps(body)}
+
+
+async def build_interface(responses):
+    global story
+    story = Story()
+    interface = story.use(messenger.FBInterface(page_access_token='qwerty', batch_window=0.01))
+    mock_http = story.use(mockhttp.MockHttpInterface(post=responses))
+    await story.start()
+    return interface, mock_http
+
+
+def test_encode_body_as_query_string():
+    body = parse.parse_qs(batch.encode_body({
+        'recipient': {'id': 1},
+        'sender_action': 'typing_on',
+    }))
+    assert json.loads(body['recipient'][0]) == {'id': 1}
+    assert body['sender_action'] == ['typing_on']
+
+
+@pytest.mark.asyncio
+async def test_coalesce_messages_in_one_batch():
+    interface, mock_http = await build_interface([
+        build_response({'message_id': 'mid.1'}),
+        build_response({'message_id': 'mid.2'}),
+    ])
+
+    res = await asyncio.gather(
+        interface.send_text_message(recipient={'facebook_user_id': 1}, text='hi!'),
+        interface.send_text_message(recipient={'facebook_user_id': 2}, text='hello!'),
+    )
+
+    assert sorted(r['message_id'] for r in res) == ['mid.1', 'mid.2']
+    assert mock_http.post.call_count == 1
+    assert mock_http.post.call_args[0][0] == 'https://graph.facebook.com/v2.6/'
+    requests = mock_http.post.call_args[1]['json']['batch']
+    assert [r['relative_url'] for r in requests] == ['me/messages/', 'me/messages/']
+    assert all('depends_on' not in r for r in requests)
+
+
+@pytest.mark.asyncio
+async def test_keep_order_of_messages_of_one_recipient():
+    interface, mock_http = await build_interface([
+        build_response({}),
+        build_response({}),
+    ])
+    user = {'facebook_user_id': 1}
+
+    await asyncio.gather(
+        interface.start_typing(user),
+        interface.stop_typing(user),
+    )
+
+    requests = mock_http.post.call_args[1]['json']['batch']
+    assert requests[1]['depends_on'] == requests[0]['name']
+
+
+@pytest.mark.asyncio
+async def test_raise_error_of_failed_request():
+    interface, mock_http = await build_interface([
+        build_response({'message_id': 'mid.1'}),
+        build_response({'error': {'message': 'wrong'}}, code=400),
+    ])
+
+    res = await asyncio.gather(
+        interface.send_text_message(recipient={'facebook_user_id': 1}, text='hi!'),
+        interface.send_text_message(recipient={'facebook_user_id': 2}, text='hello!'),
+        return_exceptions=True,
+    )
+
+    assert sum(isinstance(r, commonhttp_errors.HttpRequestError) for r in res) == 1
+
+
+@pytest.mark.asyncio
+async def test_pass_headers_of_throttled_request_to_error():
+    interface, mock_http = await build_interface([
+        build_response({'message_id': 'mid.1'}),
+        build_response({'error': {'message': 'too many calls'}}, code=400, headers=[
+            {'name': 'Content-Type', 'value': 'text/javascript; charset=UTF-8'},
+            {'name': 'X-App-Usage', 'value': json.dumps({'call_count': 100})},
+        ]),
+    ])
+
+    res = await asyncio.gather(
+        interface.send_text_message(recipient={'facebook_user_id': 1}, text='hi!'),
+        interface.send_text_message(recipient={'facebook_user_id': 2}, text='hello!'),
+        return_exceptions=True,
+    )
+
+    errors = [r for r in res if isinstance(r, commonhttp_errors.HttpRequestError)]
+    assert len(errors) == 1
+    assert errors[0].headers['X-App-Usage'] == '{"call_count": 100}'
+    assert scheduler.is_throttled(errors[0])
+
+
+@pytest.mark.asyncio
+async def test_split_requests_in_batches_of_max_size():
+    sender = batch.BatchSender(None, max_size=2)
+    sent = []
+
+    async def send_batch(requests):
+        sent.append(len(requests))
+        for _, _, future in requests:
+            future.set_result(None)
+
+    sender.send_batch = send_batch
+
+    await asyncio.gather(*[sender.send('me/messages', {'recipient': {'id': i}}) for i in range(5)])
+
+    assert sum(sent) == 5
+    assert max(sent) == 2
@@ -1,11 +1,12 @@
 import asyncio
 from botstory.ast import story_context
 from botstory.integrations.commonhttp import errors as commonhttp_errors
+import collections
 import functools
 import logging
-from . import validate
-from .. import commonhttp
+from . import batch, profile, validate
 from ... import di
+from ...utils import keyed_dispatcher, scheduler
 from ...middlewares import option
 
 logger = logging.getLogger(__name__)
@@ -20,17 +21,23 @@ def retry_request(retry_message=None):
             should_try = True
             delay = options.get('retry_delay', 1)
             tries = options.get('retry_times', 3)
+            attempt = 0
             res = None
             while should_try:
                 try:
                     res = await f(*args, **kwargs)
                     should_try = False
                 except commonhttp_errors.HttpRequestError as err:
-                    if tries > 0:
+                    # throttled request is retried by scheduler
+                    # once it gets a new slot
+                    if tries > 0 and not scheduler.is_throttled(err):
                         tries -= 1
                         logger.warning(retry_message.format(url))
                         should_try = True
-                        await asyncio.sleep(delay)
+                        # exponential backoff with jitter
+                        # so retries of many requests don't synchronize
+                        await asyncio.sleep(scheduler.backoff_delay(attempt, base=delay, err=err))
+                        attempt += 1
                     else:
                         raise err
 
@@ -41,6 +48,37 @@ def retry_request(retry_message=None):
     return retry_wrapper
 
 
+def is_receipt(messaging):
+    """
+    delivery and read notifications or echo of our own message
+    don't need processing of stories
+
+    :param messaging: item of entry messaging
+    :return:
+    """
+    return 'delivery' in messaging or \
+           'read' in messaging or \
+           ('message' in messaging and 'is_echo' in messaging['message'])
+
+
+def has_only_receipts(data):
+    return all(is_receipt(m)
+               for e in data.get('entry', [])
+               for m in e.get('messaging', []))
+
+
+def split_by_messaging(data):
+    """
+    split webhook payload to payloads with single messaging item
+
+    :param data:
+    :return: list of payloads
+    """
+    return [{**data, 'entry': [{**e, 'messaging': [m]}]}
+            for e in data.get('entry', [])
+            for m in e.get('messaging', [])]
+
+
 @di.desc('fb', reg=False)
 class FBInterface:
     type = 'facebook'
@@ -52,6 +90,11 @@ class FBInterface:
                  persistent_menu=None,
                  webhook_url=None,
                  webhook_token=None,
+                 process_concurrency=16,
+                 batch_window=0,
+                 receipt_handler=None,
+                 lazy_profile=False,
+                 profile_ttl=3600,
                  ):
         """
 
@@ -61,6 +104,14 @@ class FBInterface:
         :param persistent_menu:
         :param webhook_url:
         :param webhook_token:
+        :param process_concurrency: how many messages (of different users) we process concurrently
+        :param batch_window: coalesce outgoing messages within this window (in seconds)
+        in batch requests. 0 - send each message immediately
+        :param receipt_handler: (optional) coroutine function which receives
+        delivery, read and echo events. They don't touch storage and stories
+        :param lazy_profile: create new user right away
+        and fetch its fb profile in background
+        :param profile_ttl: how long (in seconds) we cache fetched fb profiles
         """
         self.api_uri = api_uri
         self.greeting_text = greeting_text
@@ -69,8 +120,15 @@ class FBInterface:
         self.webhook = webhook_url
         self.webhook_token = webhook_token
 
+        self.dispatcher = keyed_dispatcher.KeyedDispatcher(concurrency=process_concurrency)
+        self.batch = batch.BatchSender(self, window=batch_window) if batch_window > 0 else None
+        self.receipt_handler = receipt_handler
+        self.lazy_profile = lazy_profile
+        self.profiles = profile.ProfileService(self, ttl=profile_ttl)
+
         self.library = None
         self.http = None
+        self.queue = None
         self.story_processor = None
         self.storage = None
         self.users = None
@@ -99,6 +157,19 @@ class FBInterface:
         logger.debug(story_processor)
         self.story_processor = story_processor
 
+    @di.inject()
+    def add_queue(self, queue):
+        """
+        inject work queue which will process incoming messages
+
+        :param queue:
+        :return:
+        """
+        logger.debug('add_queue')
+        logger.debug(queue)
+        self.queue = queue
+        self.queue.subscribe(self.type, self.process_job)
+
     @di.inject()
     def add_storage(self, storage):
         logger.debug('add_storage')
@@ -157,12 +228,9 @@ class FBInterface:
         if len(quick_replies) > 0:
             message['quick_replies'] = quick_replies
 
-        return await self.http.post(
-            self.api_uri + '/me/messages/',
-            params={
-                'access_token': self.token,
-            },
-            json={
+        return await self.send_message(
+            '/me/messages/',
+            {
                 'recipient': {
                     'id': recipient['facebook_user_id'],
                 },
@@ -247,12 +315,9 @@ class FBInterface:
         :param url:
         :return:
         """
-        return await self.http.post(
-            self.api_uri + '/me/messages/',
-            params={
-                'access_token': self.token,
-            },
-            json={
+        return await self.send_message(
+            '/me/messages/',
+            {
                 'recipient': {
                     'id': recipient['facebook_user_id'],
                 },
@@ -275,12 +340,9 @@ class FBInterface:
         :param payload:
         :return:
         """
-        return await self.http.post(
-            self.api_uri + '/me/messages/',
-            params={
-                'access_token': self.token,
-            },
-            json={
+        return await self.send_message(
+            '/me/messages/',
+            {
                 'recipient': {
                     'id': recipient['facebook_user_id'],
                 },
@@ -293,6 +355,25 @@ class FBInterface:
                 },
             })
 
+    async def send_message(self, url, body):
+        """
+        send request to the Send API.
+        Coalesce it with other requests in one batch if batching is enabled
+
+        :param url: relative url
+        :param body:
+        :return:
+        """
+        if self.batch:
+            return await self.batch.send(url, body)
+        return await self.http.post(
+            self.api_uri + url,
+            params={
+                'access_token': self.token,
+            },
+            json=body,
+        )
+
     async def request_profile(self, facebook_user_id):
         """
         Make request to facebook
@@ -315,15 +396,28 @@ class FBInterface:
         handle fb messenger message and return 200Ok as quick as possible
         In background we launch process of handling incoming message
         This solution is ok only for small apps for bigger one it is much better
-        to use a queue.
-
-        TODO: support third party queue
+        to use a queue (`story.use(workqueue.SQLiteQueue())`).
 
         :param data:
         :return:
         """
-        loop = asyncio.get_event_loop()
-        loop.create_task(self.process(data))
+        if has_only_receipts(data):
+            if self.receipt_handler:
+                # receipts don't need storage and stories
+                # so we don't put them in the queue
+                asyncio.get_event_loop().create_task(self.process_receipts([
+                    m for e in data.get('entry', []) for m in e.get('messaging', [])
+                ]))
+            else:
+                logger.debug('skip receipts')
+        elif self.queue:
+            # one job per messaging item, so the queue retries only
+            # the failed one and doesn't replay messages of other users
+            for payload in split_by_messaging(data):
+                await self.queue.put(self.type, payload)
+        else:
+            loop = asyncio.get_event_loop()
+            loop.create_task(self.process(data))
         return {
             'status': 200,
             'text': 'Ok!',
@@ -331,7 +425,9 @@ class FBInterface:
 
     async def process(self, data):
         """
-        async process message which comes from fb messenger
+        async process message which comes from fb messenger.
+        messages of different users are processed concurrently
+        but messages of one user keep their order
 
         :param data:
         :return:
@@ -341,6 +437,8 @@ class FBInterface:
         logger.debug('')
         logger.debug('  entry: {}'.format(data))
         try:
+            messaging_by_user = collections.OrderedDict()
+            receipts = []
             for e in data.get('entry', []):
                 messaging = e.get('messaging', [])
                 logger.debug('  messaging: {}'.format(messaging))
@@ -349,101 +447,22 @@ class FBInterface:
                     logger.warning('  entry {} list lack of "messaging" field'.format(e))
 
                 for m in messaging:
-                    logger.debug('  m: {}'.format(m))
-
-                    facebook_user_id = m['sender']['id']
-
-                    logger.debug('before get user with facebook_user_id={}'.format(facebook_user_id))
-                    user = await self.storage.get_user(facebook_user_id=facebook_user_id)
-                    if not user:
-                        logger.debug('  should create new user {}'.format(facebook_user_id))
-
-                        try:
-                            messenger_profile_data = await self.request_profile(facebook_user_id)
-                            logger.debug('receive fb profile {}'.format(messenger_profile_data))
-                        except commonhttp.errors.HttpRequestError as err:
-                            logger.debug('fail on request fb profile of {}. with {}'.format(facebook_user_id, err))
-                            messenger_profile_data = {
-                                'no_fb_profile': True,
-                            }
-
-                        logger.debug('before creating new user')
-                        user = await self.storage.new_user(
-                            facebook_user_id=facebook_user_id,
-                            no_fb_profile=messenger_profile_data.get('no_fb_profile', None),
-                            first_name=messenger_profile_data.get('first_name', None),
-                            last_name=messenger_profile_data.get('last_name', None),
-                            profile_pic=messenger_profile_data.get('profile_pic', None),
-                            locale=messenger_profile_data.get('locale', None),
-                            timezone=messenger_profile_data.get('timezone', None),
-                            gender=messenger_profile_data.get('gender', None),
-                        )
-
-                        self.users.on_new_user_comes(user)
-
-                    session = await self.storage.get_session(facebook_user_id=facebook_user_id)
-                    if not session:
-                        logger.debug('  should create new session for user {}'.format(facebook_user_id))
-                        session = await self.storage.new_session(
-                            facebook_user_id=facebook_user_id,
-                            stack=[],
-                            user=user,
-                        )
-
-                    ctx = story_context.clean_message_data({
-                        'session': session,
-                        'user': user,
-                    })
-
-                    if 'message' in m:
-                        logger.debug('message notification')
-                        raw_message = m.get('message', {})
-                        if 'is_echo' in raw_message:
-                            # TODO: should react somehow.
-                            # for example storing for debug purpose
-                            logger.debug('just echo message')
-                        else:
-                            text = raw_message.get('text', None)
-                            if text is not None:
-                                ctx = story_context.set_message_data(ctx,
-                                                                     'text', {
-                                                                         'raw': text,
-                                                                     })
-                            elif 'sticker_id' in raw_message:
-                                ctx = story_context.set_message_data(ctx,
-                                                                     'sticker_id', raw_message['sticker_id'],
-                                                                     )
-                            elif 'attachments' in raw_message:
-                                ctx = story_context.set_message_data(ctx,
-                                                                     'attachments', raw_message['attachments'])
-                            else:
-                                logger.warning('  entry {} "text"'.format(e))
-
-                            quick_reply = raw_message.get('quick_reply', None)
-                            if quick_reply is not None:
-                                ctx = story_context.set_message_data(ctx,
-                                                                     'option',
-                                                                     'value', quick_reply['payload'])
-
-                            ctx = await self.story_processor.match_message(ctx)
-
-                    elif 'postback' in m:
-                        ctx = story_context.set_message_data(ctx,
-                                                             'option',
-                                                             'value', m['postback']['payload'])
-                        ctx = await self.story_processor.match_message(ctx)
-                    elif 'delivery' in m:
-                        logger.debug('delivery notification')
-                    elif 'read' in m:
-                        logger.debug('read notification')
+                    if is_receipt(m):
+                        # doesn't need user, session and stories
+                        receipts.append(m)
                     else:
-                        logger.warning('(!) unknown case {}'.format(e))
+                        messaging_by_user.setdefault(m['sender']['id'], []).append((e, m))
 
-                    # after message were processed session and user information could change
-                    # so we should store it for the next usage
-                    await self.storage.set_session(ctx['session'])
-                    await self.storage.set_user(ctx['user'])
+            if receipts:
+                await self.process_receipts(receipts)
 
+            if len(messaging_by_user) == 1:
+                # don't spawn extra task for the single user
+                for facebook_user_id, messaging in messaging_by_user.items():
+                    await self.process_user_messaging(facebook_user_id, messaging)
+            else:
+                await asyncio.gather(*[self.process_user_messaging(facebook_user_id, messaging)
+                                       for facebook_user_id, messaging in messaging_by_user.items()])
         except BaseException as err:
             logger.exception(err)
 
@@ -452,6 +471,156 @@ class FBInterface:
             'text': 'Ok!',
         }
 
+    async def process_job(self, data):
+        """
+        process payload of work queue job.
+        Unlike `process` we don't swallow exceptions
+        so the queue could retry failed job
+
+        :param data:
+        :return:
+        """
+        for e in data.get('entry', []):
+            for m in e.get('messaging', []):
+                if is_receipt(m):
+                    await self.process_receipts([m])
+                else:
+                    await self.dispatcher.run(m['sender']['id'], self.process_messaging, e, m)
+
+    async def process_receipts(self, receipts):
+        """
+        pass delivery, read and echo events to the receipt handler
+
+        :param receipts: list of messaging items
+        :return:
+        """
+        logger.debug('  receipts: {}'.format(len(receipts)))
+        if not self.receipt_handler:
+            return
+        for m in receipts:
+            try:
+                await self.receipt_handler(m)
+            except Exception as err:
+                logger.exception(err)
+
+    async def process_user_messaging(self, facebook_user_id, messaging):
+        """
+        process messaging items of one user one by one
+
+        :param facebook_user_id:
+        :param messaging: list of (entry, messaging item)
+        :return:
+        """
+        for e, m in messaging:
+            try:
+                await self.dispatcher.run(facebook_user_id, self.process_messaging, e, m)
+            except Exception as err:
+                logger.exception(err)
+
+    async def process_messaging(self, e, m):
+        """
+        process one messaging item of entry
+
+        :param e: entry
+        :param m: messaging item
+        :return:
+        """
+        logger.debug('  m: {}'.format(m))
+
+        facebook_user_id = m['sender']['id']
+
+        logger.debug('before load conversation with facebook_user_id={}'.format(facebook_user_id))
+        user, session = await self.storage.load_conversation(facebook_user_id=facebook_user_id)
+        if not user:
+            logger.debug('  should create new user {}'.format(facebook_user_id))
+
+            if self.lazy_profile:
+                user_profile = profile.to_user_fields({})
+                # will be processed once we finish with the current message
+                asyncio.get_event_loop().create_task(
+                    self.dispatcher.run(facebook_user_id, self.enrich_user, facebook_user_id))
+            else:
+                user_profile = await self.profiles.get(facebook_user_id)
+
+            logger.debug('before creating new user')
+            user = await self.storage.new_user(
+                facebook_user_id=facebook_user_id,
+                **user_profile
+            )
+
+            self.users.on_new_user_comes(user)
+
+        if not session:
+            logger.debug('  should create new session for user {}'.format(facebook_user_id))
+            session = await self.storage.new_session(
+                facebook_user_id=facebook_user_id,
+                stack=[],
+                user=user,
+            )
+
+        ctx = story_context.clean_message_data({
+            'session': session,
+            'user': user,
+        })
+
+        if 'message' in m:
+            logger.debug('message notification')
+            raw_message = m.get('message', {})
+            text = raw_message.get('text', None)
+            if text is not None:
+                ctx = story_context.set_message_data(ctx,
+                                                     'text', {
+                                                         'raw': text,
+                                                     })
+            elif 'sticker_id' in raw_message:
+                ctx = story_context.set_message_data(ctx,
+                                                     'sticker_id', raw_message['sticker_id'],
+                                                     )
+            elif 'attachments' in raw_message:
+                ctx = story_context.set_message_data(ctx,
+                                                     'attachments', raw_message['attachments'])
+            else:
+                logger.warning('  entry {} "text"'.format(e))
+
+            quick_reply = raw_message.get('quick_reply', None)
+            if quick_reply is not None:
+                ctx = story_context.set_message_data(ctx,
+                                                     'option',
+                                                     'value', quick_reply['payload'])
+
+            ctx = await self.story_processor.match_message(ctx)
+
+        elif 'postback' in m:
+            ctx = story_context.set_message_data(ctx,
+                                                 'option',
+                                                 'value', m['postback']['payload'])
+            ctx = await self.story_processor.match_message(ctx)
+        else:
+            logger.warning('(!) unknown case {}'.format(e))
+
+        # after message were processed session and user information could change
+        # so we should store it for the next usage
+        await self.storage.set_session(ctx['session'])
+        await self.storage.set_user(ctx['user'])
+
+    async def enrich_user(self, facebook_user_id):
+        """
+        fetch fb profile of user and store it in user document
+
+        :param facebook_user_id:
+        :return:
+        """
+        try:
+            user_profile = await self.profiles.get(facebook_user_id)
+            user = await self.storage.get_user(facebook_user_id=facebook_user_id)
+            if not user:
+                return
+            user = dict(user.items())
+            user.update(user_profile)
+            await self.storage.set_user(user)
+        except Exception as err:
+            logger.exception(err)
+
     async def setup(self):
         logger.debug('setup')
 
@@ -487,6 +656,10 @@ class FBInterface:
         if self.webhook and self.http:
             self.http.webhook(self.webhook, self.handle, self.webhook_token)
 
+    async def stop(self):
+        if self.batch:
+            await self.batch.flush()
+
     async def replace_greeting_text(self, message):
         """
         delete greeting text before
@@ -665,12 +838,9 @@ class FBInterface:
 
     async def start_typing(self, user):
         logger.debug('# start typing')
-        await self.http.post(
-            self.api_uri + '/me/messages',
-            params={
-                'access_token': self.token,
-            },
-            json={
+        await self.send_message(
+            '/me/messages',
+            {
                 'recipient': {
                     'id': user['facebook_user_id'],
                 },
@@ -680,12 +850,9 @@ class FBInterface:
 
     async def stop_typing(self, user):
         logger.debug('# stop typing')
-        await self.http.post(
-            self.api_uri + '/me/messages',
-            params={
-                'access_token': self.token,
-            },
-            json={
+        await self.send_message(
+            '/me/messages',
+            {
                 'recipient': {
                     'id': user['facebook_user_id'],
                 },
@@ -9,7 +9,7 @@ from unittest import mock
 import pytest
 
 from . import messenger
-from .. import commonhttp, mockdb, mockhttp
+from .. import commonhttp, mockdb, mockhttp, workqueue
 from ... import di, Story, utils
 from ...middlewares import any, option, sticker
 
@@ -524,6 +524,34 @@ async def test_retry_send_image_should_fail_on_tries_exceed():
         should_post_attachment(mock_http, talk)
 
 
+@pytest.mark.asyncio
+async def test_retry_throttled_image_through_scheduler():
+    with answer.Talk() as talk:
+        story = talk.story
+        story.use(messenger.FBInterface(page_access_token='qwerty1'))
+        mock_http = story.use(mockhttp.MockHttpInterface())
+        await story.start()
+
+        calls = []
+
+        async def post(*args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise commonhttp_errors.HttpRequestError(code=429, headers={'Retry-After': '0.01'})
+            return {}
+
+        mock_http.post = post
+
+        await story.send_image('http://shevchenko.ua/image.gif', talk.user, options={
+            'retry_times': 3,
+            'retry_delay': 0.1,
+        })
+
+        assert len(calls) == 2
+        assert story.chat.scheduler.stats()['throttled'] == 1
+        assert story.chat.scheduler.stats()['sent'] == 1
+
+
 @pytest.mark.asyncio
 async def test_integration():
     user = utils.build_fake_user()
@@ -937,6 +965,59 @@ async def test_handler_raw_text(build_fb_interface):
     }
 
 
+@pytest.mark.asyncio
+async def test_process_messages_of_different_users_concurrently(build_fb_interface):
+    fb_interface, story = await build_fb_interface()
+
+    received = []
+    slow_user_is_waiting = asyncio.Event()
+
+    @story.on('slow')
+    def slow_story():
+        @story.part()
+        async def wait(ctx):
+            slow_user_is_waiting.set()
+            await asyncio.sleep(0.05)
+            received.append('slow')
+
+    @story.on('fast')
+    def fast_story():
+        @story.part()
+        async def store_result(ctx):
+            await slow_user_is_waiting.wait()
+            received.append('fast')
+
+    def build_messaging(user_id, text):
+        return {
+            'sender': {
+                'id': user_id,
+            },
+            'recipient': {
+                'id': 'PAGE_ID'
+            },
+            'timestamp': 1458692752478,
+            'message': {
+                'mid': 'mid.1457764197618:41d102a3e1ae206a38',
+                'seq': 73,
+                'text': text,
+            }
+        }
+
+    await fb_interface.process({
+        'object': 'page',
+        'entry': [{
+            'id': 'PAGE_ID',
+            'time': 1473204787206,
+            'messaging': [
+                build_messaging('SLOW_USER_ID', 'slow'),
+                build_messaging('FAST_USER_ID', 'fast'),
+            ]
+        }]
+    })
+
+    assert received == ['fast', 'slow']
+
+
 @pytest.mark.asyncio
 async def test_handler_selected_option(build_fb_interface):
     fb_interface, story = await build_fb_interface()
@@ -1716,3 +1797,238 @@ async def test_stop_typing():
             'sender_action': 'typing_off',
         }
     )
+
+
+@pytest.mark.asyncio
+async def test_handle_messages_through_queue(build_fb_interface):
+    fb_interface, story = await build_fb_interface()
+    q = story.use(workqueue.AsyncioQueue())
+    await q.start()
+
+    received = asyncio.Event()
+
+    @story.on('hi')
+    def greeting():
+        @story.part()
+        async def store_result(ctx):
+            received.set()
+
+    res = await fb_interface.handle({
+        'object': 'page',
+        'entry': [{
+            'id': 'PAGE_ID',
+            'time': 1473204787206,
+            'messaging': [{
+                'sender': {
+                    'id': 'USER_ID',
+                },
+                'recipient': {
+                    'id': 'PAGE_ID'
+                },
+                'timestamp': 1458692752478,
+                'message': {
+                    'mid': 'mid.1457764197618:41d102a3e1ae206a38',
+                    'seq': 73,
+                    'text': 'hi',
+                }
+            }]
+        }]
+    })
+
+    assert res['status'] == 200
+    await q.stop()
+    assert received.is_set()
+
+
+@pytest.mark.asyncio
+async def test_retry_only_failed_messaging_of_queued_webhook(build_fb_interface):
+    fb_interface, story = await build_fb_interface()
+    q = story.use(workqueue.AsyncioQueue(retry_delay=0.01))
+    await q.start()
+
+    received = []
+
+    @story.on('fail once')
+    def unlucky_story():
+        @story.part()
+        async def store_result(ctx):
+            received.append('fail once')
+            if received.count('fail once') == 1:
+                raise Exception('failed')
+
+    @story.on('hi')
+    def greeting():
+        @story.part()
+        async def store_result(ctx):
+            received.append('hi')
+
+    def build_messaging(user_id, text):
+        return {
+            'sender': {
+                'id': user_id,
+            },
+            'recipient': {
+                'id': 'PAGE_ID'
+            },
+            'timestamp': 1458692752478,
+            'message': {
+                'mid': 'mid.1457764197618:41d102a3e1ae206a38',
+                'seq': 73,
+                'text': text,
+            }
+        }
+
+    await fb_interface.handle({
+        'object': 'page',
+        'entry': [{
+            'id': 'PAGE_ID',
+            'time': 1473204787206,
+            'messaging': [
+                build_messaging('UNLUCKY_USER_ID', 'fail once'),
+                build_messaging('USER_ID', 'hi'),
+            ]
+        }]
+    })
+
+    await q.stop()
+    assert sorted(received) == ['fail once', 'fail once', 'hi']
+    assert q.unfinished == 0
+
+
+@pytest.mark.asyncio
+async def test_should_not_process_receipts(build_fb_interface, mocker):
+    fb_interface, story = await build_fb_interface()
+    mocker.patch.object(fb_interface, 'process')
+
+    res = await fb_interface.handle({
+        'object': 'page',
+        'entry': [{
+            'id': 'PAGE_ID',
+            'time': 1458692752478,
+            'messaging': [{
+                'sender': {'id': 'USER_ID'},
+                'recipient': {'id': 'PAGE_ID'},
+                'delivery': {'watermark': 1458668856253, 'seq': 37},
+            }, {
+                'sender': {'id': 'USER_ID'},
+                'recipient': {'id': 'PAGE_ID'},
+                'timestamp': 1458668856463,
+                'read': {'watermark': 1458668856253, 'seq': 38},
+            }, {
+                'sender': {'id': 'PAGE_ID'},
+                'recipient': {'id': 'USER_ID'},
+                'timestamp': 1458668856463,
+                'message': {'is_echo': True, 'mid': 'mid.1457764197618:41d102a3e1ae206a38', 'text': 'hi'},
+            }]
+        }]
+    })
+
+    assert res['status'] == 200
+    await asyncio.sleep(0)
+    assert not fb_interface.process.called
+
+
+@pytest.mark.asyncio
+async def test_pass_receipts_to_receipt_handler_without_storage(build_fb_interface, mocker):
+    fb_interface, story = await build_fb_interface()
+    receipts = []
+
+    async def receipt_handler(m):
+        receipts.append(m)
+
+    fb_interface.receipt_handler = receipt_handler
+    mocker.spy(fb_interface.storage, 'load_conversation')
+    mocker.spy(fb_interface.storage, 'set_session')
+
+    await fb_interface.process({
+        'object': 'page',
+        'entry': [{
+            'id': 'PAGE_ID',
+            'time': 1458692752478,
+            'messaging': [{
+                'sender': {'id': 'USER_ID'},
+                'recipient': {'id': 'PAGE_ID'},
+                'delivery': {'watermark': 1458668856253, 'seq': 37},
+            }, {
+                'sender': {'id': 'USER_ID'},
+                'recipient': {'id': 'PAGE_ID'},
+                'timestamp': 1458668856463,
+                'read': {'watermark': 1458668856253, 'seq': 38},
+            }]
+        }]
+    })
+
+    assert [('delivery' in m, 'read' in m) for m in receipts] == [(True, False), (False, True)]
+    assert not fb_interface.storage.load_conversation.called
+    assert not fb_interface.storage.set_session.called
+
+
+@pytest.mark.asyncio
+async def test_pass_receipts_from_webhook_to_receipt_handler(build_fb_interface, mocker):
+    fb_interface, story = await build_fb_interface()
+    receipts = []
+
+    async def receipt_handler(m):
+        receipts.append(m)
+
+    fb_interface.receipt_handler = receipt_handler
+    mocker.spy(fb_interface, 'process')
+
+    res = await fb_interface.handle({
+        'object': 'page',
+        'entry': [{
+            'id': 'PAGE_ID',
+            'time': 1458692752478,
+            'messaging': [{
+                'sender': {'id': 'USER_ID'},
+                'recipient': {'id': 'PAGE_ID'},
+                'delivery': {'watermark': 1458668856253, 'seq': 37},
+            }]
+        }]
+    })
+    await asyncio.sleep(0.01)
+
+    assert res['status'] == 200
+    assert len(receipts) == 1
+    assert 'delivery' in receipts[0]
+    assert not fb_interface.process.called
+
+
+@pytest.mark.asyncio
+async def test_create_new_user_and_fetch_profile_in_background():
+    global story
+    story = Story()
+
+    fb_interface = story.use(messenger.FBInterface(page_access_token='qwerty', lazy_profile=True))
+    db = story.use(mockdb.MockDB())
+    story.use(mockhttp.MockHttpInterface(get={
+        'first_name': 'Alice',
+    }))
+
+    await story.start()
+
+    await fb_interface.process({
+        'object': 'page',
+        'entry': [{
+            'id': 'PAGE_ID',
+            'time': 1473204787206,
+            'messaging': [{
+                'sender': {
+                    'id': 'USER_ID',
+                },
+                'recipient': {
+                    'id': 'PAGE_ID'
+                },
+                'timestamp': 1458692752478,
+                'message': {
+                    'mid': 'mid.1457764197618:41d102a3e1ae206a38',
+                    'seq': 73,
+                    'text': 'hi',
+                }
+            }]
+        }]
+    })
+
+    assert (await db.get_user(facebook_user_id='USER_ID'))['first_name'] is None
+    await asyncio.sleep(0.01)
+    assert (await db.get_user(facebook_user_id='USER_ID'))['first_name'] == 'Alice'
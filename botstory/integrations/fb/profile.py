@@ -0,0 +1,66 @@
+import logging
+import time
+from .. import commonhttp
+from ...utils import lru, single_flight
+
+logger = logging.getLogger(__name__)
+
+# fields of fb profile which we store in user document
+FIELDS = ['first_name', 'last_name', 'profile_pic', 'locale', 'timezone', 'gender']
+
+
+class ProfileService:
+    """
+    fetch profiles of fb users.
+
+    Concurrent requests of one profile share one request to fb
+    and received profiles are cached for `ttl` seconds.
+    """
+
+    def __init__(self, interface, maxsize=1024, ttl=3600):
+        """
+
+        :param interface: FBInterface
+        :param maxsize: max number of cached profiles
+        :param ttl: how long (in seconds) we keep profile in cache
+        """
+        self.interface = interface
+        self.ttl = ttl
+        self.profiles = lru.LRUCache(maxsize=maxsize)
+        self.requests = single_flight.SingleFlight()
+
+    def stats(self):
+        return self.profiles.stats()
+
+    async def get(self, facebook_user_id):
+        """
+        get profile fields of user document
+
+        :param facebook_user_id:
+        :return: dict of `no_fb_profile` and FIELDS
+        """
+        expires_at, profile = self.profiles.get(facebook_user_id, (None, None))
+        if expires_at is not None and expires_at >= time.time():
+            return profile
+
+        try:
+            data = await self.requests.run(facebook_user_id,
+                                           self.interface.request_profile, facebook_user_id)
+            logger.debug('receive fb profile {}'.format(data))
+        except commonhttp.errors.HttpRequestError as err:
+            logger.debug('fail on request fb profile of {}. with {}'.format(facebook_user_id, err))
+            # don't cache failure, we could get profile next time
+            return to_user_fields({
+                'no_fb_profile': True,
+            })
+
+        profile = to_user_fields(data)
+        self.profiles.set(facebook_user_id, (time.time() + self.ttl, profile))
+        return profile
+
+
+def to_user_fields(data):
+    return {
+        'no_fb_profile': data.get('no_fb_profile', None),
+        **{field: data.get(field, None) for field in FIELDS},
+    }
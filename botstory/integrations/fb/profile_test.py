@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from unittest import mock
+from . import profile
+from ..commonhttp import errors as commonhttp_errors
+
+
+class FakeInterface:
+    def __init__(self, response=None, error=None):
+        self.calls = 0
+        self.error = error
+        self.response = response or {'first_name': 'Alice'}
+
+    async def request_profile(self, facebook_user_id):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.error:
+            raise self.error
+        return self.response
+
+
+@pytest.mark.asyncio
+async def test_request_profile_once_for_concurrent_messages():
+    interface = FakeInterface()
+    service = profile.ProfileService(interface)
+
+    profiles = await asyncio.gather(*[service.get('USER_ID') for _ in range(3)])
+
+    assert interface.calls == 1
+    assert all(p['first_name'] == 'Alice' for p in profiles)
+
+
+@pytest.mark.asyncio
+async def test_cache_profile_until_it_expires():
+    interface = FakeInterface()
+    service = profile.ProfileService(interface, ttl=10)
+
+    with mock.patch('time.time', return_value=0):
+        await service.get('USER_ID')
+        await service.get('USER_ID')
+    assert interface.calls == 1
+
+    with mock.patch('time.time', return_value=20):
+        await service.get('USER_ID')
+    assert interface.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_should_not_cache_failed_request():
+    interface = FakeInterface(error=commonhttp_errors.HttpRequestError())
+    service = profile.ProfileService(interface)
+
+    assert (await service.get('USER_ID'))['no_fb_profile'] is True
+    await service.get('USER_ID')
+    assert interface.calls == 2
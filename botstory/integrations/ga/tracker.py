@@ -9,10 +9,11 @@ from botstory.ast import story_context
 import functools
 import json
 import logging
+from .universal_analytics.batch import HitBatcher
 from .universal_analytics.tracker import Tracker
 
 from ... import di
-from ...utils import queue
+from ...utils import lru, queue
 
 logger = logging.getLogger(__name__)
 
@@ -23,25 +24,73 @@ class GAStatistics:
                  tracking_id=None,
                  story_tracking_template='{story}/{part}',
                  new_message_tracking_template='receive: {data}',
+                 use_batch=True,
+                 batch_size=20,
+                 flush_interval=1.0,
+                 max_queue_size=1000,
+                 max_trackers=1024,
                  ):
         """
         :param tracking_id: should be like UA-XXXXX-Y
+        :param use_batch: send hits in batches through one pooled session
+        :param batch_size: max number of hits in one batch (<= 20)
+        :param flush_interval: how long (in seconds) hit waits for others
+        :param max_queue_size: max number of queued hits. The rest are dropped
+        :param max_trackers: max number of cached trackers (one per user)
         """
         self.tracking_id = tracking_id
         self.story_tracking_template = story_tracking_template
         self.new_message_tracking_template = new_message_tracking_template
+        self.batcher = HitBatcher(
+            batch_size=batch_size,
+            interval=flush_interval,
+            maxsize=max_queue_size,
+        ) if use_batch else None
+        self.trackers = lru.LRUCache(maxsize=max_trackers)
+        self.executor = queue.executor
+
+    @di.inject()
+    def add_executor(self, executor):
+        self.executor = executor
 
     @staticmethod
     def __hash__():
         return hash('ga.tracker')
 
+    async def stop(self):
+        if self.batcher:
+            # flush queued hits
+            await self.batcher.stop()
+
     def get_tracker(self, user):
-        logger.debug('get_tracker')
-        logger.debug(Tracker)
-        return Tracker(
-            account=self.tracking_id,
-            client_id=user and user['_id'],
-        )
+        client_id = user and user['_id']
+        tracker = self.trackers.get(client_id, None)
+        if tracker is None:
+            tracker = Tracker(
+                account=self.tracking_id,
+                batcher=self.batcher,
+                client_id=client_id,
+            )
+            # anonymous user gets random client id
+            if client_id is not None:
+                self.trackers.set(client_id, tracker)
+        return tracker
+
+    def send(self, user, *args):
+        """
+        send hit of user
+
+        :param user:
+        :param args: hit type and its options
+        :return:
+        """
+        tracker = self.get_tracker(user)
+        if self.batcher:
+            # hit goes straight to the batch queue,
+            # so stop() flushes all hits of GA
+            self.batcher.put(tracker.hit(*args))
+        else:
+            self.executor.add(functools.partial(tracker.send, *args))
 
     def event(self, user,
               event_category=None,
@@ -49,37 +98,27 @@ class GAStatistics:
               event_label=None,
               event_value=None,
               ):
-        queue.add(
-            functools.partial(self.get_tracker(user).send,
-                              'event', event_category, event_action, event_label, event_value
-                              )
-        )
+        self.send(user, 'event', event_category, event_action, event_label, event_value)
 
     def story(self, ctx):
         user = ctx.user()
         story_name = ctx.stack()[-1]['topic']
         story_part_name = ctx.get_current_story_part().__name__
 
-        queue.add(
-            functools.partial(self.get_tracker(user).send,
-                              'pageview', self.story_tracking_template.format(story=story_name,
-                                                                              part=story_part_name),
-                              )
-        )
+        self.send(user, 'pageview', self.story_tracking_template.format(story=story_name,
+                                                                        part=story_part_name))
 
     def new_message(self, ctx):
         user = ctx.message['user']
         data = ctx.get_user_data()
-        queue.add(
-            functools.partial(self.get_tracker(user).send,
-                              'pageview', self.new_message_tracking_template.format(data=json.dumps(data)),
-                              )
-        )
+        self.send(user, 'pageview', self.new_message_tracking_template.format(data=json.dumps(data)))
 
     def new_user(self, user):
-        queue.add(
-            functools.partial(self.get_tracker(user).send,
-                              'event',
-                              'new_user', 'start', 'new user starts chat'
-                              )
-        )
+        self.send(user, 'event', 'new_user', 'start', 'new user starts chat')
+
+    def message_processed(self, ctx, matched, elapsed):
+        # we don't send timings to GA
+        pass
+
+    def story_processed(self, ctx, elapsed):
+        pass
@@ -8,6 +8,7 @@ from unittest import mock
 from . import GAStatistics, tracker
 from .. import fb, ga, mockdb, mockhttp
 from ... import di, Story, utils
+from ...utils import queue
 
 story = None
 
@@ -27,7 +28,7 @@ def tracker_mock(mocker):
 @pytest.mark.asyncio
 async def test_should_put_in_queue_story_tracker(mocker, tracker_mock):
     user = utils.build_fake_user()
-    ga = GAStatistics(tracking_id='UA-XXXXX-Y')
+    ga = GAStatistics(tracking_id='UA-XXXXX-Y', use_batch=False)
 
     class FakePart:
         @property
@@ -36,13 +37,13 @@ async def test_should_put_in_queue_story_tracker(mocker, tracker_mock):
 
     ctx = story_context.StoryContext(None, None)
 
-    with mock.patch.object(ctx,
+    with mock.patch.object(story_context.StoryContext,
                            'user',
                            return_value=user):
-        with mock.patch.object(ctx,
+        with mock.patch.object(story_context.StoryContext,
                                'stack',
                                return_value=[{'topic': 'one story'}]):
-            with mock.patch.object(ctx,
+            with mock.patch.object(story_context.StoryContext,
                                    'get_current_story_part',
                                    return_value=FakePart()):
                 ga.story(ctx)
@@ -58,7 +59,7 @@ async def test_should_put_in_queue_story_tracker(mocker, tracker_mock):
 @pytest.mark.asyncio
 async def test_should_put_in_queue_new_message_tracker(tracker_mock):
     user = utils.build_fake_user()
-    ga = GAStatistics(tracking_id='UA-XXXXX-Y')
+    ga = GAStatistics(tracking_id='UA-XXXXX-Y', use_batch=False)
 
     ga.new_message(
         story_context.StoryContext(
@@ -80,7 +81,7 @@ async def test_should_put_in_queue_new_message_tracker(tracker_mock):
 @pytest.mark.asyncio
 async def test_should_put_in_queue_new_user_tracker(tracker_mock):
     user = utils.build_fake_user()
-    ga = GAStatistics(tracking_id='UA-XXXXX-Y')
+    ga = GAStatistics(tracking_id='UA-XXXXX-Y', use_batch=False)
 
     ga.new_user(user)
 
@@ -95,7 +96,7 @@ async def test_should_put_in_queue_new_user_tracker(tracker_mock):
 @pytest.mark.asyncio
 async def test_should_put_in_queue_event_tracker(tracker_mock):
     user = utils.build_fake_user()
-    ga = GAStatistics(tracking_id='UA-XXXXX-Y')
+    ga = GAStatistics(tracking_id='UA-XXXXX-Y', use_batch=False)
 
     ga.event(user, 'category', 'action', 'label', 10)
 
@@ -123,7 +124,7 @@ async def test_should_track_story(tracker_mock):
     story.use(mockdb.MockDB())
     facebook = story.use(fb.FBInterface())
     story.use(mockhttp.MockHttpInterface())
-    story.use(ga.GAStatistics(tracking_id='UA-XXXXX-Y'))
+    story.use(ga.GAStatistics(tracking_id='UA-XXXXX-Y', use_batch=False))
     await story.start()
 
     await facebook.handle({
@@ -174,3 +175,44 @@ def test_get_as_deps():
                 self.tracker = tracker
 
         assert isinstance(di.injector.get('one_class').tracker, ga.GAStatistics)
+
+
+def test_reuse_tracker_of_user():
+    user = utils.build_fake_user()
+    ga = GAStatistics(tracking_id='UA-XXXXX-Y', max_trackers=1)
+
+    tracker_of_user = ga.get_tracker(user)
+    assert ga.get_tracker(user) is tracker_of_user
+    assert tracker_of_user.batcher is ga.batcher
+
+    ga.get_tracker(utils.build_fake_user())
+    assert ga.get_tracker(user) is not tracker_of_user
+
+
+@pytest.mark.asyncio
+async def test_should_not_wait_for_other_background_jobs_on_stop():
+    ga = GAStatistics(tracking_id='UA-XXXXX-Y')
+    executor = queue.BackgroundExecutor()
+    ga.add_executor(executor)
+
+    executor.add(lambda: asyncio.sleep(10))
+
+    await asyncio.wait_for(ga.stop(), 1)
+    await executor.drain(timeout=0)
+
+
+@pytest.mark.asyncio
+async def test_flush_batched_hits_on_stop(mocker):
+    user = utils.build_fake_user()
+    ga = GAStatistics(tracking_id='UA-XXXXX-Y')
+    send_batch = mocker.patch.object(ga.batcher, 'send_batch', aiohttp.test_utils.make_mocked_coro())
+
+    ga.event(user, 'category', 'action', 'label', 10)
+    ga.new_user(user)
+    assert ga.batcher.stats()['queued'] == 2
+
+    await ga.stop()
+
+    assert send_batch.call_count == 1
+    assert len(send_batch.call_args[0][0]) == 2
+    assert 'ec=category' in send_batch.call_args[0][0][0]
@@ -0,0 +1,144 @@
+import aiohttp
+import asyncio
+import logging
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+# limits of measurement protocol
+# https://developers.google.com/analytics/devguides/collection/protocol/v1/devguide#batch-limitations
+MAX_HITS_PER_BATCH = 20
+MAX_HIT_SIZE = 8 * 1024
+MAX_BATCH_SIZE = 16 * 1024
+
+
+class HitBatcher:
+    """
+    buffer hits in bounded queue and send them
+    through `/batch` endpoint over one pooled session.
+
+    Hits are flushed once we have full batch,
+    after `interval` seconds and on `stop()`.
+    """
+
+    endpoint = 'https://www.google-analytics.com/batch'
+
+    def __init__(self, batch_size=MAX_HITS_PER_BATCH, interval=1.0, maxsize=1000, user_agent=None):
+        """
+
+        :param batch_size: max number of hits in one request (<= 20)
+        :param interval: how long (in seconds) hit could wait in the queue
+        :param maxsize: max number of hits in the queue. We drop new hits once queue is full
+        :param user_agent:
+        """
+        self.batch_size = min(batch_size, MAX_HITS_PER_BATCH)
+        self.interval = interval
+        self.maxsize = maxsize
+        self.user_agent = user_agent or 'Bot Story'
+
+        # encoded hits
+        self.hits = []
+        self.lock = None
+        self.session = None
+        self.timer = None
+
+        self.dropped = 0
+        self.failed = 0
+        self.sent = 0
+
+    def stats(self):
+        return {
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'queued': len(self.hits),
+            'sent': self.sent,
+        }
+
+    def put(self, values):
+        """
+        put hit in the queue
+
+        :param values: parameters of hit
+        :return: False if we have dropped hit
+        """
+        hit = urlencode(values)
+        if len(hit.encode('utf-8')) > MAX_HIT_SIZE:
+            logger.warning('drop hit because it is bigger than {} bytes'.format(MAX_HIT_SIZE))
+            self.dropped += 1
+            return False
+        if len(self.hits) >= self.maxsize:
+            logger.warning('drop hit because queue is full')
+            self.dropped += 1
+            return False
+
+        self.hits.append(hit)
+        if len(self.hits) >= self.batch_size:
+            self.flush_soon(0)
+        elif self.timer is None:
+            self.flush_soon(self.interval)
+        return True
+
+    def flush_soon(self, delay):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = asyncio.get_event_loop().call_later(
+            delay,
+            lambda: asyncio.ensure_future(self.flush()),
+        )
+
+    def next_batch(self):
+        batch = []
+        size = 0
+        while self.hits and len(batch) < self.batch_size:
+            # hits are joined by new line
+            hit_size = len(self.hits[0].encode('utf-8')) + 1
+            if batch and size + hit_size > MAX_BATCH_SIZE:
+                break
+            batch.append(self.hits.pop(0))
+            size += hit_size
+        return batch
+
+    async def flush(self):
+        """
+        send all queued hits
+
+        :return:
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+
+        async with self.lock:
+            while self.hits:
+                await self.send_batch(self.next_batch())
+
+    async def send_batch(self, batch):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(loop=asyncio.get_event_loop())
+        try:
+            async with self.session.post(self.endpoint,
+                                         data='\n'.join(batch).encode('utf-8'),
+                                         headers={
+                                             'User-Agent': self.user_agent,
+                                         }) as resp:
+                status = resp.status
+                if status >= 400:
+                    logger.warning('fail to send batch of {} hits: {} {}'.format(
+                        len(batch), status, await resp.text()))
+        except Exception as err:
+            # analytics shouldn't break the bot
+            logger.warning('fail to send batch of {} hits: {}'.format(len(batch), err))
+            status = None
+
+        if status is None or status >= 400:
+            self.failed += len(batch)
+        else:
+            self.sent += len(batch)
+
+    async def stop(self):
+        await self.flush()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+
+from . import fake_analytics
+from .batch import HitBatcher
+from .tracker import Tracker
+
+
+def hit(i):
+    return {'v': 1, 'tid': 'UA-XXXXX-Y', 't': 'pageview', 'dp': '/{}'.format(i)}
+
+
+async def get_batches(server):
+    return [(await h['request'].text()).split('\n') for h in server.history]
+
+
+@pytest.mark.asyncio
+async def test_flush_once_we_have_full_batch(event_loop):
+    async with fake_analytics.FakeAnalytics(event_loop) as server:
+        async with server.session() as session:
+            batcher = HitBatcher(batch_size=2, interval=60)
+            batcher.session = session
+
+            batcher.put(hit(1))
+            batcher.put(hit(2))
+            await asyncio.sleep(0.1)
+
+            batches = await get_batches(server)
+            assert len(batches) == 1
+            assert len(batches[0]) == 2
+            assert 'dp=%2F1' in batches[0][0]
+            assert 'dp=%2F2' in batches[0][1]
+            assert batcher.stats()['sent'] == 2
+
+
+@pytest.mark.asyncio
+async def test_flush_after_interval(event_loop):
+    async with fake_analytics.FakeAnalytics(event_loop) as server:
+        async with server.session() as session:
+            batcher = HitBatcher(interval=0.01)
+            batcher.session = session
+
+            batcher.put(hit(1))
+            assert len(server.history) == 0
+            await asyncio.sleep(0.1)
+
+            assert len(await get_batches(server)) == 1
+
+
+@pytest.mark.asyncio
+async def test_split_queue_to_batches_of_20_hits_on_flush(event_loop):
+    async with fake_analytics.FakeAnalytics(event_loop) as server:
+        async with server.session() as session:
+            batcher = HitBatcher(batch_size=100, interval=60)
+            batcher.session = session
+
+            for i in range(45):
+                batcher.put(hit(i))
+            await batcher.flush()
+
+            assert [len(b) for b in await get_batches(server)] == [20, 20, 5]
+
+
+@pytest.mark.asyncio
+async def test_drop_hits_once_queue_is_full():
+    batcher = HitBatcher(maxsize=1, interval=60)
+    assert batcher.put(hit(1))
+    assert not batcher.put(hit(2))
+    assert not batcher.put({'dp': 'x' * 10000})
+    assert batcher.stats()['dropped'] == 2
+    batcher.timer.cancel()
+
+
+def test_limit_size_of_batch():
+    batcher = HitBatcher()
+    batcher.hits = ['x' * 7000] * 3
+    assert len(batcher.next_batch()) == 2
+    assert len(batcher.next_batch()) == 1
+
+
+@pytest.mark.asyncio
+async def test_tracker_should_put_hit_to_batcher():
+    batcher = HitBatcher(interval=60)
+    tracker = Tracker('UA-XXXXX-Y', batcher=batcher)
+
+    await tracker.send('pageview', '/test')
+
+    assert len(batcher.hits) == 1
+    assert 't=pageview' in batcher.hits[0]
+    batcher.timer.cancel()
@@ -32,7 +32,7 @@ def generate_uuid(basedata=None):
     if basedata is None:
         return str(uuid.uuid4())
     elif isinstance(basedata, str):
-        checksum = hashlib.md5(basedata).hexdigest()
+        checksum = hashlib.md5(basedata.encode('utf-8')).hexdigest()
         return '%8s-%4s-%4s-%4s-%12s' % (
             checksum[0:8], checksum[8:12], checksum[12:16], checksum[16:20], checksum[20:32])
 
@@ -147,18 +147,20 @@ class Tracker:
 
     @classmethod
     def coerceParameter(cls, name, value=None):
-        if isinstance(name, str) and name[0] == '&':
-            return name[1:], str(value)
-        elif name in cls.parameter_alias:
-            typecast, param_name = cls.parameter_alias.get(name)
+        # flat lookup of all aliases and base names
+        alias = cls.parameter_alias.get(name, None)
+        if alias is not None:
+            typecast, param_name = alias
             return param_name, typecast(value)
-        else:
-            raise KeyError('Parameter "{0}" is not recognized'.format(name))
+        if isinstance(name, str) and name[:1] == '&':
+            return name[1:], str(value)
+        raise KeyError('Parameter "{0}" is not recognized'.format(name))
 
     def payload(self, data):
+        coerce = self.coerceParameter
         for key, value in data.items():
             try:
-                yield self.coerceParameter(key, value)
+                yield coerce(key, value)
             except KeyError:
                 continue
 
@@ -195,25 +197,32 @@ class Tracker:
         return self.params.get('tid', None)
 
     def __init__(self, account, name=None, client_id=None, hash_client_id=False, user_id=None, user_agent=None,
-                 use_post=True):
+                 use_post=True, batcher=None):
         # for debug purpose
         self._session = None
-        if use_post is False:
+        # shared HitBatcher. Once we have it we don't send hits one by one
+        self.batcher = batcher
+        if batcher:
+            self.http = None
+        elif use_post is False:
             self.http = HTTPRequest(user_agent=user_agent)
         else:
             self.http = HTTPPost(user_agent=user_agent)
 
-        self.params = {'v': 1, 'tid': account}
+        self.hash_client_id = hash_client_id
+
+        self.params = {'v': 1}
+        # coerced persistent params of each hit. We rebuild them on change only
+        self.persistent = {}
+        self.set('tid', account)
 
         if client_id is None:
             client_id = generate_uuid()
 
-        self.params['cid'] = client_id
-
-        self.hash_client_id = hash_client_id
+        self.set('cid', client_id)
 
         if user_id is not None:
-            self.params['uid'] = user_id
+            self.set('uid', user_id)
 
     def set_timestamp(self, data):
         """ Interpret time-related options, apply queue-time parameter as needed """
@@ -225,28 +234,43 @@ class Tracker:
     async def send(self, hittype, *args, **data):
         """ Transmit HTTP requests to Google Analytics using the measurement protocol """
 
+        data = self.hit(hittype, *args, **data)
+
+        # Transmit the hit to Google...
+        if self.batcher:
+            self.batcher.put(data)
+        else:
+            await self.http.send(data)
+
+    def hit(self, hittype, *args, **data):
+        """ Build parameters of hit """
+
         if hittype not in self.valid_hittypes:
             raise KeyError('Unsupported Universal Analytics Hit Type: {0}'.format(repr(hittype)))
 
         self.set_timestamp(data)
         self.consume_options(data, hittype, args)
 
+        transient = dict(self.payload(data))
         for item in args:  # process dictionary-object arguments of transcient data
             if isinstance(item, dict):
-                for key, val in self.payload(item):
-                    data[key] = val
+                transient.update(self.payload(item))
 
-        for k, v in self.params.items():  # update only absent parameters
-            if k not in data:
-                data[k] = v
+        if self.hash_client_id and 'cid' in transient:
+            transient['cid'] = generate_uuid(transient['cid'])
 
-        data = dict(self.payload(data))
-
-        if self.hash_client_id:
-            data['cid'] = generate_uuid(data['cid'])
+        # persistent parameters are already coerced
+        # so we only coerce transient ones
+        data = self.persistent.copy()
+        data.update(transient)
+        return data
 
-        # Transmit the hit to Google...
-        await self.http.send(data)
+    def prepare(self):
+        """ Build coerced payload of persistent params once they are changed """
+        persistent = dict(self.params)
+        if self.hash_client_id and 'cid' in persistent:
+            persistent['cid'] = generate_uuid(persistent['cid'])
+        self.persistent = persistent
 
     # Setting persistent attibutes of the session/hit/etc (inc. custom dimensions/metrics)
     def set(self, name, value=None):
@@ -263,6 +287,7 @@ class Tracker:
                 self.params[param] = value
             except KeyError:
                 pass
+        self.prepare()
 
     def __getitem__(self, name):
         param, value = self.coerceParameter(name, None)
@@ -271,11 +296,13 @@ class Tracker:
     def __setitem__(self, name, value):
         param, value = self.coerceParameter(name, value)
         self.params[param] = value
+        self.prepare()
 
     def __delitem__(self, name):
         param, value = self.coerceParameter(name, None)
         if param in self.params:
             del self.params[param]
+            self.prepare()
 
 
 def safe_unicode(obj):
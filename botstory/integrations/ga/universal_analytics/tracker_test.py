@@ -11,6 +11,7 @@
 
 import pytest
 import urllib
+from unittest import mock
 
 from .tracker import Tracker
 from . import fake_analytics
@@ -137,3 +138,48 @@ async def test_send_transaction(tracker, event_loop):
             await tracker.send('pageview', '/test', {'campaignName': 'testing3'}, hitage=60 * 20)  # 20 minutes ago
 
             # TODO: asserts
+
+
+@pytest.mark.asyncio
+async def test_transient_data_should_override_persistent_params(tracker):
+    tracker.set('page', '/persistent')
+    batcher = mock.Mock()
+    tracker.batcher = batcher
+
+    await tracker.send('pageview', {'page': '/transient', '&cd1': 'custom'})
+
+    hit = batcher.put.call_args[0][0]
+    assert hit['dp'] == '/transient'
+    assert hit['cd1'] == 'custom'
+    assert hit['tid'] == 'UA-XXXXX-Y'
+    assert hit['t'] == 'pageview'
+
+
+def test_coerce_persistent_params_of_constructor():
+    tracker = Tracker('UA-XXXXX-Y', client_id=1234567890, user_id=42)
+
+    assert tracker.params['cid'] == '1234567890'
+    assert tracker.params['uid'] == '42'
+    assert tracker.params['tid'] == 'UA-XXXXX-Y'
+
+
+def test_coerce_only_transient_data_of_hit(tracker):
+    tracker.set('page', '/persistent')
+
+    with mock.patch.object(tracker, 'coerceParameter', wraps=tracker.coerceParameter) as coerce:
+        hit = tracker.hit('event', 'category', 'action')
+
+    assert sorted(call[0][0] for call in coerce.call_args_list) == ['ea', 'ec', 't']
+    assert hit['dp'] == '/persistent'
+    assert hit['ec'] == 'category'
+    assert hit['tid'] == 'UA-XXXXX-Y'
+
+
+def test_hash_client_id_once_it_is_set():
+    tracker = Tracker('UA-XXXXX-Y', client_id='alice', hash_client_id=True)
+
+    hashed = tracker.hit('pageview')['cid']
+    assert hashed != 'alice'
+    assert tracker.hit('pageview')['cid'] == hashed
+    tracker.set('cid', 'bob')
+    assert tracker.hit('pageview')['cid'] not in ('bob', hashed)
@@ -0,0 +1,160 @@
+import bisect
+import collections
+
+# default buckets of latency histograms (in seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, escape(value)) for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+
+    def samples(self):
+        """
+        :return: iterator of (name, labels string, value)
+        """
+        raise NotImplementedError()
+
+    def expose(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.description),
+            '# TYPE {} {}'.format(self.name, self.type),
+        ]
+        for name, labels, value in self.samples():
+            lines.append('{}{} {}'.format(name, labels, format_value(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        super().__init__(name, description, labels)
+        self.values = collections.Counter()
+
+    def inc(self, *label_values, value=1):
+        self.values[label_values] += value
+
+    def get(self, *label_values):
+        return self.values[label_values]
+
+    def samples(self):
+        for label_values, value in self.values.items():
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Gauge(Metric):
+    """
+    gauge which we read from function on each scrape.
+
+    Gauge with labels reads dict of label values (tuple) -> value
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, description, fn, labels=()):
+        super().__init__(name, description, labels)
+        self.fn = fn
+
+    def samples(self):
+        if not self.labels:
+            yield self.name, '', self.fn()
+            return
+        for label_values, value in self.fn().items():
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [counts of buckets (not cumulative), sum, count]
+        self.values = {}
+
+    def observe(self, *label_values, value):
+        state = self.values.get(label_values, None)
+        if state is None:
+            state = self.values[label_values] = [[0] * len(self.buckets), 0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[0][index] += 1
+        state[1] += value
+        state[2] += 1
+
+    def get(self, *label_values):
+        """
+
+        :param label_values:
+        :return: (sum, count)
+        """
+        state = self.values.get(label_values, None)
+        if state is None:
+            return 0, 0
+        return state[1], state[2]
+
+    def samples(self):
+        for label_values, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', \
+                      format_labels(self.labels, label_values, ('le', format_value(float(bound)))), \
+                      cumulative
+            yield self.name + '_bucket', \
+                  format_labels(self.labels, label_values, ('le', '+Inf')), \
+                  count
+            yield self.name + '_sum', format_labels(self.labels, label_values), total
+            yield self.name + '_count', format_labels(self.labels, label_values), count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = collections.OrderedDict()
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError('metric {} is already registered'.format(metric.name))
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name, description, fn, labels=()):
+        return self.register(Gauge(name, description, fn, labels))
+
+    def histogram(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def expose(self):
+        """
+        metrics in prometheus text format
+
+        :return:
+        """
+        return '\n'.join(m.expose() for m in self.metrics.values()) + '\n'
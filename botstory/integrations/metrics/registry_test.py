@@ -0,0 +1,52 @@
+from . import registry
+
+
+def test_expose_counter():
+    r = registry.Registry()
+    counter = r.counter('messages_total', 'Received messages.', ['matched'])
+    counter.inc('true')
+    counter.inc('true')
+    counter.inc('false')
+
+    assert r.expose() == '\n'.join([
+        '# HELP messages_total Received messages.',
+        '# TYPE messages_total counter',
+        'messages_total{matched="true"} 2',
+        'messages_total{matched="false"} 1',
+    ]) + '\n'
+
+
+def test_expose_histogram():
+    r = registry.Registry()
+    histogram = r.histogram('part_seconds', 'Time of part.', ['part'], buckets=[0.1, 1])
+    histogram.observe('greet', value=0.05)
+    histogram.observe('greet', value=0.5)
+    histogram.observe('greet', value=5)
+
+    assert histogram.get('greet') == (5.55, 3)
+    assert r.expose().split('\n')[2:7] == [
+        'part_seconds_bucket{part="greet",le="0.1"} 1',
+        'part_seconds_bucket{part="greet",le="1.0"} 2',
+        'part_seconds_bucket{part="greet",le="+Inf"} 3',
+        'part_seconds_sum{part="greet"} 5.55',
+        'part_seconds_count{part="greet"} 3',
+    ]
+
+
+def test_read_gauge_on_expose():
+    r = registry.Registry()
+    r.gauge('depth', 'Depth of queue.', lambda: 7)
+    assert 'depth 7' in r.expose()
+
+
+def test_escape_label_values():
+    r = registry.Registry()
+    r.counter('parts_total', 'Parts.', ['part']).inc('say "hi"\n')
+    assert 'parts_total{part="say \\"hi\\"\\n"} 1' in r.expose()
+
+
+def test_read_gauge_with_labels_on_expose():
+    r = registry.Registry()
+    r.gauge('lane_depth', 'Depth of lane.', lambda: {('reply',): 2, ('broadcast',): 0}, ['lane'])
+    assert 'lane_depth{lane="reply"} 2' in r.expose()
+    assert 'lane_depth{lane="broadcast"} 0' in r.expose()
@@ -0,0 +1,147 @@
+import logging
+from aiohttp import web
+from . import registry
+from ... import di
+from ...utils import queue
+
+logger = logging.getLogger(__name__)
+
+SCOPE_DEPTH_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+
+@di.desc('tracker', reg=False)
+class MetricsTracker:
+    """
+    in-process metrics of story engine in prometheus text format.
+
+    Usage:
+
+        story.use(metrics.MetricsTracker())
+
+    metrics are exposed on `/metrics` route of http interface (AioHttpInterface)
+    """
+
+    def __init__(self, path='/metrics', buckets=registry.LATENCY_BUCKETS):
+        """
+
+        :param path: route of metrics. None - don't register route
+        :param buckets: buckets (in seconds) of latency histograms
+        """
+        self.path = path
+        self.chat = None
+        self.executor = queue.executor
+        self.http = None
+        self.queue = None
+
+        self.registry = registry.Registry()
+        r = self.registry
+        self.messages = r.counter('botstory_messages_total',
+                                  'Received messages.',
+                                  ['matched'])
+        self.message_seconds = r.histogram('botstory_message_seconds',
+                                           'Time of processing of message.',
+                                           buckets=buckets)
+        self.scope_depth = r.histogram('botstory_scope_depth',
+                                       'Depth of stack after message is processed.',
+                                       buckets=SCOPE_DEPTH_BUCKETS)
+        self.story_parts = r.counter('botstory_story_parts_total',
+                                     'Executed story parts.',
+                                     ['topic', 'part'])
+        self.story_part_seconds = r.histogram('botstory_story_part_seconds',
+                                              'Time of execution of story part.',
+                                              ['topic', 'part'], buckets)
+        self.new_users = r.counter('botstory_new_users_total',
+                                   'New users.')
+        self.events = r.counter('botstory_events_total',
+                                'Custom events.',
+                                ['category', 'action'])
+        self.storage_seconds = r.histogram('botstory_storage_seconds',
+                                           'Time of storage requests.',
+                                           ['method'], buckets)
+        self.http_seconds = r.histogram('botstory_http_seconds',
+                                        'Time of outgoing http requests.',
+                                        ['method'], buckets)
+        r.gauge('botstory_background_jobs_queued',
+                'Background jobs which wait for worker.',
+                lambda: self.executor.stats()['queued'])
+        r.gauge('botstory_background_jobs_running',
+                'Background jobs which are running.',
+                lambda: self.executor.stats()['running'])
+        r.gauge('botstory_work_queue_unfinished',
+                'Jobs of work queue which are not acknowledged yet.',
+                lambda: self.queue.unfinished if self.queue else 0)
+        r.gauge('botstory_outbound_queue_depth',
+                'Outgoing messages which wait in lane of scheduler.',
+                self.outbound_depth,
+                ['lane'])
+
+    @di.inject()
+    def add_chat(self, chat):
+        self.chat = chat
+
+    @di.inject()
+    def add_executor(self, executor):
+        self.executor = executor
+
+    @di.inject()
+    def add_http(self, http):
+        self.http = http
+
+    @di.inject()
+    def add_queue(self, queue):
+        self.queue = queue
+
+    async def before_start(self):
+        if self.path and self.http and hasattr(self.http, 'add_route'):
+            self.http.add_route('GET', self.path, self.handle)
+
+    async def handle(self, request):
+        return web.Response(text=self.expose(),
+                            content_type='text/plain',
+                            charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    def expose(self):
+        return self.registry.expose()
+
+    def outbound_depth(self):
+        if not self.chat:
+            return {}
+        return {(lane,): depth for lane, depth in self.chat.scheduler.stats()['depth'].items()}
+
+    # tracker api
+
+    def event(self, user,
+              event_category=None,
+              event_action=None,
+              event_label=None,
+              event_value=None,
+              ):
+        self.events.inc(event_category, event_action)
+
+    def new_message(self, ctx):
+        pass
+
+    def message_processed(self, ctx, matched, elapsed):
+        self.messages.inc('true' if matched else 'false')
+        self.message_seconds.observe(value=elapsed)
+        self.scope_depth.observe(value=len(ctx.stack()))
+
+    def new_user(self, user):
+        self.new_users.inc()
+
+    def story(self, ctx):
+        self.story_parts.inc(*self.part_labels(ctx))
+
+    def story_processed(self, ctx, elapsed):
+        self.story_part_seconds.observe(*self.part_labels(ctx), value=elapsed)
+
+    def storage_processed(self, method, elapsed):
+        self.storage_seconds.observe(method, value=elapsed)
+
+    def http_processed(self, method, elapsed):
+        self.http_seconds.observe(method, value=elapsed)
+
+    def part_labels(self, ctx):
+        story_part = ctx.get_current_story_part()
+        return ctx.stack()[-1]['topic'], getattr(story_part, '__name__', None)
@@ -0,0 +1,122 @@
+import pytest
+
+from .. import aiohttp, cachedb, metrics, mockdb, mockhttp, workqueue
+from ..tests import fake_server
+from ... import di, Story
+from ...utils import answer, scheduler
+
+story = None
+
+
+def teardown_function(function):
+    story and story.clear()
+
+
+def test_get_metrics_tracker_as_dep():
+    global story
+    story = Story()
+    story.use(metrics.MetricsTracker())
+
+    with di.child_scope():
+        @di.desc()
+        class OneClass:
+            @di.inject()
+            def deps(self, tracker):
+                self.tracker = tracker
+
+        assert isinstance(di.injector.get('one_class').tracker, metrics.MetricsTracker)
+
+
+@pytest.mark.asyncio
+async def test_count_messages_and_story_parts():
+    with answer.Talk() as talk:
+        story = talk.story
+        tracker = story.use(metrics.MetricsTracker())
+
+        @story.on('hi')
+        def one_story():
+            @story.part()
+            def greet(ctx):
+                pass
+
+        await story.start()
+        await talk.pure_text('hi')
+        await talk.pure_text('hi')
+        await talk.pure_text('bye')
+
+        assert tracker.messages.get('true') == 2
+        assert tracker.messages.get('false') == 1
+        assert tracker.story_parts.get('one_story', 'greet') == 2
+        assert tracker.story_part_seconds.get('one_story', 'greet')[1] == 2
+        assert tracker.message_seconds.get()[1] == 3
+        assert 'botstory_story_parts_total{topic="one_story",part="greet"} 2' in tracker.expose()
+
+
+@pytest.mark.asyncio
+async def test_time_storage_and_http_requests(event_loop):
+    global story
+    story = Story()
+    tracker = story.use(metrics.MetricsTracker())
+    db = story.use(cachedb.CacheDB(mockdb.MockDB()))
+    http = story.use(aiohttp.AioHttpInterface())
+
+    async with fake_server.FakeFacebook(event_loop) as server:
+        async with server.session() as session:
+            http.session = session
+            await db.get_user(facebook_user_id='1')
+            await http.post(fake_server.URI.format('/v2.6/me/messages/'), json={})
+
+    assert tracker.storage_seconds.get('get_user')[1] == 1
+    assert tracker.http_seconds.get('post')[1] == 1
+    # we don't patch methods of other extensions
+    assert 'get_user' not in vars(db.storage)
+    assert 'post' not in vars(http)
+
+
+@pytest.mark.asyncio
+async def test_register_metrics_route():
+    global story
+    story = Story()
+    tracker = story.use(metrics.MetricsTracker())
+    http = story.use(mockhttp.MockHttpInterface())
+
+    await story.start()
+
+    http.add_route.assert_called_once_with('GET', '/metrics', tracker.handle)
+
+
+@pytest.mark.asyncio
+async def test_expose_metrics_on_aiohttp_route():
+    global story
+    story = Story()
+    story.use(metrics.MetricsTracker())
+    http = story.use(aiohttp.AioHttpInterface(port=9877))
+
+    await story.start()
+    try:
+        res = await http.get_raw('http://localhost:9877/metrics')
+        assert res['status'] == 200
+        assert '# TYPE botstory_messages_total counter' in res['text']
+    finally:
+        await story.stop()
+
+
+@pytest.mark.asyncio
+async def test_expose_depth_of_work_queue_and_outbound_lanes():
+    global story
+    story = Story()
+    tracker = story.use(metrics.MetricsTracker())
+    work_queue = story.use(workqueue.AsyncioQueue())
+
+    await story.start()
+    work_queue.unfinished = 3
+    story.chat.scheduler.waiters.append((scheduler.LANES['broadcast'], 0, None, None))
+
+    exposed = tracker.expose()
+    assert 'botstory_work_queue_unfinished 3' in exposed
+    assert 'botstory_outbound_queue_depth{lane="reply"} 0' in exposed
+    assert 'botstory_outbound_queue_depth{lane="broadcast"} 1' in exposed
+
+    story.chat.scheduler.waiters.clear()
+    work_queue.unfinished = 0
+    await story.stop()
@@ -1,5 +1,7 @@
 import aiohttp
+import aiohttp.test_utils
 from ... import di, utils
+from ...utils import trace
 
 
 @di.desc('storage', reg=False)
@@ -8,22 +10,38 @@ class MockDB:
         self.session = None
         self.user = None
         self.setup = aiohttp.test_utils.make_mocked_coro()
+        self.storage_processed = None
 
+    @di.inject()
+    def add_tracker(self, tracker):
+        # optional hook of tracker
+        self.storage_processed = getattr(tracker, 'storage_processed', None)
+
+    @trace.timed('storage_processed')
     async def get_session(self, **kwargs):
         return self.session
 
+    @trace.timed('storage_processed')
     async def set_session(self, session):
         self.session = session
 
+    @trace.timed('storage_processed')
     async def new_session(self, **kwargs):
         return kwargs
 
+    @trace.timed('storage_processed')
     async def get_user(self, **kwargs):
         return self.user
 
+    @trace.timed('storage_processed')
     async def set_user(self, user):
         self.user = user
 
+    @trace.timed('storage_processed')
+    async def load_conversation(self, facebook_user_id):
+        return self.user, self.session
+
+    @trace.timed('storage_processed')
     async def new_user(self, **kwargs):
         self.user = utils.JSDict({**kwargs})
         return self.user
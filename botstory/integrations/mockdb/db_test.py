@@ -16,3 +16,13 @@ def test_get_mockdb_as_dep():
                 self.storage = storage
 
         assert isinstance(di.injector.get('one_class').storage, mockdb.MockDB)
+
+
+@pytest.mark.asyncio
+async def test_load_conversation():
+    db = mockdb.MockDB()
+    user = await db.new_user(facebook_user_id='1234567890')
+    session = {'stack': []}
+    await db.set_session(session)
+
+    assert await db.load_conversation(facebook_user_id='1234567890') == (user, session)
@@ -1,4 +1,5 @@
 import aiohttp
+import aiohttp.test_utils
 from aiohttp.helpers import sentinel
 import json
 from unittest import mock
@@ -54,3 +55,4 @@ class MockHttpInterface:
         self.start = aiohttp.test_utils.make_mocked_coro(return_value=start)
         self.stop = aiohttp.test_utils.make_mocked_coro(return_value=stop)
         self.webhook = stub('webhook')
+        self.add_route = stub('add_route')
@@ -25,3 +25,13 @@ class MockTracker:
         logging.debug('story')
         logging.debug(kwargs)
         logging.debug(args)
+
+    def message_processed(self, *args, **kwargs):
+        logging.debug('message_processed')
+        logging.debug(kwargs)
+        logging.debug(args)
+
+    def story_processed(self, *args, **kwargs):
+        logging.debug('story_processed')
+        logging.debug(kwargs)
+        logging.debug(args)
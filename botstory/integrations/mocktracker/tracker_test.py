@@ -31,6 +31,16 @@ def test_story():
     t.story()
 
 
+def test_message_processed():
+    t = tracker.MockTracker()
+    t.message_processed()
+
+
+def test_story_processed():
+    t = tracker.MockTracker()
+    t.story_processed()
+
+
 def test_get_mock_tracker_as_dep():
     global story
     story = Story()
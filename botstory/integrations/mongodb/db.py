@@ -1,11 +1,20 @@
 import asyncio
+import datetime
 import logging
 from motor import motor_asyncio
+import pymongo
+from pymongo import errors, ReturnDocument
+from . import dirty
 from ... import di
+from ...utils import scheduler, trace
 
 logger = logging.getLogger(__name__)
 
 
+def matches(doc, query):
+    return all(doc.get(key, None) == value for key, value in query.items())
+
+
 @di.desc('storage', reg=False)
 class MongodbInterface:
     """
@@ -17,7 +26,25 @@ class MongodbInterface:
                  db_name='bots',
                  user_collection_name='user',
                  session_collection_name='session',
+                 write_behind=0,
+                 ensure_indexes=True,
+                 session_ttl=None,
+                 store_retries=5,
                  ):
+        """
+
+        :param uri:
+        :param db_name:
+        :param user_collection_name:
+        :param session_collection_name:
+        :param write_behind: delay (in seconds) of storing session and user.
+        All writes of one document within this window are coalesced in one.
+        0 - store immediately
+        :param ensure_indexes: create required indexes on start
+        :param session_ttl: expire sessions which weren't modified
+        for this number of seconds (TTL index on `lastModified`)
+        :param store_retries: how many times we retry failed write-behind store
+        """
         self.cx = None
         self.db = None
         self.session_collection = None
@@ -26,6 +53,25 @@ class MongodbInterface:
         self.db_name = db_name
         self.session_collection_name = session_collection_name
         self.user_collection_name = user_collection_name
+        self.write_behind = write_behind
+        self.ensure_indexes = ensure_indexes
+        self.session_ttl = session_ttl
+        self.store_retries = store_retries
+
+        self.session_tracker = dirty.DirtyTracker()
+        self.user_tracker = dirty.DirtyTracker()
+        # (collection name, _id) -> document which waits for storing
+        self.pending = {}
+        # (collection name, facebook_user_id) -> key of pending document
+        self.pending_by_user = {}
+        # (collection name, _id) -> delayed flush
+        self.flushes = {}
+        self.storage_processed = None
+
+    @di.inject()
+    def add_tracker(self, tracker):
+        # optional hook of tracker
+        self.storage_processed = getattr(tracker, 'storage_processed', None)
 
     async def start(self):
         loop = asyncio.get_event_loop()
@@ -38,83 +84,321 @@ class MongodbInterface:
         logger.debug(' get session collection: {}'.format(self.session_collection_name))
         self.user_collection = self.db.get_collection(self.user_collection_name)
         logger.debug(' get user collection: {}'.format(self.user_collection_name))
+        if self.ensure_indexes:
+            created = await self.create_indexes()
+            if created:
+                logger.info('create indexes: {}'.format(', '.join(created)))
+            else:
+                logger.debug(' all indexes are already exist')
 
     async def stop(self):
+        await self.flush()
+        self.session_tracker.clear()
+        self.user_tracker.clear()
         self.cx = None
         self.db = None
         self.session_collection = None
         self.user_collection = None
 
+    def required_indexes(self):
+        """
+        :return: [(collection, keys, options)]
+        """
+        # documents without facebook user (for example from other messengers)
+        # shouldn't violate unique constraint
+        has_facebook_user = {'facebook_user_id': {'$exists': True}}
+        has_user = {'user_id': {'$exists': True}}
+        indexes = [
+            (self.user_collection, [('facebook_user_id', pymongo.ASCENDING)], {
+                'name': 'facebook_user_id',
+                'partialFilterExpression': has_facebook_user,
+                'unique': True,
+            }),
+            (self.session_collection, [('facebook_user_id', pymongo.ASCENDING)], {
+                'name': 'facebook_user_id',
+                'partialFilterExpression': has_facebook_user,
+                'unique': True,
+            }),
+            (self.session_collection, [('user_id', pymongo.ASCENDING)], {
+                'name': 'user_id',
+                'partialFilterExpression': has_user,
+                'unique': True,
+            }),
+        ]
+        if self.session_ttl:
+            indexes.append(
+                (self.session_collection, [('lastModified', pymongo.ASCENDING)], {
+                    'name': 'lastModified_ttl',
+                    'expireAfterSeconds': int(self.session_ttl),
+                }),
+            )
+        return indexes
+
+    async def create_indexes(self):
+        """
+        idempotently create required indexes
+
+        :return: list of created indexes
+        """
+        created = []
+        for collection, keys, options in self.required_indexes():
+            existing = await collection.index_information()
+            if options['name'] in existing:
+                continue
+            try:
+                await collection.create_index(keys, **options)
+            except errors.OperationFailure as err:
+                # for example the same keys are indexed with other options
+                logger.warning('could not create index {} of {}: {}'.format(
+                    options['name'], collection.name, err))
+                continue
+            created.append('{}.{}'.format(collection.name, options['name']))
+        return created
+
+    async def flush(self):
+        """
+        store all pending (write-behind) documents right now
+
+        :return:
+        """
+        for flush in self.flushes.values():
+            flush.cancel()
+        self.flushes = {}
+        pending, self.pending = self.pending, {}
+        self.pending_by_user = {}
+        for (collection_name, _id), doc in pending.items():
+            await self.store(collection_name, doc)
+
+    def get_collection_and_tracker(self, collection_name):
+        if collection_name == self.session_collection_name:
+            return self.session_collection, self.session_tracker
+        return self.user_collection, self.user_tracker
+
+    def find_pending(self, collection_name, query):
+        if not self.pending:
+            return None
+        if '_id' in query:
+            key = (collection_name, query['_id'])
+        elif 'facebook_user_id' in query:
+            key = self.pending_by_user.get((collection_name, query['facebook_user_id']), None)
+        else:
+            # rare query by other fields
+            return next((doc for (pending_collection_name, _id), doc in self.pending.items()
+                         if pending_collection_name == collection_name and
+                         matches(doc, query)), None)
+        doc = self.pending.get(key, None)
+        if doc is None or not matches(doc, query):
+            return None
+        return doc
+
+    def pop_pending(self, key):
+        doc = self.pending.pop(key, None)
+        if doc is not None:
+            user_key = (key[0], doc.get('facebook_user_id', None))
+            if self.pending_by_user.get(user_key, None) == key:
+                del self.pending_by_user[user_key]
+        return doc
+
+    def schedule_store(self, key, delay, attempt=0):
+        loop = asyncio.get_event_loop()
+        self.flushes[key] = loop.create_task(self.delayed_store(key, delay, attempt))
+
+    async def delayed_store(self, key, delay, attempt=0):
+        await asyncio.sleep(delay)
+        self.flushes.pop(key, None)
+        doc = self.pop_pending(key)
+        if doc is None:
+            return
+        try:
+            await self.store(key[0], doc)
+        except Exception as err:
+            logger.exception(err)
+            if key in self.pending:
+                # newer state of document is already waiting for storing
+                return
+            if attempt >= self.store_retries:
+                logger.error('drop {} after {} failed attempts to store it'.format(key, attempt + 1))
+                return
+            self.put_pending(key, doc)
+            if key not in self.flushes:
+                self.schedule_store(key,
+                                    scheduler.backoff_delay(attempt, base=self.write_behind),
+                                    attempt + 1)
+
+    async def write(self, collection_name, doc):
+        if self.write_behind <= 0 or '_id' not in doc:
+            return await self.store(collection_name, doc)
+
+        key = (collection_name, doc['_id'])
+        # the latest state of document overrides previous one
+        self.put_pending(key, doc)
+        if key not in self.flushes:
+            self.schedule_store(key, self.write_behind)
+        return doc['_id']
+
+    def put_pending(self, key, doc):
+        self.pending[key] = doc
+        if doc.get('facebook_user_id', None) is not None:
+            self.pending_by_user[(key[0], doc['facebook_user_id'])] = key
+
+    async def store(self, collection_name, doc):
+        """
+        store only modified fields of document.
+        Skip document if it wasn't changed since we have loaded it
+
+        :param collection_name:
+        :param doc:
+        :return: _id of document
+        """
+        collection, tracker = self.get_collection_and_tracker(collection_name)
+        if '_id' in doc:
+            _id = doc['_id']
+            doc.pop('lastModified', None)
+            update = tracker.changes(doc)
+            if update == {} and not self.should_touch(collection_name, tracker, doc):
+                logger.debug('skip unchanged {} {}'.format(collection_name, _id))
+                return _id
+            if update is None:
+                update = {'$set': {key: value for key, value in doc.items() if key != '_id'}}
+            update['$currentDate'] = {
+                'lastModified': True
+            }
+            res = await collection.update_one({'_id': _id}, update)
+
+            if res.matched_count != 0:
+                tracker.track(doc, datetime.datetime.utcnow())
+                return _id
+
+        _id = await collection.insert(doc)
+        tracker.track(doc)
+        return _id
+
+    def should_touch(self, collection_name, tracker, doc):
+        """
+        unchanged session still should refresh `lastModified`
+        from time to time otherwise TTL index would expire it
+
+        :param collection_name:
+        :param tracker:
+        :param doc:
+        :return:
+        """
+        if not self.session_ttl or collection_name != self.session_collection_name:
+            return False
+        modified_at = tracker.modified_at(doc)
+        if modified_at is None:
+            return True
+        age = datetime.datetime.utcnow() - modified_at
+        return age.total_seconds() > self.session_ttl / 2
+
     async def clear_collections(self):
+        self.session_tracker.clear()
+        self.user_tracker.clear()
         await self.session_collection.drop()
         self.session_collection = self.db.get_collection(self.session_collection_name)
         await self.user_collection.drop()
         self.user_collection = self.db.get_collection(self.user_collection_name)
 
+    @trace.timed('storage_processed')
     async def get_session(self, **kwargs):
+        session = self.find_pending(self.session_collection_name, kwargs)
+        if session:
+            return session
         session = await self.session_collection.find_one(kwargs)
         if not session:
             return None
-        session.pop('lastModified', None)
+        modified_at = session.pop('lastModified', None)
+        self.session_tracker.track(session, modified_at)
         return session
 
+    @trace.timed('storage_processed')
     async def set_session(self, session):
         logger.info('set_session {}'.format(session))
-        if '_id' in session:
-            _id = session['_id']
-            session.pop('lastModified', None)
-            res = await self.session_collection.update_one(
-                {'_id': _id},
-                {
-                    '$set': session,
-                    '$currentDate': {
-                        'lastModified': True
-                    },
-                },
-            )
-
-            if res.matched_count != 0:
-                return _id
-
-        return await self.session_collection.insert(session)
+        return await self.write(self.session_collection_name, session)
 
+    @trace.timed('storage_processed')
     async def new_session(self, user, **kwargs):
         logger.info('new_session for {}'.format(user))
         kwargs['user_id'] = kwargs.get('user_id', user['_id'])
         kwargs['stack'] = kwargs.get('stack', [])
-        _id = await self.session_collection.insert(kwargs)
-        return await self.session_collection.find_one({'_id': _id})
+        session, modified_at = await self.upsert(self.session_collection, 'user_id', kwargs)
+        self.session_tracker.track(session, modified_at)
+        return session
 
+    @trace.timed('storage_processed')
     async def get_user(self, **kwargs):
         if 'id' in kwargs:
             kwargs['_id'] = kwargs.get('id', None)
             del kwargs['id']
+        user = self.find_pending(self.user_collection_name, kwargs)
+        if user:
+            return user
         user = await self.user_collection.find_one(kwargs)
         if not user:
             return None
-        user.pop('lastModified', None)
+        modified_at = user.pop('lastModified', None)
+        self.user_tracker.track(user, modified_at)
         return user
 
+    @trace.timed('storage_processed')
     async def set_user(self, user):
         logger.info('set_user {}'.format(user))
-        if '_id' in user:
-            _id = user['_id']
-            user.pop('lastModified', None)
-            res = await self.user_collection.update_one(
-                {'_id': _id},
+        return await self.write(self.user_collection_name, user)
+
+    # TODO: should be able to process dictionary
+    @trace.timed('storage_processed')
+    async def new_user(self, **kwargs):
+        logger.debug('store new user {}'.format(kwargs))
+        user, modified_at = await self.upsert(self.user_collection, 'facebook_user_id', kwargs)
+        self.user_tracker.track(user, modified_at)
+        return user
+
+    async def upsert(self, collection, key, doc):
+        """
+        create new document (or get existing one with the same `key`)
+        in a single round trip
+
+        :param collection:
+        :param key: unique field of document
+        :param doc:
+        :return: (stored document, when it was modified)
+        """
+        if doc.get(key, None) is None:
+            await collection.insert(doc)
+            return doc, None
+
+        async def find_and_update():
+            return await collection.find_one_and_update(
+                {key: doc[key]},
                 {
-                    '$set': user,
+                    '$setOnInsert': doc,
                     '$currentDate': {
                         'lastModified': True
                     },
                 },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
             )
-            if res.matched_count != 0:
-                return _id
-        return await self.user_collection.insert(user)
 
-    # TODO: should be able to process dictionary
-    async def new_user(self, **kwargs):
-        logger.debug('store new user {}'.format(kwargs))
-        _id = await self.user_collection.insert(kwargs)
-        return await self.user_collection.find_one({'_id': _id})
+        try:
+            stored = await find_and_update()
+        except errors.DuplicateKeyError:
+            # concurrent upsert has inserted the document first.
+            # Now we should just find it
+            stored = await find_and_update()
+        modified_at = stored.pop('lastModified', None)
+        return stored, modified_at
+
+    @trace.timed('storage_processed')
+    async def load_conversation(self, facebook_user_id):
+        """
+        load user and its session concurrently
+
+        :param facebook_user_id:
+        :return: (user, session). Each of them could be None
+        """
+        user, session = await asyncio.gather(
+            self.get_user(facebook_user_id=facebook_user_id),
+            self.get_session(facebook_user_id=facebook_user_id),
+        )
+        return user, session
@@ -1,6 +1,8 @@
+import asyncio
 import logging
 import os
 import pytest
+from pymongo import errors
 
 from . import db
 from .. import mongodb
@@ -153,3 +155,174 @@ def test_get_mongodb_as_dep():
                 self.storage = storage
 
         assert isinstance(di.injector.get('one_class').storage, mongodb.MongodbInterface)
+
+
+@pytest.mark.asyncio
+async def test_skip_storing_of_unchanged_user(open_db, mocker):
+    async with open_db() as db_interface:
+        user = await db_interface.new_user(facebook_user_id='1234567890')
+        mocker.spy(db_interface.user_collection, 'update_one')
+
+        await db_interface.set_user(user)
+
+        assert not db_interface.user_collection.update_one.called
+
+
+@pytest.mark.asyncio
+async def test_store_only_modified_fields_of_session(open_db, mocker):
+    async with open_db() as db_interface:
+        user = await db_interface.new_user(facebook_user_id='1234567890')
+        session = await db_interface.new_session(facebook_user_id='1234567890', user=user)
+        mocker.spy(db_interface.session_collection, 'update_one')
+
+        session['stack'] = [{'topic': 'hello'}]
+        await db_interface.set_session(session)
+
+        update = db_interface.session_collection.update_one.call_args[0][1]
+        assert update['$set'] == {'stack': [{'topic': 'hello'}]}
+        restored_session = await db_interface.get_session(facebook_user_id='1234567890')
+        assert restored_session['stack'] == [{'topic': 'hello'}]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_writes_of_one_session_in_write_behind_mode(open_db, mocker):
+    async with open_db() as db_interface:
+        db_interface.write_behind = 0.01
+        user = await db_interface.new_user(facebook_user_id='1234567890')
+        session = await db_interface.new_session(facebook_user_id='1234567890', user=user)
+        mocker.spy(db_interface.session_collection, 'update_one')
+
+        await db_interface.set_session({**session, 'stack': [{'topic': 'first'}]})
+        await db_interface.set_session({**session, 'stack': [{'topic': 'second'}]})
+        restored_session = await db_interface.get_session(facebook_user_id='1234567890')
+        assert restored_session['stack'] == [{'topic': 'second'}]
+
+        await db_interface.flush()
+
+        assert db_interface.session_collection.update_one.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_find_pending_documents_by_facebook_user_id_and_id():
+    db_interface = db.MongodbInterface(write_behind=60)
+    await db_interface.set_user({'_id': 'u1', 'facebook_user_id': '1'})
+    await db_interface.set_user({'_id': 'u2', 'facebook_user_id': '2'})
+    await db_interface.set_session({'_id': 's1', 'facebook_user_id': '1', 'stack': []})
+
+    assert db_interface.find_pending('user', {'facebook_user_id': '2'})['_id'] == 'u2'
+    assert db_interface.find_pending('session', {'facebook_user_id': '1'})['_id'] == 's1'
+    assert db_interface.find_pending('user', {'_id': 'u1'})['facebook_user_id'] == '1'
+    assert db_interface.find_pending('user', {'facebook_user_id': '3'}) is None
+    assert db_interface.find_pending('session', {'facebook_user_id': '2'}) is None
+
+    db_interface.pop_pending(('user', 'u2'))
+    assert db_interface.find_pending('user', {'facebook_user_id': '2'}) is None
+    assert ('user', '2') not in db_interface.pending_by_user
+
+    for flush in db_interface.flushes.values():
+        flush.cancel()
+
+
+@pytest.mark.asyncio
+async def test_retry_failed_write_behind_store():
+    db_interface = db.MongodbInterface(write_behind=0.01)
+    stored = []
+
+    async def store(collection_name, doc):
+        stored.append(doc)
+        if len(stored) == 1:
+            raise errors.AutoReconnect('connection is lost')
+        return doc['_id']
+
+    db_interface.store = store
+    session = {'_id': 's1', 'facebook_user_id': '1', 'stack': []}
+    await db_interface.set_session(session)
+
+    await asyncio.sleep(0.1)
+
+    assert stored == [session, session]
+    assert db_interface.pending == {}
+    assert db_interface.flushes == {}
+
+
+@pytest.mark.asyncio
+async def test_flush_pending_documents_on_stop():
+    db_interface = db.MongodbInterface(write_behind=60)
+    stored = []
+
+    async def store(collection_name, doc):
+        stored.append(doc)
+        return doc['_id']
+
+    db_interface.store = store
+    session = {'_id': 's1', 'facebook_user_id': '1', 'stack': []}
+    await db_interface.set_session(session)
+
+    await db_interface.stop()
+
+    assert stored == [session]
+    assert db_interface.pending == {}
+
+
+@pytest.mark.asyncio
+async def test_load_conversation(open_db):
+    async with open_db() as db_interface:
+        user = await db_interface.new_user(facebook_user_id='1234567890')
+        session = await db_interface.new_session(facebook_user_id='1234567890', user=user)
+
+        restored_user, restored_session = await db_interface.load_conversation(facebook_user_id='1234567890')
+
+        assert restored_user['_id'] == user['_id']
+        assert restored_session['_id'] == session['_id']
+
+
+@pytest.mark.asyncio
+async def test_load_conversation_of_unknown_user(open_db):
+    async with open_db() as db_interface:
+        assert await db_interface.load_conversation(facebook_user_id='1234567890') == (None, None)
+
+
+@pytest.mark.asyncio
+async def test_should_not_duplicate_user_on_concurrent_creation(open_db):
+    async with open_db() as db_interface:
+        user_1 = await db_interface.new_user(facebook_user_id='1234567890')
+        user_2 = await db_interface.new_user(facebook_user_id='1234567890')
+
+        assert user_1['_id'] == user_2['_id']
+        assert await db_interface.user_collection.count() == 1
+
+
+@pytest.mark.asyncio
+async def test_find_user_inserted_by_concurrent_upsert():
+    class RacingCollection:
+        def __init__(self):
+            self.calls = 0
+
+        async def find_one_and_update(self, query, update, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                raise errors.DuplicateKeyError('E11000 duplicate key error')
+            return {'_id': 'u1', 'facebook_user_id': query['facebook_user_id']}
+
+    db_interface = db.MongodbInterface()
+    collection = RacingCollection()
+
+    user, _ = await db_interface.upsert(collection, 'facebook_user_id', {'facebook_user_id': '1'})
+
+    assert user == {'_id': 'u1', 'facebook_user_id': '1'}
+    assert collection.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_create_indexes_idempotently(open_db):
+    async with open_db() as db_interface:
+        db_interface.session_ttl = 3600
+        created = await db_interface.create_indexes()
+        assert 'session.lastModified_ttl' in created
+        assert 'user.facebook_user_id' in created
+
+        assert await db_interface.create_indexes() == []
+
+        indexes = await db_interface.session_collection.index_information()
+        assert indexes['lastModified_ttl']['expireAfterSeconds'] == 3600
+        assert indexes['facebook_user_id']['unique'] is True
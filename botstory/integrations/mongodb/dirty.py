@@ -0,0 +1,87 @@
+import copy
+from ...utils import lru
+
+
+def diff(original, current, prefix=''):
+    """
+    find modified field paths of document
+
+    :param original: snapshot of document
+    :param current: document
+    :param prefix: path of nested document
+    :return: ({dotted path: new value}, {dotted path of removed field: ''})
+    """
+    modified = {}
+    removed = {}
+    for key, value in current.items():
+        path = prefix + str(key)
+        if key not in original:
+            modified[path] = value
+            continue
+        old_value = original[key]
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            nested_modified, nested_removed = diff(old_value, value, path + '.')
+            modified.update(nested_modified)
+            removed.update(nested_removed)
+        elif value != old_value or type(value) != type(old_value):
+            modified[path] = value
+
+    for key in original.keys():
+        if key not in current:
+            removed[prefix + str(key)] = ''
+
+    return modified, removed
+
+
+class DirtyTracker:
+    """
+    keeps snapshots of loaded documents
+    so we could store only modified fields
+    and skip documents which weren't changed at all
+    """
+
+    def __init__(self, maxsize=10000):
+        self.snapshots = lru.LRUCache(maxsize=maxsize)
+
+    def track(self, doc, modified_at=None):
+        """
+        remember the current state of document
+
+        :param doc:
+        :param modified_at: when document was stored last time
+        :return:
+        """
+        if doc and '_id' in doc:
+            self.snapshots.set(doc['_id'], (copy.deepcopy(doc), modified_at))
+
+    def modified_at(self, doc):
+        original, modified_at = self.snapshots.get(doc['_id'], (None, None))
+        return modified_at
+
+    def changes(self, doc):
+        """
+        get update of document since the last `track`
+
+        :param doc:
+        :return: mongodb update ({'$set': ..., '$unset': ...}),
+                 empty dict if nothing were changed
+                 or None if we don't have snapshot of document
+        """
+        original, modified_at = self.snapshots.get(doc['_id'], (None, None))
+        if original is None:
+            return None
+        modified, removed = diff(original, doc)
+        modified.pop('_id', None)
+        removed.pop('_id', None)
+        update = {}
+        if modified:
+            update['$set'] = modified
+        if removed:
+            update['$unset'] = removed
+        return update
+
+    def forget(self, doc):
+        self.snapshots.pop(doc['_id'], None)
+
+    def clear(self):
+        self.snapshots.clear()
@@ -0,0 +1,47 @@
+from . import dirty
+
+
+def test_diff_of_the_same_documents_is_empty():
+    assert dirty.diff({'a': 1, 'b': {'c': [1]}}, {'a': 1, 'b': {'c': [1]}}) == ({}, {})
+
+
+def test_diff_nested_fields():
+    modified, removed = dirty.diff(
+        {'a': 1, 'b': {'c': 1, 'd': 2}, 'e': 3},
+        {'a': 1, 'b': {'c': 10}, 'f': [1]},
+    )
+    assert modified == {'b.c': 10, 'f': [1]}
+    assert removed == {'b.d': '', 'e': ''}
+
+
+def test_diff_whole_lists():
+    modified, removed = dirty.diff({'stack': [{'topic': 'a'}]}, {'stack': [{'topic': 'b'}]})
+    assert modified == {'stack': [{'topic': 'b'}]}
+
+
+def test_skip_unchanged_document():
+    tracker = dirty.DirtyTracker()
+    doc = {'_id': 1, 'name': 'Alice'}
+    tracker.track(doc)
+    assert tracker.changes(doc) == {}
+
+
+def test_return_only_modified_fields():
+    tracker = dirty.DirtyTracker()
+    doc = {'_id': 1, 'name': 'Alice', 'data': {'count': 1}}
+    tracker.track(doc)
+    doc['data']['count'] = 2
+    assert tracker.changes(doc) == {'$set': {'data.count': 2}}
+
+
+def test_unknown_document_does_not_have_changes():
+    tracker = dirty.DirtyTracker()
+    assert tracker.changes({'_id': 1}) is None
+
+
+def test_remember_when_document_was_modified():
+    tracker = dirty.DirtyTracker()
+    doc = {'_id': 1}
+    tracker.track(doc, modified_at=123)
+    assert tracker.modified_at(doc) == 123
+    assert tracker.modified_at({'_id': 2}) is None
@@ -0,0 +1 @@
+from .tracker import SampledTracker
@@ -0,0 +1,173 @@
+import asyncio
+import collections
+import logging
+import random
+from ... import di
+
+logger = logging.getLogger(__name__)
+
+
+def truncate(value, max_length, max_items=10, depth=3):
+    """
+    shrink value before we send it to analytics
+
+    :param value:
+    :param max_length: max length of string
+    :param max_items: max number of items of dict and list
+    :param depth: max depth of nested values
+    :return:
+    """
+    if isinstance(value, str):
+        if len(value) > max_length:
+            return value[:max_length] + '...'
+        return value
+    if isinstance(value, dict):
+        if depth <= 0:
+            return '{...}'
+        return {
+            key: truncate(item, max_length, max_items, depth - 1)
+            for key, item in list(value.items())[:max_items]
+        }
+    if isinstance(value, (list, tuple)):
+        if depth <= 0:
+            return '[...]'
+        return [truncate(item, max_length, max_items, depth - 1)
+                for item in value[:max_items]]
+    return value
+
+
+@di.desc('tracker', reg=False)
+class SampledTracker:
+    """
+    cut analytics traffic of high-volume bots.
+
+    Usage:
+
+        story.use(sampledtracker.SampledTracker(ga.GAStatistics(...)))
+
+    - samples hits of each type (`event`, `new_message`, `new_user`, `story`)
+    - counts story parts locally and flushes counts as `story` events
+      every `flush_interval` seconds
+    - sends only truncated message data instead of the whole session data
+    """
+
+    def __init__(self, tracker,
+                 sample_rates=None,
+                 aggregate_stories=True,
+                 flush_interval=60.0,
+                 data_fields=('message',),
+                 max_length=64,
+                 ):
+        """
+
+        :param tracker: wrapped tracker
+        :param sample_rates: dict of hit type and part (0..1) of hits which we send
+        :param aggregate_stories: count story parts instead of sending hit for each of them
+        :param flush_interval: how often (in seconds) we send aggregated counts
+        :param data_fields: fields of session data which we pass to `new_message`
+        :param max_length: max length of strings of message data
+        """
+        self.tracker = tracker
+        self.sample_rates = sample_rates or {}
+        self.aggregate_stories = aggregate_stories
+        self.flush_interval = flush_interval
+        self.data_fields = data_fields
+        self.max_length = max_length
+
+        # (story, part) -> count
+        self.counts = collections.Counter()
+        self.timer = None
+
+        self.received = collections.Counter()
+        self.sent = collections.Counter()
+
+    def __getattr__(self, item):
+        if item == 'tracker':
+            raise AttributeError(item)
+        return getattr(self.tracker, item)
+
+    def stats(self):
+        return {
+            'received': dict(self.received),
+            'sent': dict(self.sent),
+            'pending': sum(self.counts.values()),
+        }
+
+    def should_send(self, hit_type):
+        self.received[hit_type] += 1
+        rate = self.sample_rates.get(hit_type, 1.0)
+        if rate >= 1 or random.random() < rate:
+            self.sent[hit_type] += 1
+            return True
+        return False
+
+    def event(self, *args, **kwargs):
+        if self.should_send('event'):
+            self.tracker.event(*args, **kwargs)
+
+    def new_user(self, user):
+        if self.should_send('new_user'):
+            self.tracker.new_user(user)
+
+    def new_message(self, ctx):
+        if not self.should_send('new_message'):
+            return
+        session = ctx.message['session']
+        data = session['data']
+        ctx = ctx.clone()
+        ctx.message = {
+            **ctx.message,
+            'session': {
+                **session,
+                'data': truncate({
+                    key: data[key] for key in self.data_fields if key in data
+                }, self.max_length),
+            },
+        }
+        self.tracker.new_message(ctx)
+
+    def story(self, ctx):
+        if not self.aggregate_stories:
+            if self.should_send('story'):
+                self.tracker.story(ctx)
+            return
+
+        self.received['story'] += 1
+        story_name = ctx.stack()[-1]['topic']
+        story_part_name = ctx.get_current_story_part().__name__
+        self.counts[(story_name, story_part_name)] += 1
+        if self.timer is None:
+            self.timer = asyncio.get_event_loop().call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        """
+        send aggregated counts of story parts as events
+
+        :return:
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        counts, self.counts = self.counts, collections.Counter()
+        for (story_name, story_part_name), count in counts.items():
+            self.sent['story'] += 1
+            self.tracker.event(
+                None,
+                'story',
+                '{}/{}'.format(story_name, story_part_name),
+                None,
+                count,
+            )
+
+    async def setup(self):
+        if hasattr(self.tracker, 'setup'):
+            await self.tracker.setup()
+
+    async def start(self):
+        if hasattr(self.tracker, 'start'):
+            await self.tracker.start()
+
+    async def stop(self):
+        self.flush()
+        if hasattr(self.tracker, 'stop'):
+            await self.tracker.stop()
@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from unittest import mock
+
+from . import tracker
+from .. import mocktracker, sampledtracker
+from ... import di, Story, utils
+from ...ast import story_context
+from ...utils import answer
+
+
+@pytest.fixture
+def wrapped():
+    return mock.Mock(spec=mocktracker.MockTracker())
+
+
+def test_get_sampled_tracker_as_dep():
+    story = Story()
+    story.use(sampledtracker.SampledTracker(mocktracker.MockTracker()))
+
+    with di.child_scope():
+        @di.desc()
+        class OneClass:
+            @di.inject()
+            def deps(self, tracker):
+                self.tracker = tracker
+
+        assert isinstance(di.injector.get('one_class').tracker, sampledtracker.SampledTracker)
+    story.clear()
+
+
+def test_sample_hits(wrapped):
+    t = sampledtracker.SampledTracker(wrapped, sample_rates={
+        'event': 0,
+        'new_user': 1,
+    })
+    user = utils.build_fake_user()
+
+    for _ in range(10):
+        t.event(user, 'category', 'action')
+        t.new_user(user)
+
+    assert wrapped.event.call_count == 0
+    assert wrapped.new_user.call_count == 10
+    assert t.stats()['received']['event'] == 10
+
+
+def test_pass_only_truncated_message_data(wrapped):
+    t = sampledtracker.SampledTracker(wrapped, max_length=5)
+    ctx = story_context.StoryContext({
+        'user': utils.build_fake_user(),
+        'session': {
+            'data': {
+                'message': {'text': {'raw': 'hello world!'}},
+                'secret': 'secret',
+            },
+            'stack': [],
+        },
+    }, None)
+
+    t.new_message(ctx)
+
+    data = wrapped.new_message.call_args[0][0].get_user_data()
+    assert data == {'message': {'text': {'raw': 'hello...'}}}
+    # original context stays the same
+    assert ctx.get_user_data()['secret'] == 'secret'
+
+
+def test_truncate():
+    assert tracker.truncate('abc', 2) == 'ab...'
+    assert tracker.truncate(list(range(20)), 2, max_items=3) == [0, 1, 2]
+    assert tracker.truncate({'a': {'b': {'c': 1}}}, 2, depth=2) == {'a': {'b': '{...}'}}
+    assert tracker.truncate(10, 2) == 10
+
+
+@pytest.mark.asyncio
+async def test_aggregate_story_parts(wrapped):
+    with answer.Talk() as talk:
+        story = talk.story
+        t = story.use(sampledtracker.SampledTracker(wrapped, flush_interval=0.05))
+
+        @story.on('hi')
+        def one_story():
+            @story.part()
+            def greet(ctx):
+                pass
+
+        await story.start()
+        for _ in range(3):
+            await talk.pure_text('hi')
+
+        assert wrapped.story.call_count == 0
+        await asyncio.sleep(0.1)
+
+        wrapped.event.assert_called_once_with(None, 'story', 'one_story/greet', None, 3)
+        assert t.stats()['pending'] == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_story_parts_on_stop(wrapped):
+    with answer.Talk() as talk:
+        story = talk.story
+        story.use(sampledtracker.SampledTracker(wrapped))
+
+        @story.on('hi')
+        def one_story():
+            @story.part()
+            def greet(ctx):
+                pass
+
+        await story.start()
+        await talk.pure_text('hi')
+        await story.stop()
+
+        wrapped.event.assert_called_once_with(None, 'story', 'one_story/greet', None, 1)
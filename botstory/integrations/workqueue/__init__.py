@@ -0,0 +1,2 @@
+from .queue import AsyncioQueue, BaseQueue, Job
+from .sqlite import SQLiteQueue
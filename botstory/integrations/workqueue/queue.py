@@ -0,0 +1,221 @@
+import asyncio
+import logging
+from ... import di
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, topic, payload, id=None, attempts=0):
+        self.attempts = attempts
+        self.id = id
+        self.payload = payload
+        self.topic = topic
+
+    def __repr__(self):
+        return 'Job(id={}, topic={}, attempts={})'.format(self.id, self.topic, self.attempts)
+
+
+class BaseQueue:
+    """
+    queue of jobs which are handled by pool of workers.
+
+    job is acknowledged once its handler has finished successfully,
+    failed job is retried with exponential delay
+    until we exceed `max_retries`.
+
+    Implementation should define:
+     - `async def push(job)` - store new job
+     - `async def take()` - wait for the next ready job
+     - `async def ack(job)` - job is done (or finally failed)
+     - `async def retry(job, delay)` - return job back in `delay` seconds
+    """
+
+    def __init__(self,
+                 drain_timeout=60.0,
+                 max_retries=3,
+                 maxsize=1000,
+                 retry_delay=1.0,
+                 workers=4,
+                 ):
+        """
+
+        :param drain_timeout: how long we wait for unfinished jobs on stop
+        :param max_retries: how many times we retry failed job
+        :param maxsize: max number of unfinished jobs. `put` waits for free slot
+        :param retry_delay: delay before the first retry
+        :param workers: number of workers
+        """
+        self.drain_timeout = drain_timeout
+        self.max_retries = max_retries
+        self.maxsize = maxsize
+        self.retry_delay = retry_delay
+        self.workers_count = workers
+
+        self.handlers = {}
+        self.loop = None
+        self.workers = []
+        # number of stored but not acknowledged jobs
+        self.unfinished = 0
+        # there is no unfinished jobs
+        self.done = None
+        # number of unfinished jobs is less than maxsize
+        self.has_slot = None
+
+    def subscribe(self, topic, handler):
+        """
+        :param topic:
+        :param handler: coroutine function which receives payload of job
+        :return:
+        """
+        self.handlers[topic] = handler
+
+    def prepare(self):
+        if self.done is None:
+            self.loop = asyncio.get_event_loop()
+            self.done = asyncio.Event(loop=self.loop)
+            self.has_slot = asyncio.Event(loop=self.loop)
+            self.update_state()
+
+    def update_state(self):
+        if self.unfinished <= 0:
+            self.done.set()
+        else:
+            self.done.clear()
+
+        if self.unfinished < self.maxsize:
+            self.has_slot.set()
+        else:
+            self.has_slot.clear()
+
+    async def put(self, topic, payload):
+        """
+        put new job to the queue.
+        Waits while queue is full
+
+        :param topic:
+        :param payload:
+        :return:
+        """
+        self.prepare()
+        while self.unfinished >= self.maxsize:
+            await self.has_slot.wait()
+        self.accept(1)
+        try:
+            await self.push(Job(topic, payload))
+        except BaseException:
+            self.release()
+            raise
+
+    def accept(self, count):
+        self.unfinished += count
+        self.update_state()
+
+    def release(self):
+        self.unfinished -= 1
+        self.update_state()
+
+    async def start(self):
+        self.prepare()
+        loop = asyncio.get_event_loop()
+        self.workers = [loop.create_task(self.worker()) for _ in range(self.workers_count)]
+
+    async def stop(self):
+        """
+        gracefully drain unfinished jobs and stop workers
+
+        :return:
+        """
+        if self.workers and self.unfinished > 0:
+            logger.debug('drain {} unfinished jobs'.format(self.unfinished))
+            try:
+                await asyncio.wait_for(self.done.wait(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning('{} jobs were not finished in {} seconds'.format(
+                    self.unfinished, self.drain_timeout))
+
+        for worker in self.workers:
+            worker.cancel()
+        if self.workers:
+            await asyncio.wait(self.workers)
+        self.workers = []
+
+    async def worker(self):
+        while True:
+            try:
+                job = await self.take()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.exception(err)
+                await asyncio.sleep(self.retry_delay)
+                continue
+
+            try:
+                await self.process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                # failed ack (or retry) shouldn't stop the worker
+                logger.error('can not finish {}'.format(job))
+                logger.exception(err)
+                self.release()
+
+    async def process(self, job):
+        """
+        handle job and then acknowledge or retry it
+
+        :param job:
+        :return:
+        """
+        try:
+            await self.handle(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            if job.attempts < self.max_retries:
+                delay = self.retry_delay * 2 ** job.attempts
+                logger.warning('{} failed with {}. Retry in {} seconds'.format(job, err, delay))
+                job.attempts += 1
+                await self.retry(job, delay)
+                return
+            logger.error('{} failed {} times'.format(job, job.attempts + 1))
+            logger.exception(err)
+        await self.ack(job)
+        self.release()
+
+    async def handle(self, job):
+        try:
+            handler = self.handlers[job.topic]
+        except KeyError:
+            raise KeyError('There is no handler for topic {}'.format(job.topic))
+        await handler(job.payload)
+
+
+@di.desc('queue', reg=False)
+class AsyncioQueue(BaseQueue):
+    """
+    in-process bounded queue.
+    Unfinished jobs are lost on restart
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.jobs = None
+
+    def prepare(self):
+        super().prepare()
+        if self.jobs is None:
+            self.jobs = asyncio.Queue(loop=self.loop)
+
+    async def push(self, job):
+        self.jobs.put_nowait(job)
+
+    async def take(self):
+        return await self.jobs.get()
+
+    async def ack(self, job):
+        pass
+
+    async def retry(self, job, delay):
+        asyncio.get_event_loop().call_later(delay, self.jobs.put_nowait, job)
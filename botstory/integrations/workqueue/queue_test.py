@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+from . import queue
+
+
+@pytest.mark.asyncio
+async def test_handle_jobs():
+    q = queue.AsyncioQueue()
+    received = []
+
+    async def handler(payload):
+        received.append(payload)
+
+    q.subscribe('topic', handler)
+    await q.start()
+    await q.put('topic', {'text': 'hi'})
+    await q.put('topic', {'text': 'bye'})
+    await q.stop()
+
+    assert sorted(p['text'] for p in received) == ['bye', 'hi']
+    assert q.unfinished == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_failed_job():
+    q = queue.AsyncioQueue(retry_delay=0.001)
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        if len(attempts) < 3:
+            raise Exception('fail')
+
+    q.subscribe('topic', handler)
+    await q.start()
+    await q.put('topic', 'job')
+    await q.stop()
+
+    assert attempts == ['job', 'job', 'job']
+
+
+@pytest.mark.asyncio
+async def test_give_up_once_we_exceed_max_retries():
+    q = queue.AsyncioQueue(max_retries=1, retry_delay=0.001)
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        raise Exception('fail')
+
+    q.subscribe('topic', handler)
+    await q.start()
+    await q.put('topic', 'job')
+    await q.stop()
+
+    assert len(attempts) == 2
+    assert q.unfinished == 0
+
+
+@pytest.mark.asyncio
+async def test_drain_unfinished_jobs_on_stop():
+    q = queue.AsyncioQueue(workers=1)
+    received = []
+
+    async def handler(payload):
+        await asyncio.sleep(0.01)
+        received.append(payload)
+
+    q.subscribe('topic', handler)
+    await q.start()
+    for i in range(3):
+        await q.put('topic', i)
+    await q.stop()
+
+    assert received == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_put_should_wait_for_free_slot():
+    q = queue.AsyncioQueue(maxsize=1)
+    release_handler = asyncio.Event()
+
+    async def handler(payload):
+        await release_handler.wait()
+
+    q.subscribe('topic', handler)
+    await q.start()
+    await q.put('topic', 1)
+
+    second_put = asyncio.ensure_future(q.put('topic', 2))
+    await asyncio.sleep(0.01)
+    assert not second_put.done()
+
+    release_handler.set()
+    await asyncio.wait_for(second_put, 1)
+    await q.stop()
+    assert q.unfinished == 0
+
+
+@pytest.mark.asyncio
+async def test_keep_worker_alive_once_ack_failed():
+    q = queue.AsyncioQueue(workers=1)
+    received = []
+    acks = []
+
+    async def handler(payload):
+        received.append(payload)
+
+    async def ack(job):
+        acks.append(job)
+        if len(acks) == 1:
+            raise Exception('database is locked')
+
+    q.ack = ack
+    q.subscribe('topic', handler)
+    await q.start()
+    await q.put('topic', 'first')
+    await q.put('topic', 'second')
+    await q.stop()
+
+    assert received == ['first', 'second']
+    assert len(acks) == 2
+    assert q.unfinished == 0
@@ -0,0 +1,145 @@
+import asyncio
+from concurrent import futures
+import json
+import logging
+import sqlite3
+import time
+from . import queue
+from ... import di
+
+logger = logging.getLogger(__name__)
+
+
+@di.desc('queue', reg=False)
+class SQLiteQueue(queue.BaseQueue):
+    """
+    durable queue which stores jobs in SQLite file.
+    Jobs which were taken but not acknowledged before crash or restart
+    are returned to the queue on start (at-least-once delivery)
+    """
+
+    def __init__(self, path='botstory-queue.sqlite', poll_interval=1.0, **kwargs):
+        """
+
+        :param path: path to SQLite file
+        :param poll_interval: how often idle workers check delayed (retried) jobs
+        :param kwargs: options of queue.BaseQueue
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        self.poll_interval = poll_interval
+
+        self.connection = None
+        # all SQLite calls are serialized in one thread
+        self.executor = None
+        self.wakeup = None
+
+    async def execute(self, fn, *args):
+        if self.executor is None:
+            self.executor = futures.ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    def connect(self):
+        if self.connection is None:
+            logger.debug('open {}'.format(self.path))
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'topic TEXT NOT NULL, '
+                'payload TEXT NOT NULL, '
+                'attempts INTEGER NOT NULL DEFAULT 0, '
+                'state TEXT NOT NULL DEFAULT \'ready\', '
+                'available_at REAL NOT NULL DEFAULT 0)'
+            )
+            self.connection.commit()
+        return self.connection
+
+    def recover(self):
+        """
+        return taken but not acknowledged jobs back to the queue
+
+        :return: number of unfinished jobs
+        """
+        connection = self.connect()
+        connection.execute('UPDATE jobs SET state = \'ready\' WHERE state = \'taken\'')
+        connection.commit()
+        return connection.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    def insert(self, job):
+        connection = self.connect()
+        connection.execute('INSERT INTO jobs (topic, payload) VALUES (?, ?)',
+                           (job.topic, json.dumps(job.payload)))
+        connection.commit()
+
+    def take_ready(self, now):
+        connection = self.connect()
+        row = connection.execute(
+            'SELECT id, topic, payload, attempts FROM jobs '
+            'WHERE state = \'ready\' AND available_at <= ? '
+            'ORDER BY id LIMIT 1', (now,)).fetchone()
+        if row is None:
+            return None
+        connection.execute('UPDATE jobs SET state = \'taken\' WHERE id = ?', (row[0],))
+        connection.commit()
+        return queue.Job(id=row[0], topic=row[1], payload=json.loads(row[2]), attempts=row[3])
+
+    def delete(self, job):
+        connection = self.connect()
+        connection.execute('DELETE FROM jobs WHERE id = ?', (job.id,))
+        connection.commit()
+
+    def postpone(self, job, available_at):
+        connection = self.connect()
+        connection.execute(
+            'UPDATE jobs SET state = \'ready\', attempts = ?, available_at = ? WHERE id = ?',
+            (job.attempts, available_at, job.id))
+        connection.commit()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def prepare(self):
+        super().prepare()
+        if self.wakeup is None:
+            self.wakeup = asyncio.Event(loop=self.loop)
+
+    async def start(self):
+        recovered = await self.execute(self.recover)
+        if recovered > 0:
+            logger.info('recover {} unfinished jobs'.format(recovered))
+        self.prepare()
+        # jobs which were put before start are already counted
+        self.accept(max(recovered - self.unfinished, 0))
+        await super().start()
+
+    async def stop(self):
+        await super().stop()
+        if self.executor is not None:
+            await self.execute(self.close)
+            self.executor.shutdown()
+            self.executor = None
+
+    async def push(self, job):
+        await self.execute(self.insert, job)
+        self.wakeup.set()
+
+    async def take(self):
+        while True:
+            self.wakeup.clear()
+            job = await self.execute(self.take_ready, time.time())
+            if job is not None:
+                return job
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack(self, job):
+        await self.execute(self.delete, job)
+
+    async def retry(self, job, delay):
+        await self.execute(self.postpone, job, time.time() + delay)
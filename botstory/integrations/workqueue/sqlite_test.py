@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from . import sqlite
+
+
+@pytest.fixture
+def db_path(tmpdir):
+    return str(tmpdir.join('queue.sqlite'))
+
+
+@pytest.mark.asyncio
+async def test_handle_jobs(db_path):
+    q = sqlite.SQLiteQueue(path=db_path)
+    received = []
+
+    async def handler(payload):
+        received.append(payload)
+
+    q.subscribe('topic', handler)
+    await q.start()
+    await q.put('topic', {'text': 'hi'})
+    await q.stop()
+
+    assert received == [{'text': 'hi'}]
+    assert q.unfinished == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_failed_job(db_path):
+    q = sqlite.SQLiteQueue(path=db_path, poll_interval=0.001, retry_delay=0.001)
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        if len(attempts) < 2:
+            raise Exception('fail')
+
+    q.subscribe('topic', handler)
+    await q.start()
+    await q.put('topic', 'job')
+    await q.stop()
+
+    assert attempts == ['job', 'job']
+
+
+@pytest.mark.asyncio
+async def test_keep_jobs_which_were_put_before_start(db_path):
+    q = sqlite.SQLiteQueue(path=db_path)
+    received = []
+
+    async def handler(payload):
+        received.append(payload)
+
+    q.subscribe('topic', handler)
+    await q.put('topic', 'job')
+    await q.start()
+    await q.stop()
+
+    assert received == ['job']
+    assert q.unfinished == 0
+
+
+@pytest.mark.asyncio
+async def test_recover_taken_but_not_acknowledged_jobs(db_path):
+    interrupted = sqlite.SQLiteQueue(path=db_path, drain_timeout=0)
+    handler_started = asyncio.Event()
+
+    async def hang(payload):
+        handler_started.set()
+        await asyncio.sleep(10)
+
+    interrupted.subscribe('topic', hang)
+    await interrupted.start()
+    await interrupted.put('topic', 'job')
+    await handler_started.wait()
+    await interrupted.stop()
+
+    q = sqlite.SQLiteQueue(path=db_path)
+    received = []
+
+    async def handler(payload):
+        received.append(payload)
+
+    q.subscribe('topic', handler)
+    await q.start()
+    assert q.unfinished == 1
+    await q.stop()
+
+    assert received == ['job']
+    assert q.unfinished == 0
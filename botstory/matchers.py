@@ -1,5 +1,11 @@
+from .utils import lru
+
 matchers = {}
 
+# deserialized validators are immutable
+# so identical waiting-for states could share one instance
+deserialize_cache = lru.LRUCache(maxsize=1024)
+
 
 def build_serializer():
     def default_serialize(_):
@@ -43,6 +49,8 @@ def matcher():
         if not getattr(m, 'deserialize', False):
             m.deserialize = build_deserialize(m)
         matchers[m.type] = m
+        # drop instances of previously registered matcher of the same type
+        deserialize_cache.clear()
         return m
 
     return register
@@ -56,5 +64,35 @@ def serialize(m):
 
 
 def deserialize(data):
-    matcher_type = matchers[data['type']]
-    return matcher_type.deserialize(data['data'])
+    try:
+        key = freeze(data)
+        validator = deserialize_cache.get(key)
+    except TypeError:
+        # can't build hashable key from such data
+        key = None
+        validator = None
+
+    if validator is None:
+        matcher_type = matchers[data['type']]
+        validator = matcher_type.deserialize(data['data'])
+        if key is not None:
+            deserialize_cache.set(key, validator)
+
+    return validator
+
+
+def freeze(data):
+    """
+    build hashable key from serialized (json-like) data
+
+    :param data:
+    :return:
+    """
+    if isinstance(data, dict):
+        return dict, tuple(sorted((k, freeze(v)) for k, v in data.items()))
+    if isinstance(data, (list, tuple)):
+        return list, tuple(freeze(v) for v in data)
+    hash(data)
+    # True, 1 and 1.0 are equal (and have the same hash)
+    # but they are different values for matchers
+    return type(data), data
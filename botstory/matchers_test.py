@@ -0,0 +1,52 @@
+from botstory import matchers
+from botstory.ast import forking
+from botstory.middlewares import option, text
+
+
+def setup_function(function):
+    matchers.deserialize_cache.clear()
+
+
+def test_share_deserialized_validator():
+    data = matchers.serialize(text.Match('hello (.*)'))
+    validator_1 = matchers.deserialize(data)
+    validator_2 = matchers.deserialize(matchers.serialize(text.Match('hello (.*)')))
+    assert validator_1 is validator_2
+    assert isinstance(validator_1, text.Match)
+
+
+def test_do_not_share_different_validators():
+    validator_1 = matchers.deserialize(matchers.serialize(option.Equal('yes')))
+    validator_2 = matchers.deserialize(matchers.serialize(option.Equal(['yes'])))
+    validator_3 = matchers.deserialize(matchers.serialize(option.Equal({'yes': 1})))
+    validator_4 = matchers.deserialize(matchers.serialize(option.Equal([['yes', 1]])))
+    assert len({id(validator_1), id(validator_2), id(validator_3), id(validator_4)}) == 4
+
+
+def test_share_switch():
+    switch = forking.Switch([
+        ('hi', text.Equal('hi')),
+        ('bye', text.Match('bye')),
+    ])
+    validator_1 = matchers.deserialize(matchers.serialize(switch))
+    validator_2 = matchers.deserialize(matchers.serialize(switch))
+    assert validator_1 is validator_2
+    assert list(validator_1.cases.keys()) == ['hi', 'bye']
+
+
+def test_count_hits_and_misses():
+    data = matchers.serialize(text.Equal('hi'))
+    matchers.deserialize(data)
+    matchers.deserialize(data)
+    stats = matchers.deserialize_cache.stats()
+    assert stats['hits'] >= 1
+    assert stats['size'] >= 1
+
+
+def test_do_not_share_validators_of_equal_values_of_different_types():
+    validator_1 = matchers.deserialize(matchers.serialize(option.Equal(True)))
+    validator_2 = matchers.deserialize(matchers.serialize(option.Equal(1)))
+    validator_3 = matchers.deserialize(matchers.serialize(option.Equal(1.0)))
+    assert validator_1.option is True
+    assert type(validator_2.option) is int
+    assert type(validator_3.option) is float
@@ -28,6 +28,13 @@ class Equal:
     def validate(self, ctx):
         return get_option(ctx) == self.option
 
+    def index_value(self):
+        return self.option
+
+    @staticmethod
+    def index_key(ctx):
+        return get_option(ctx)
+
     def serialize(self):
         return self.option
 
@@ -55,6 +62,13 @@ class Match:
         story_context.set_message_data(ctx, 'option', 'matches', matches)
         return True
 
+    def index_pattern(self):
+        return self.matcher
+
+    @staticmethod
+    def index_key(ctx):
+        return get_option(ctx)
+
     def serialize(self):
         return {
             'pattern': self.matcher.pattern,
@@ -69,3 +83,10 @@ class OnStart:
 
     def validate(self, ctx):
         return get_option(ctx) == self.DEFAULT_OPTION_PAYLOAD
+
+    def index_value(self):
+        return self.DEFAULT_OPTION_PAYLOAD
+
+    @staticmethod
+    def index_key(ctx):
+        return get_option(ctx)
@@ -38,6 +38,13 @@ class Equal:
     def validate(self, ctx):
         return get_raw_text(ctx) == self.test_string
 
+    def index_value(self):
+        return self.test_string
+
+    @staticmethod
+    def index_key(ctx):
+        return get_raw_text(ctx)
+
     def serialize(self):
         return self.test_string
 
@@ -63,6 +70,14 @@ class EqualCaseIgnore:
     def validate(self, ctx):
         return get_raw_text(ctx, '').lower() == self.test_string
 
+    def index_value(self):
+        return self.test_string
+
+    @staticmethod
+    def index_key(ctx):
+        raw_txt = get_raw_text(ctx, '')
+        return raw_txt.lower() if raw_txt is not None else None
+
     def serialize(self):
         return self.test_string
 
@@ -86,6 +101,13 @@ class Match:
         story_context.set_message_data(ctx, 'text', 'matches', matches)
         return True
 
+    def index_pattern(self):
+        return self.matcher
+
+    @staticmethod
+    def index_key(ctx):
+        return get_raw_text(ctx)
+
     def serialize(self):
         return {
             'pattern': self.matcher.pattern,
@@ -4,6 +4,7 @@ import logging
 from . import chat, di
 from .ast import callable as callable_module, common, \
     forking, library, loop, parser, processor, users
+from .utils import queue
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +17,14 @@ def check_spec(spec, obj):
 
 
 class Story:
-    def __init__(self):
+    def __init__(self, rate_limits=None, drain_timeout=10.0, executor=None):
+        """
+
+        :param rate_limits: limits of outgoing messages.
+        Options of OutboundScheduler (page_rate, recipient_rate and etc)
+        :param drain_timeout: how long (in seconds) we wait for background jobs on stop
+        :param executor: BackgroundExecutor of side work (analytics and etc)
+        """
         self.stories_library = library.StoriesLibrary()
 
         self.parser_instance = parser.Parser(self.stories_library)
@@ -44,8 +52,10 @@ class Story:
             parser_instance=self.parser_instance,
         )
         self.middlewares = []
-        self.chat = chat.Chat()
+        self.chat = chat.Chat(rate_limits)
         self.users = users.Users()
+        self.drain_timeout = drain_timeout
+        self.executor = executor or queue.BackgroundExecutor()
 
     # Facade
     def loop(self):
@@ -161,11 +171,14 @@ class Story:
 
     async def start(self, event_loop=None):
         self.register()
+        self.stories_library.compile()
         await self._do_for_each_extension('before_start', event_loop)
         await self._do_for_each_extension('start', event_loop)
         await self._do_for_each_extension('after_start', event_loop)
 
     async def stop(self, event_loop=None):
+        # background jobs (analytics and etc) could still use middlewares
+        await self.executor.drain(timeout=self.drain_timeout)
         return await self._do_for_each_extension('stop', event_loop)
 
     def forever(self, loop):
@@ -181,6 +194,8 @@ class Story:
         di.injector.register(instance=self.story_processor_instance)
         di.injector.register(instance=self.stories_library)
         di.injector.register(instance=self.users)
+        di.injector.register(instance=self.chat)
+        di.injector.register('executor', self.executor)
         di.injector.bind(self.parser_instance, auto=True)
         di.injector.bind(self.story_processor_instance, auto=True)
         di.injector.bind(self.stories_library, auto=True)
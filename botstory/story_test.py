@@ -291,6 +291,71 @@ async def test_should_run_before_start_start_and_then_after_start(mocker):
             ])
 
 
+@pytest.mark.asyncio
+async def test_should_drain_background_jobs_before_stop_extensions(mocker):
+    with di.child_scope():
+        with answer.Talk() as talk:
+            story = talk.story
+            handler = mocker.stub()
+
+            @di.desc()
+            class MockExtension:
+                async def stop(self):
+                    handler('stop')
+
+            story.use(MockExtension())
+
+            async def job():
+                await asyncio.sleep(0.01)
+                handler('job')
+
+            story.executor.add(job)
+            await story.stop()
+            handler.assert_has_calls([
+                call('job'),
+                call('stop'),
+            ])
+
+
+@pytest.mark.asyncio
+async def test_stop_should_drain_only_background_jobs_of_the_story():
+    story_1 = botstory.Story()
+    story_2 = botstory.Story(drain_timeout=0.01)
+    job_2_is_canceled = asyncio.Event()
+
+    async def job_2():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            job_2_is_canceled.set()
+            raise
+
+    story_2.executor.add(job_2)
+    await asyncio.sleep(0)
+
+    await asyncio.wait_for(story_1.stop(), 1)
+    assert story_2.executor.stats()['running'] == 1
+
+    await asyncio.wait_for(story_2.stop(), 1)
+    await asyncio.wait_for(job_2_is_canceled.wait(), 1)
+    assert story_2.executor.stats()['dropped'] == 1
+
+
+def test_get_executor_of_story_as_dep():
+    with di.child_scope():
+        story = botstory.Story()
+        story.register()
+
+        @di.desc()
+        class OneClass:
+            @di.inject()
+            def deps(self, executor):
+                self.executor = executor
+
+        assert di.injector.get('one_class').executor is story.executor
+        story.clear()
+
+
 @di.desc('fb', reg=False)
 class FakeFbIntegration:
     type = 'fake facebook'
@@ -323,3 +388,42 @@ async def test_stop_typing():
             await story.stop_typing(talk.user)
 
             fb_interface.stop_typing.assert_called_with(talk.user)
+
+
+@di.desc('tracker', reg=False)
+class TrackerWithoutHooks:
+    def __init__(self):
+        self.messages = 0
+
+    def event(self, *args, **kwargs):
+        pass
+
+    def new_message(self, ctx):
+        self.messages += 1
+
+    def new_user(self, user):
+        pass
+
+    def story(self, ctx):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_process_message_with_tracker_without_processed_hooks():
+    trigger = SimpleTrigger()
+
+    with answer.Talk() as talk:
+        story = talk.story
+        tracker = story.use(TrackerWithoutHooks())
+
+        @story.on('hi there!')
+        def one_story():
+            @story.part()
+            def then(ctx):
+                trigger.passed()
+
+        await story.start()
+        await talk.pure_text('hi there!')
+
+        assert trigger.is_triggered
+        assert tracker.messages == 1
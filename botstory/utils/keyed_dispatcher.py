@@ -0,0 +1,53 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedDispatcher:
+    """
+    run jobs of different keys (users) concurrently
+    but keep strict order of jobs of one key.
+
+    number of concurrently running jobs is limited by `concurrency`
+    the rest of jobs wait for free slot (backpressure)
+    """
+
+    def __init__(self, concurrency=16):
+        self.concurrency = concurrency
+        # key -> future which is resolved once the last scheduled job is done
+        self.tails = {}
+        self.semaphore = None
+
+    @property
+    def pending(self):
+        """
+        number of keys which have scheduled or running jobs
+
+        :return:
+        """
+        return len(self.tails)
+
+    async def run(self, key, fn, *args, **kwargs):
+        """
+        run coroutine function once all previous jobs of the key are done
+
+        :param key:
+        :param fn: coroutine function
+        :return: result of fn
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        previous = self.tails.get(key, None)
+        done = asyncio.get_event_loop().create_future()
+        self.tails[key] = done
+        try:
+            if previous is not None:
+                await previous
+            async with self.semaphore:
+                return await fn(*args, **kwargs)
+        finally:
+            done.set_result(None)
+            if self.tails.get(key, None) is done:
+                del self.tails[key]
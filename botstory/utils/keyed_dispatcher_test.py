@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from . import keyed_dispatcher
+
+
+@pytest.mark.asyncio
+async def test_keep_order_of_jobs_of_one_key():
+    dispatcher = keyed_dispatcher.KeyedDispatcher()
+    log = []
+
+    async def job(name, delay):
+        await asyncio.sleep(delay)
+        log.append(name)
+
+    # gather doesn't guarantee order of scheduling
+    first = asyncio.ensure_future(dispatcher.run('alice', job, 'first', 0.02))
+    second = asyncio.ensure_future(dispatcher.run('alice', job, 'second', 0))
+    await asyncio.gather(first, second)
+    assert log == ['first', 'second']
+    assert dispatcher.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_run_jobs_of_different_keys_concurrently():
+    dispatcher = keyed_dispatcher.KeyedDispatcher()
+    log = []
+
+    async def job(name, delay):
+        await asyncio.sleep(delay)
+        log.append(name)
+
+    await asyncio.gather(
+        dispatcher.run('alice', job, 'alice', 0.02),
+        dispatcher.run('bob', job, 'bob', 0),
+    )
+    assert log == ['bob', 'alice']
+
+
+@pytest.mark.asyncio
+async def test_limit_concurrency():
+    dispatcher = keyed_dispatcher.KeyedDispatcher(concurrency=2)
+    running = 0
+    max_running = 0
+
+    async def job():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(*[dispatcher.run(key, job) for key in range(5)])
+    assert max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_continue_after_failed_job():
+    dispatcher = keyed_dispatcher.KeyedDispatcher()
+
+    async def fail():
+        raise ValueError()
+
+    async def succeed():
+        return 'ok'
+
+    results = await asyncio.gather(
+        dispatcher.run('alice', fail),
+        dispatcher.run('alice', succeed),
+        return_exceptions=True,
+    )
+    assert isinstance(results[0], ValueError)
+    assert results[1] == 'ok'
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    bounded dict which evicts the least recently used items
+    and counts hits and misses
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.evictions = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        return self.items.pop(key, default)
+
+    def clear(self):
+        self.items.clear()
+
+    def stats(self):
+        return {
+            'evictions': self.evictions,
+            'hits': self.hits,
+            'maxsize': self.maxsize,
+            'misses': self.misses,
+            'size': len(self.items),
+        }
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,28 @@
+from . import lru
+
+
+def test_get_and_set():
+    cache = lru.LRUCache()
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.get('b', 'default') == 'default'
+    assert cache.stats() == {
+        'evictions': 0,
+        'hits': 1,
+        'maxsize': 128,
+        'misses': 1,
+        'size': 1,
+    }
+
+
+def test_evict_least_recently_used():
+    cache = lru.LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert len(cache) == 2
+    assert cache.stats()['evictions'] == 1
@@ -1,5 +1,214 @@
 import asyncio
+import collections
+import logging
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+# overflow policies of BackgroundExecutor
+
+# drop the oldest queued job to free slot for the new one
+DROP_OLDEST = 'drop-oldest'
+# wait for free slot (only `put` could wait, `add` drops the new job)
+BLOCK = 'block'
+# once queue is half full accept new jobs with decreasing probability
+SAMPLE = 'sample'
+
+POLICIES = (DROP_OLDEST, BLOCK, SAMPLE)
+
+
+class BackgroundExecutor:
+    """
+    run side work (analytics and etc) in the background
+    with bounded queue and fixed number of workers.
+
+    Job is function without arguments. It could return coroutine,
+    in that case we await it.
+
+    Each Story has its own executor (`story.executor`), extensions get it
+    from DI as `executor`.
+    """
+
+    def __init__(self, maxsize=1000, workers=4, overflow=DROP_OLDEST):
+        """
+
+        :param maxsize: max number of queued jobs
+        :param workers: number of jobs which we run at the same time
+        :param overflow: what we do once queue is full. One of POLICIES
+        """
+        self.jobs = collections.deque()
+        self.loop = None
+        # thread of the event loop
+        self.thread = None
+        self.workers = []
+        self.has_jobs = None
+        self.has_slot = None
+        self.idle = None
+        self.running = 0
+
+        self.done = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self.configure(maxsize=maxsize, workers=workers, overflow=overflow)
+
+    def configure(self, maxsize=None, workers=None, overflow=None):
+        if overflow is not None:
+            if overflow not in POLICIES:
+                raise ValueError('overflow should be one of {}'.format(POLICIES))
+            self.overflow = overflow
+        if maxsize is not None:
+            self.maxsize = maxsize
+        if workers is not None:
+            self.workers_count = workers
+
+    def stats(self):
+        return {
+            'done': self.done,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'queued': len(self.jobs),
+            'running': self.running,
+        }
+
+    def is_full(self):
+        return len(self.jobs) >= self.maxsize
+
+    def add(self, fn):
+        """
+        put job in the queue without waiting.
+        Could be called from other thread, in that case
+        job is handed over to the thread of event loop
+
+        :param fn:
+        :return: False if job (or the oldest job) was dropped.
+        Always True for job from other thread
+        """
+        if self.thread is not None and self.thread != threading.get_ident() and \
+                not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.add, fn)
+            return True
+        self.ensure_workers()
+        accepted = True
+        if self.overflow == SAMPLE and not self.should_sample():
+            self.dropped += 1
+            return False
+        if self.is_full():
+            if self.overflow == DROP_OLDEST:
+                self.jobs.popleft()
+                self.dropped += 1
+                accepted = False
+            else:
+                self.dropped += 1
+                return False
+        self.push(fn)
+        return accepted
+
+    async def put(self, fn):
+        """
+        put job in the queue.
+        With `block` policy wait for free slot
+
+        :param fn:
+        :return: False if job (or the oldest job) was dropped
+        """
+        if self.overflow != BLOCK:
+            return self.add(fn)
+        self.ensure_workers()
+        while self.is_full():
+            self.has_slot.clear()
+            await self.has_slot.wait()
+        self.push(fn)
+        return True
+
+    def should_sample(self):
+        threshold = self.maxsize // 2
+        if len(self.jobs) < threshold:
+            return True
+        free = self.maxsize - len(self.jobs)
+        return free > 0 and random.random() < free / (self.maxsize - threshold)
+
+    def push(self, fn):
+        self.jobs.append(fn)
+        self.idle.clear()
+        self.has_jobs.set()
+
+    def ensure_workers(self):
+        loop = asyncio.get_event_loop()
+        if self.loop is not loop:
+            # we got new event loop (for example in tests)
+            # so workers and events of the previous one are useless
+            self.loop = loop
+            self.thread = threading.get_ident()
+            self.workers = []
+            self.has_jobs = asyncio.Event(loop=loop)
+            self.has_slot = asyncio.Event(loop=loop)
+            self.idle = asyncio.Event(loop=loop)
+            self.idle.set()
+            self.running = 0
+        self.workers = [w for w in self.workers if not w.done()]
+        while len(self.workers) < self.workers_count:
+            self.workers.append(asyncio.ensure_future(self.worker(), loop=loop))
+
+    async def worker(self):
+        while True:
+            while not self.jobs:
+                self.has_jobs.clear()
+                await self.has_jobs.wait()
+            fn = self.jobs.popleft()
+            self.has_slot.set()
+            self.running += 1
+            try:
+                res = fn()
+                if asyncio.iscoroutine(res):
+                    await res
+                self.done += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                logger.exception('background job {} failed'.format(fn))
+            finally:
+                self.running -= 1
+                if not self.jobs and self.running == 0:
+                    self.idle.set()
+
+    async def drain(self, timeout=None):
+        """
+        wait until all queued jobs are done and stop workers
+
+        :param timeout: how long (in seconds) we wait. None - forever
+        :return: True if all jobs are done
+        """
+        if self.loop is not asyncio.get_event_loop():
+            return True
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+            drained = True
+        except asyncio.TimeoutError:
+            # running jobs are canceled with their workers
+            dropped = len(self.jobs) + self.running
+            logger.warning('drop {} background jobs on drain'.format(dropped))
+            self.dropped += dropped
+            self.jobs.clear()
+            self.has_slot.set()
+            self.idle.set()
+            drained = False
+        for worker in self.workers:
+            worker.cancel()
+        self.workers = []
+        return drained
+
+
+# default executor of side work.
+# Prefer executor of story (`story.executor` or `executor` from DI)
+executor = BackgroundExecutor()
 
 
 def add(fn):
-    asyncio.get_event_loop().call_soon_threadsafe(fn)
+    return executor.add(fn)
+
+
+async def drain(timeout=None):
+    return await executor.drain(timeout)
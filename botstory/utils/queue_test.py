@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+import threading
+from . import queue
+
+
+@pytest.mark.asyncio
+async def test_await_coroutine_jobs():
+    executor = queue.BackgroundExecutor()
+    calls = []
+
+    async def job(value):
+        await asyncio.sleep(0)
+        calls.append(value)
+
+    executor.add(lambda: job(1))
+    executor.add(lambda: calls.append(2))
+    assert await executor.drain()
+
+    assert sorted(calls) == [1, 2]
+    assert executor.stats()['done'] == 2
+
+
+@pytest.mark.asyncio
+async def test_count_failed_jobs():
+    executor = queue.BackgroundExecutor()
+
+    async def fail():
+        raise ValueError()
+
+    executor.add(fail)
+    executor.add(lambda: 1 / 0)
+    await executor.drain()
+
+    assert executor.stats()['failed'] == 2
+
+
+@pytest.mark.asyncio
+async def test_drop_the_oldest_job_once_queue_is_full():
+    executor = queue.BackgroundExecutor(maxsize=2, workers=1)
+    calls = []
+
+    assert executor.add(lambda: calls.append(1))
+    assert executor.add(lambda: calls.append(2))
+    assert not executor.add(lambda: calls.append(3))
+    await executor.drain()
+
+    assert calls == [2, 3]
+    assert executor.stats()['dropped'] == 1
+
+
+@pytest.mark.asyncio
+async def test_block_until_we_have_free_slot():
+    executor = queue.BackgroundExecutor(maxsize=1, workers=1, overflow=queue.BLOCK)
+    calls = []
+
+    await executor.put(lambda: calls.append(1))
+    # `add` can't wait so it drops new job
+    assert not executor.add(lambda: calls.append(2))
+    await executor.put(lambda: calls.append(3))
+    await executor.drain()
+
+    assert calls == [1, 3]
+
+
+@pytest.mark.asyncio
+async def test_sample_jobs_once_queue_is_half_full():
+    executor = queue.BackgroundExecutor(maxsize=100, workers=1, overflow=queue.SAMPLE)
+
+    accepted = sum(executor.add(lambda: None) for _ in range(1000))
+    await executor.drain()
+
+    assert 50 <= accepted <= 100
+    assert executor.stats()['dropped'] == 1000 - accepted
+
+
+def test_fail_on_unknown_policy():
+    with pytest.raises(ValueError):
+        queue.BackgroundExecutor(overflow='ignore')
+
+
+@pytest.mark.asyncio
+async def test_drain_with_timeout():
+    executor = queue.BackgroundExecutor(workers=1)
+
+    executor.add(lambda: asyncio.sleep(10))
+
+    assert not await executor.drain(timeout=0.01)
+
+
+@pytest.mark.asyncio
+async def test_drop_queued_jobs_once_drain_is_timed_out():
+    executor = queue.BackgroundExecutor(workers=1)
+    calls = []
+
+    executor.add(lambda: asyncio.sleep(10))
+    executor.add(lambda: calls.append(1))
+
+    assert not await executor.drain(timeout=0.01)
+    assert executor.stats()['queued'] == 0
+    assert executor.stats()['dropped'] == 2
+
+    # the next drain shouldn't wait for dropped jobs
+    assert await asyncio.wait_for(executor.drain(), 1)
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_hand_job_from_other_thread_over_to_loop_thread():
+    executor = queue.BackgroundExecutor()
+    executor.ensure_workers()
+    done = asyncio.Event()
+    threads = []
+
+    def job():
+        threads.append(threading.get_ident())
+        done.set()
+
+    thread = threading.Thread(target=executor.add, args=(job,))
+    thread.start()
+    thread.join()
+    await asyncio.wait_for(done.wait(), 1)
+
+    assert threads == [threading.get_ident()]
+    await executor.drain()
@@ -0,0 +1,263 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+import time
+from . import lru
+
+logger = logging.getLogger(__name__)
+
+# priority lanes of outgoing messages. The lower the sooner
+LANES = {
+    'reply': 0,
+    'broadcast': 1,
+}
+
+# facebook reports usage of rate limits (in percent) in these headers
+USAGE_HEADERS = ['X-App-Usage', 'X-Page-Usage', 'X-Business-Use-Case-Usage']
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, err=None):
+    """
+    exponential backoff with jitter.
+    Respect `Retry-After` header of rate limited response
+
+    :param attempt: number of failed attempt (starts from 0)
+    :param base: delay of the first retry
+    :param cap: max delay
+    :param err: HttpRequestError
+    :return: delay in seconds
+    """
+    retry_after = get_retry_after(err)
+    if retry_after is not None:
+        return min(retry_after, cap)
+    delay = min(cap, base * 2 ** attempt)
+    # "equal jitter" - keep at least half of delay
+    # so retries of one request don't go too fast
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def get_retry_after(err):
+    headers = getattr(err, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttled(err):
+    """
+    whether request was rejected because of rate limits
+
+    :param err:
+    :return:
+    """
+    if getattr(err, 'code', None) == 429:
+        return True
+    headers = getattr(err, 'headers', None) or {}
+    for header in USAGE_HEADERS:
+        try:
+            usage = json.loads(headers.get(header) or '{}')
+        except ValueError:
+            continue
+        if isinstance(usage, dict) and any(
+                isinstance(value, (int, float)) and value >= 100 for value in usage.values()):
+            return True
+    return False
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        """
+
+        :param rate: tokens per second
+        :param capacity: max burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, now):
+        """
+        :param now:
+        :return: how long we should wait for the next token
+        """
+        self.refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def pause(self, now, delay):
+        self.paused_until = max(self.paused_until, now + delay)
+
+
+class OutboundScheduler:
+    """
+    schedule outgoing messages so we don't exceed rate limits
+    of page (interface) and of each recipient.
+
+    Messages wait for free tokens in priority lanes:
+    replies go ahead of broadcasts.
+    Messages of one lane keep their order.
+    """
+
+    def __init__(self,
+                 page_rate=80, page_capacity=80,
+                 recipient_rate=None, recipient_capacity=10,
+                 max_recipients=10000,
+                 max_retries=3,
+                 ):
+        """
+
+        :param page_rate: messages per second of one page
+        :param page_capacity: burst of one page
+        :param recipient_rate: messages per second to one recipient. None - don't limit
+        :param recipient_capacity: burst of one recipient
+        :param max_recipients: how many buckets of recipients we keep
+        :param max_retries: how many times we retry throttled message
+        """
+        self.max_retries = max_retries
+        self.page_rate = page_rate
+        self.page_capacity = page_capacity
+        self.recipient_rate = recipient_rate
+        self.recipient_capacity = recipient_capacity
+
+        self.pages = {}
+        self.recipients = lru.LRUCache(maxsize=max_recipients)
+        # [(lane, seq, buckets, future)]
+        self.waiters = []
+        self.seq = itertools.count()
+        self.timer = None
+
+        self.sent = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def stats(self):
+        names = {value: name for name, value in LANES.items()}
+        depth = {name: 0 for name in LANES}
+        for lane, _, _, _ in self.waiters:
+            depth[names[lane]] += 1
+        return {
+            'depth': depth,
+            'sent': self.sent,
+            'throttled': self.throttled,
+            'waited': self.waited,
+        }
+
+    def get_page_bucket(self, page):
+        bucket = self.pages.get(page, None)
+        if bucket is None:
+            bucket = self.pages[page] = TokenBucket(self.page_rate, self.page_capacity)
+        return bucket
+
+    def get_recipient_bucket(self, recipient):
+        bucket = self.recipients.get(recipient, None)
+        if bucket is None:
+            bucket = TokenBucket(self.recipient_rate, self.recipient_capacity)
+            self.recipients.set(recipient, bucket)
+        return bucket
+
+    async def run(self, page, recipient, lane, fn):
+        """
+        wait for free slot and run coroutine function.
+        Throttled message pauses the page and waits for a new slot
+
+        :param page: key of page (interface)
+        :param recipient: key of recipient. None - don't limit
+        :param lane: `reply` or `broadcast`
+        :param fn: coroutine function (without arguments) which sends message
+        :return: result of fn
+        """
+        page_bucket = self.get_page_bucket(page)
+        buckets = [page_bucket]
+        if recipient is not None and self.recipient_rate:
+            buckets.append(self.get_recipient_bucket((page, recipient)))
+
+        # retry keeps its place in the lane
+        seq = next(self.seq)
+        attempt = 0
+        while True:
+            await self.wait(LANES.get(lane, 0), seq, buckets)
+            try:
+                res = await fn()
+            except Exception as err:
+                if not is_throttled(err):
+                    raise
+                # all messages of the page should slow down
+                self.throttled += 1
+                delay = backoff_delay(attempt, err=err)
+                logger.warning('page {} is throttled. Pause for {} seconds'.format(page, delay))
+                page_bucket.pause(time.monotonic(), delay)
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                continue
+            self.sent += 1
+            return res
+
+    async def wait(self, lane, seq, buckets):
+        """
+        wait until all buckets have free token
+
+        :param lane:
+        :param seq: order inside of lane
+        :param buckets:
+        :return:
+        """
+        started_at = time.monotonic()
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self.waiters, (lane, seq, buckets, future))
+        self.dispatch()
+        await future
+        self.waited += time.monotonic() - started_at
+
+    def dispatch(self):
+        """
+        release all waiters which have free tokens
+        and schedule the next dispatch
+
+        :return:
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        now = time.monotonic()
+        min_delay = None
+        waiting = []
+        while self.waiters:
+            waiter = heapq.heappop(self.waiters)
+            _, _, buckets, future = waiter
+            if future.done():
+                # canceled
+                continue
+            delay = max(bucket.delay(now) for bucket in buckets)
+            if delay <= 0:
+                for bucket in buckets:
+                    bucket.consume()
+                future.set_result(None)
+            else:
+                waiting.append(waiter)
+                min_delay = delay if min_delay is None else min(min_delay, delay)
+
+        for waiter in waiting:
+            heapq.heappush(self.waiters, waiter)
+
+        if min_delay is not None:
+            self.timer = asyncio.get_event_loop().call_later(min_delay, self.dispatch)
@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+import time
+from . import scheduler
+from ..integrations.commonhttp import errors as commonhttp_errors
+
+
+def test_backoff_delay_grows_exponentially_with_jitter():
+    for attempt in range(5):
+        delay = scheduler.backoff_delay(attempt, base=1.0)
+        assert 2 ** attempt / 2 <= delay <= 2 ** attempt
+
+
+def test_backoff_delay_respects_retry_after_header():
+    err = commonhttp_errors.HttpRequestError(code=429, headers={'Retry-After': '7'})
+    assert scheduler.backoff_delay(0, err=err) == 7
+
+
+def test_is_throttled():
+    assert scheduler.is_throttled(commonhttp_errors.HttpRequestError(code=429))
+    assert scheduler.is_throttled(commonhttp_errors.HttpRequestError(
+        code=400, headers={'X-Page-Usage': '{"call_count": 100}'}))
+    assert not scheduler.is_throttled(commonhttp_errors.HttpRequestError(code=400))
+
+
+def test_token_bucket():
+    bucket = scheduler.TokenBucket(rate=2, capacity=1)
+    now = bucket.updated_at
+    assert bucket.delay(now) == 0
+    bucket.consume()
+    assert bucket.delay(now) == 0.5
+    assert bucket.delay(now + 0.5) == 0
+
+
+@pytest.mark.asyncio
+async def test_limit_rate_of_one_recipient():
+    s = scheduler.OutboundScheduler(recipient_rate=100, recipient_capacity=1)
+    sent = []
+
+    async def send(name):
+        sent.append(name)
+
+    first = asyncio.ensure_future(s.run('page', 'alice', 'reply', lambda: send('first')))
+    second = asyncio.ensure_future(s.run('page', 'alice', 'reply', lambda: send('second')))
+    other = asyncio.ensure_future(s.run('page', 'bob', 'reply', lambda: send('other')))
+    await asyncio.sleep(0)
+    assert s.stats()['depth']['reply'] == 1
+
+    await asyncio.gather(first, second, other)
+    assert sent == ['first', 'other', 'second']
+    assert s.stats()['sent'] == 3
+
+
+@pytest.mark.asyncio
+async def test_replies_go_ahead_of_broadcasts():
+    s = scheduler.OutboundScheduler(page_rate=100, page_capacity=1)
+    sent = []
+
+    async def send(name):
+        sent.append(name)
+
+    await s.run('page', None, 'broadcast', lambda: send('first'))
+    tasks = [
+        asyncio.ensure_future(s.run('page', None, 'broadcast', lambda: send('broadcast'))),
+        asyncio.ensure_future(s.run('page', None, 'reply', lambda: send('reply'))),
+    ]
+    await asyncio.gather(*tasks)
+    assert sent == ['first', 'reply', 'broadcast']
+
+
+@pytest.mark.asyncio
+async def test_pause_page_once_it_is_throttled():
+    s = scheduler.OutboundScheduler(max_retries=0)
+
+    async def send():
+        raise commonhttp_errors.HttpRequestError(code=429, headers={'Retry-After': '30'})
+
+    with pytest.raises(commonhttp_errors.HttpRequestError):
+        await s.run('page', 'alice', 'reply', send)
+
+    assert s.stats()['throttled'] == 1
+    bucket = s.get_page_bucket('page')
+    assert bucket.delay(bucket.updated_at) > 29
+
+
+@pytest.mark.asyncio
+async def test_retry_throttled_message_once_page_gets_new_slot():
+    s = scheduler.OutboundScheduler(page_rate=100, page_capacity=1)
+    attempts = []
+
+    async def send():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise commonhttp_errors.HttpRequestError(code=429, headers={'Retry-After': '0.05'})
+        return 'ok'
+
+    assert await s.run('page', 'alice', 'reply', send) == 'ok'
+
+    assert attempts[1] - attempts[0] >= 0.05
+    assert s.stats()['throttled'] == 1
+    assert s.stats()['sent'] == 1
+
+
+@pytest.mark.asyncio
+async def test_do_not_limit_recipient_by_default():
+    s = scheduler.OutboundScheduler()
+
+    async def send():
+        pass
+
+    for _ in range(20):
+        await s.run('page', 'alice', 'reply', send)
+
+    assert s.stats()['waited'] < 0.01
@@ -0,0 +1,40 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    concurrent calls with the same key share one execution
+    """
+
+    def __init__(self):
+        # key -> future of running call
+        self.flights = {}
+
+    def __contains__(self, key):
+        return key in self.flights
+
+    async def run(self, key, fn, *args, **kwargs):
+        """
+        run coroutine function or wait for result of the running one with the same key
+
+        :param key:
+        :param fn: coroutine function
+        :return: result of fn
+        """
+        flight = self.flights.get(key, None)
+        if flight is not None:
+            return await asyncio.shield(flight)
+
+        flight = asyncio.get_event_loop().create_future()
+        self.flights[key] = flight
+        try:
+            res = await fn(*args, **kwargs)
+        except Exception as err:
+            flight.set_exception(err)
+            # don't warn about never retrieved exception
+            flight.exception()
+            raise
+        finally:
+            del self.flights[key]
+        flight.set_result(res)
+        return res
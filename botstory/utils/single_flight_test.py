@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from . import single_flight
+
+
+@pytest.mark.asyncio
+async def test_share_result_of_concurrent_calls():
+    flight = single_flight.SingleFlight()
+    calls = []
+
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    res = await asyncio.gather(*[flight.run('key', fetch, i) for i in range(3)])
+
+    assert len(calls) == 1
+    assert res[0] == res[1] == res[2]
+    assert 'key' not in flight
+
+
+@pytest.mark.asyncio
+async def test_share_exception_of_concurrent_calls():
+    flight = single_flight.SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('fail')
+
+    res = await asyncio.gather(flight.run('key', fail), flight.run('key', fail), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in res)
@@ -0,0 +1,131 @@
+import collections
+import functools
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Lazy:
+    """
+    postpone building of log message until logger really needs it
+
+    Usage:
+
+        logger.debug('# ctx %s', trace.Lazy(ctx.summary))
+    """
+
+    __slots__ = ('fn', 'args')
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        return str(self.fn(*self.args))
+
+    __repr__ = __str__
+
+
+def timed(hook):
+    """
+    report duration of coroutine method to optional hook of its instance
+
+    Usage:
+
+        @trace.timed('storage_processed')
+        async def get_user(self, **kwargs):
+
+    :param hook: name of attribute with callback `(method name, elapsed)`.
+    None - we don't measure anything
+    :return:
+    """
+
+    def decorator(method):
+        name = method.__name__
+
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            report = getattr(self, hook, None)
+            if not report:
+                return await method(self, *args, **kwargs)
+            started_at = time.perf_counter()
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                report(name, time.perf_counter() - started_at)
+
+        return wrapper
+
+    return decorator
+
+
+def stack_path(stack):
+    """
+    light representation of stack which doesn't depend on size of session data
+
+    :param stack:
+    :return: list of `topic:step`
+    """
+    return ['{}:{}'.format(item['topic'], item['step']) for item in stack]
+
+
+class Tracer:
+    """
+    structured and sampled trace of state transitions of story engine.
+
+    We record only shape of context (stack path, step, type of waiting_for)
+    and never serialize the whole session,
+    so we could keep tracing on in production with low sample rate.
+    """
+
+    def __init__(self, sample_rate=0.0, maxlen=1000):
+        """
+
+        :param sample_rate: part of messages (0..1) which we trace
+        :param maxlen: how many last records we keep
+        """
+        self.sample_rate = sample_rate
+        self.records = collections.deque(maxlen=maxlen)
+
+    def configure(self, sample_rate=None, maxlen=None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if maxlen is not None:
+            self.records = collections.deque(self.records, maxlen=maxlen)
+
+    def sample(self):
+        """
+        decide whether we trace the next message
+
+        :return:
+        """
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def record(self, ctx, event):
+        """
+        record transition of story context
+
+        :param ctx: StoryContext
+        :param event: name of transition, for example `scope_in`
+        :return:
+        """
+        record = {
+            'time': time.time(),
+            'event': event,
+            'uid': ctx.uid,
+            'parent_uid': ctx.parent_uid,
+            'matched': ctx.matched,
+            'stack': stack_path(ctx.stack()),
+            'waiting_for': type(ctx.waiting_for).__name__,
+        }
+        self.records.append(record)
+        logger.debug('%s', record)
+
+    def clear(self):
+        self.records.clear()
+
+
+# process-wide tracer of story engine
+tracer = Tracer()
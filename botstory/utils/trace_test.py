@@ -0,0 +1,74 @@
+import pytest
+from . import answer, trace
+
+
+def test_lazy_should_not_call_function_until_we_need_string():
+    calls = []
+
+    def build(value):
+        calls.append(value)
+        return 'value {}'.format(value)
+
+    lazy = trace.Lazy(build, 1)
+    assert calls == []
+    assert str(lazy) == 'value 1'
+    assert calls == [1]
+
+
+def test_do_not_sample_by_default():
+    tracer = trace.Tracer()
+    assert not any(tracer.sample() for _ in range(100))
+
+
+def test_keep_only_last_records():
+    tracer = trace.Tracer(sample_rate=1, maxlen=10)
+    tracer.configure(maxlen=2)
+    assert tracer.records.maxlen == 2
+
+
+@pytest.mark.asyncio
+async def test_report_duration_of_timed_method_to_hook():
+    reports = []
+
+    class Storage:
+        def __init__(self, hook=None):
+            self.storage_processed = hook
+
+        @trace.timed('storage_processed')
+        async def get_user(self, name):
+            return name
+
+    assert await Storage().get_user('alice') == 'alice'
+    assert await Storage(lambda *args: reports.append(args)).get_user('bob') == 'bob'
+    assert len(reports) == 1
+    assert reports[0][0] == 'get_user'
+    assert reports[0][1] >= 0
+
+
+@pytest.fixture
+def tracer():
+    trace.tracer.configure(sample_rate=1)
+    yield trace.tracer
+    trace.tracer.configure(sample_rate=0)
+    trace.tracer.clear()
+
+
+@pytest.mark.asyncio
+async def test_trace_transitions_of_sampled_message(tracer):
+    with answer.Talk() as talk:
+        story = talk.story
+
+        @story.on('hi')
+        def one_story():
+            @story.part()
+            def greet(ctx):
+                pass
+
+        await talk.pure_text('hi')
+
+    events = [record['event'] for record in tracer.records]
+    assert events[0] == 'match_message'
+    assert 'scope_in' in events
+    assert 'execute' in events
+    assert 'scope_out' in events
+    assert any(record['stack'] == ['one_story:0'] for record in tracer.records)